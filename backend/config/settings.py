@@ -133,6 +133,35 @@ else:
         }
     }
 
+# Caché compartida entre todos los workers de gunicorn: Redis si está configurado,
+# si no una tabla de la base de datos (creada por la migración 0012)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'facturacion_cache',
+            # Con el valor por defecto (300) la poda borra por orden de clave y se
+            # lleva las versiones y el mapa de categorías
+            'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '5000'))},
+        }
+    }
+
+# Caché de respuestas del listado y detalle de productos: solo tiene sentido con
+# Redis; sobre la tabla de caché una lectura cuesta más que rehacer la respuesta
+CACHE_RESPUESTAS_CATALOGO = os.environ.get(
+    'CACHE_RESPUESTAS_CATALOGO', '1' if os.environ.get('REDIS_URL') else '0'
+) == '1'
+# Tasa vigente cacheada por versión: con la tabla de caché comprobar la versión ya
+# es una consulta, así que sin Redis se lee directamente la tabla de tasas
+CACHE_TASAS = os.environ.get('CACHE_TASAS', '1' if os.environ.get('REDIS_URL') else '0') == '1'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -170,6 +199,30 @@ LOYVERSE_WEBHOOK_SECRET = os.environ.get('LOYVERSE_WEBHOOK_SECRET', '')
 if not LOYVERSE_API_TOKEN:
     raise ValueError('LOYVERSE_API_TOKEN must be set in environment variables')
 
+# Cliente HTTP de Loyverse (timeouts en segundos)
+LOYVERSE_CONNECT_TIMEOUT = float(os.environ.get('LOYVERSE_CONNECT_TIMEOUT', '5'))
+LOYVERSE_READ_TIMEOUT = float(os.environ.get('LOYVERSE_READ_TIMEOUT', '30'))
+LOYVERSE_MAX_RETRIES = int(os.environ.get('LOYVERSE_MAX_RETRIES', '3'))
+LOYVERSE_BACKOFF_BASE = float(os.environ.get('LOYVERSE_BACKOFF_BASE', '0.5'))
+LOYVERSE_POOL_SIZE = int(os.environ.get('LOYVERSE_POOL_SIZE', '10'))
+# Llamadas por segundo permitidas a cada proceso (cada worker de gunicorn tiene su cuota)
+LOYVERSE_RATE_LIMIT = float(os.environ.get('LOYVERSE_RATE_LIMIT', '5'))
+# Hilos usados para enviar precios a Loyverse en paralelo
+LOYVERSE_PUSH_WORKERS = int(os.environ.get('LOYVERSE_PUSH_WORKERS', '4'))
+# Segundos que el espejo local de un item se considera válido para construir un PUT;
+# antes de usarlo se descargan los items que cambiaron desde la última verificación
+LOYVERSE_MIRROR_TTL = int(os.environ.get('LOYVERSE_MIRROR_TTL', '86400'))
+# Segundos que se conserva en caché el mapa de categorías de Loyverse
+LOYVERSE_CATEGORIES_TTL = int(os.environ.get('LOYVERSE_CATEGORIES_TTL', '3600'))
+
+# Tareas en segundo plano (manage.py procesar_tareas)
+# Segundos sin latido tras los que una tarea en proceso se considera abandonada
+TAREAS_TIMEOUT = int(os.environ.get('TAREAS_TIMEOUT', '900'))
+# Cada cuántos segundos el worker renueva el latido de la tarea que ejecuta
+TAREAS_LATIDO = int(os.environ.get('TAREAS_LATIDO', '30'))
+# Veces que se reintenta una tarea abandonada antes de marcarla como fallida
+TAREAS_MAX_INTENTOS = int(os.environ.get('TAREAS_MAX_INTENTOS', '3'))
+
 # Channels Configuration
 # ASGI_APPLICATION = 'config.asgi.application'
 # CHANNEL_LAYERS = {
@@ -1,17 +1,21 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from facturacion.views import ProductoViewSet, TasaCambioViewSet, FacturaViewSet, WebhookViewSet, WebhookReceiveView, health_check
+from facturacion.views import ProductoViewSet, TasaCambioViewSet, FacturaViewSet, WebhookViewSet, TareaViewSet, HistorialPrecioViewSet, WebhookReceiveView, health_check, loyverse_estadisticas, reportes_compras
 
 router = DefaultRouter()
 router.register(r'productos', ProductoViewSet)
 router.register(r'tasas-cambio', TasaCambioViewSet)
 router.register(r'facturas', FacturaViewSet)
 router.register(r'webhooks', WebhookViewSet)
+router.register(r'tareas', TareaViewSet)
+router.register(r'historial-precios', HistorialPrecioViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
     path('webhook/', WebhookReceiveView.as_view(), name='webhook-receive'),
     path('api/health/', health_check, name='health-check'),
+    path('api/loyverse/estadisticas/', loyverse_estadisticas, name='loyverse-estadisticas'),
+    path('api/reportes/', reportes_compras, name='reportes-compras'),
 ] 
\ No newline at end of file
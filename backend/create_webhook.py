@@ -1,9 +1,10 @@
 #!/usr/bin/env python
 """
-Script para crear un webhook de inventory_levels.update en Loyverse
+Script para crear los webhooks de Loyverse
 
-Este script utiliza la API de Loyverse para crear un webhook que notificará
-sobre cambios en el inventario.
+Por defecto crea los de inventory_levels.update (cambios en el inventario) e
+items.update (mantiene al día el espejo local de items con el que se construyen
+los envíos de precios).
 """
 
 import os
@@ -22,9 +23,9 @@ from django.conf import settings
 import uuid
 
 
-def create_inventory_webhook(webhook_url=None):
+def create_inventory_webhook(webhook_url=None, webhook_type='inventory_levels.update'):
     """
-    Crea un webhook para inventory_levels.update en Loyverse
+    Crea un webhook del tipo indicado en Loyverse
     """
     # Si no se proporciona URL, usar la URL de la aplicación + /webhook/
     if not webhook_url:
@@ -42,7 +43,7 @@ def create_inventory_webhook(webhook_url=None):
     # Crear el webhook en Loyverse
     result = service.create_webhook(
         url=webhook_url,
-        webhook_type='inventory_levels.update'
+        webhook_type=webhook_type
     )
     
     if result['success']:
@@ -70,9 +71,12 @@ def create_inventory_webhook(webhook_url=None):
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='Crear webhook de inventario en Loyverse')
+    parser = argparse.ArgumentParser(description='Crear webhooks de Loyverse')
     parser.add_argument('--url', type=str, help='URL del webhook (debe usar HTTPS)')
+    parser.add_argument('--tipo', action='append', choices=['inventory_levels.update', 'items.update'],
+                        help='Tipo de webhook; se puede repetir (por defecto, ambos)')
     
     args = parser.parse_args()
     
-    create_inventory_webhook(args.url) 
\ No newline at end of file
+    for tipo in args.tipo or ['inventory_levels.update', 'items.update']:
+        create_inventory_webhook(args.url, tipo) 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Producto, TasaCambio, Factura, DetalleFactura, Webhook
+from .models import Producto, TasaCambio, Factura, DetalleFactura, Webhook, EstadoSincronizacion, ItemLoyverse, Tarea, HistorialPrecio, ResumenCompraDiario
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
@@ -21,12 +21,43 @@ class FacturaAdmin(admin.ModelAdmin):
 
 @admin.register(DetalleFactura)
 class DetalleFacturaAdmin(admin.ModelAdmin):
-    list_display = ('factura', 'producto', 'cantidad', 'precio_unitario', 'total')
-    list_filter = ('factura',)
+    list_display = ('factura', 'producto', 'cantidad', 'precio_unitario', 'total', 'estado_sincronizacion', 'intentos')
+    list_filter = ('factura', 'estado_sincronizacion')
     search_fields = ('producto__nombre',)
 
 @admin.register(Webhook)
 class WebhookAdmin(admin.ModelAdmin):
     list_display = ('id', 'type', 'url', 'status', 'created_at')
     list_filter = ('type', 'status')
-    search_fields = ('id', 'url') 
\ No newline at end of file
+    search_fields = ('id', 'url')
+
+@admin.register(EstadoSincronizacion)
+class EstadoSincronizacionAdmin(admin.ModelAdmin):
+    list_display = ('recurso', 'ultimo_updated_at', 'ultima_sincronizacion')
+
+@admin.register(ItemLoyverse)
+class ItemLoyverseAdmin(admin.ModelAdmin):
+    list_display = ('loyverse_id', 'updated_at_loyverse', 'sincronizado_en')
+    search_fields = ('loyverse_id',)
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'intentos', 'created_at', 'iniciada_en', 'finalizada_en')
+    list_filter = ('tipo', 'estado')
+    readonly_fields = ('clave', 'progreso', 'resultado', 'error', 'created_at', 'iniciada_en', 'finalizada_en', 'updated_at')
+
+@admin.register(HistorialPrecio)
+class HistorialPrecioAdmin(admin.ModelAdmin):
+    list_display = ('producto', 'precio_anterior', 'precio', 'fuente', 'factura', 'fecha')
+    list_filter = ('fuente',)
+    search_fields = ('producto__nombre', 'producto__loyverse_id')
+    raw_id_fields = ('producto', 'factura')
+    date_hierarchy = 'fecha'
+
+@admin.register(ResumenCompraDiario)
+class ResumenCompraDiarioAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'producto', 'moneda', 'categoria', 'lineas', 'cantidad', 'total', 'total_usd', 'total_bs')
+    list_filter = ('moneda', 'categoria')
+    search_fields = ('producto__nombre',)
+    raw_id_fields = ('producto',)
+    date_hierarchy = 'fecha'
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class FacturacionConfig(AppConfig):
+    name = 'facturacion'
+
+    def ready(self):
+        # Registrar los receptores de señales
+        from . import signals  # noqa: F401
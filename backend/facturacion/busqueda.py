@@ -0,0 +1,103 @@
+import re
+import unicodedata
+
+from django.db import connection, transaction
+
+from .models import Producto
+
+# La columna busqueda (migraciones 0026 y 0027) guarda el texto de búsqueda del producto,
+# facturacion_producto_busqueda(nombre, categoria, loyverse_id), con un índice GIN
+# de trigramas y otro btree en orden binario. No está en el modelo: la mantiene Postgres.
+# Ese texto y el buscado se normalizan igual (minúsculas, sin acentos, espacios colapsados).
+# Con menos caracteres no hay trigramas completos y el índice no sirve
+MIN_CARACTERES = 3
+MAX_RESULTADOS = 50
+# Candidatos entre los que se eligen los más parecidos cuando ninguno contiene el texto
+MAX_CANDIDATOS_PARECIDOS = 200
+
+# Los resultados van en el orden del índice btree; para los textos muy comunes
+# Postgres lo recorre y se detiene al llenar el límite, sin leer todos los candidatos.
+# word_similarity solo se calcula para las filas devueltas.
+CONSULTA_ORDENADA = f"""
+    SELECT c.*, word_similarity(%(texto)s, c.busqueda) AS relevancia
+    FROM (
+        SELECT p.*
+        FROM {Producto._meta.db_table} p
+        WHERE {{filtro}}
+        ORDER BY (p.busqueda COLLATE "C"), p.id
+        LIMIT %(limite)s
+    ) c
+    ORDER BY (c.busqueda COLLATE "C"), c.id
+"""
+CONSULTA_EMPIEZA = CONSULTA_ORDENADA.format(filtro='(p.busqueda COLLATE "C") LIKE %(empieza)s')
+CONSULTA_CONTIENE = CONSULTA_ORDENADA.format(
+    filtro='p.busqueda LIKE %(contiene)s AND (p.busqueda COLLATE "C") NOT LIKE %(empieza)s'
+)
+
+# Productos con una palabra parecida al texto que no lo contienen (errores de
+# escritura). Calcular word_similarity es caro, así que solo se ordenan los
+# primeros candidatos que encuentra el índice de trigramas, no todos.
+CONSULTA_PARECIDOS = f"""
+    SELECT c.*, word_similarity(%(texto)s, c.busqueda) AS relevancia
+    FROM (
+        SELECT p.*
+        FROM {Producto._meta.db_table} p
+        WHERE %(texto)s <%% p.busqueda AND p.busqueda NOT LIKE %(contiene)s
+        LIMIT %(candidatos)s
+    ) c
+    ORDER BY relevancia DESC, (c.busqueda COLLATE "C"), c.id
+    LIMIT %(limite)s
+"""
+
+
+def normalizar(texto):
+    """
+    Minúsculas, sin acentos y con los espacios colapsados, igual que el texto
+    indexado (lácteos -> lacteos)
+    """
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(caracter for caracter in texto if not unicodedata.combining(caracter))
+    return re.sub(r'\s+', ' ', texto).strip().lower()
+
+
+def buscar_productos(texto, limite=20):
+    """
+    Busca productos por nombre, categoría o loyverse_id sin distinguir acentos.
+
+    Primero van los que empiezan por el texto y después los que lo contienen,
+    cada grupo en orden alfabético. Si no llenan el límite se completan con los
+    que tienen una palabra parecida (word_similarity, tolera errores de
+    escritura), de más a menos parecidos; esa consulta, la más costosa, solo se
+    hace en ese caso.
+
+    Returns:
+        list: instancias de Producto con el atributo relevancia (0 a 1)
+    """
+    texto = normalizar(texto)
+    if len(texto) < MIN_CARACTERES:
+        return []
+    limite = max(1, min(limite, MAX_RESULTADOS))
+    literal = texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    parametros = {
+        'texto': texto,
+        'contiene': f'%{literal}%',
+        'empieza': f'{literal}%',
+        'candidatos': MAX_CANDIDATOS_PARECIDOS
+    }
+
+    productos = []
+    for consulta in (CONSULTA_EMPIEZA, CONSULTA_CONTIENE, CONSULTA_PARECIDOS):
+        parametros['limite'] = limite - len(productos)
+        if consulta is CONSULTA_PARECIDOS:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    # El planificador subestima el costo de <% y prefiere recorrer la
+                    # tabla o el índice btree evaluándolo en cada fila; con el índice
+                    # de trigramas solo se comprueban los candidatos
+                    cursor.execute('SET LOCAL enable_seqscan = off; SET LOCAL enable_indexscan = off')
+                productos += Producto.objects.raw(consulta, parametros)
+        else:
+            productos += Producto.objects.raw(consulta, parametros)
+        if len(productos) >= limite:
+            break
+    return productos
@@ -0,0 +1,179 @@
+import datetime
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import TasaCambio
+
+# Versión de la tasa vigente de cada tipo en la caché compartida; cambia cada vez
+# que se guarda o borra una tasa de ese tipo
+CLAVE_VERSION_TASA = 'tasas:version:{tipo}'
+# Tasa vigente de cada tipo en la caché compartida, junto a la versión con la que se leyó
+CLAVE_TASA = 'tasas:actual:{tipo}'
+
+# Versión del catálogo de productos; cambia con cada escritura en Producto y forma
+# parte de la clave de las respuestas guardadas, que así dejan de usarse
+CLAVE_VERSION_CATALOGO = 'productos:version'
+# Respuesta de un endpoint del catálogo para una versión y una petición concretas
+CLAVE_RESPUESTA_CATALOGO = 'productos:respuesta:{version}:{peticion}'
+# Las respuestas de versiones anteriores no se borran: caducan solas
+TTL_RESPUESTA_CATALOGO = 15 * 60
+
+# Copia en memoria del proceso: {tipo: (versión, tasa)}
+_tasas = {}
+# Contadores de la caché del catálogo en este proceso: {endpoint: {resultado: n}}
+_estadisticas = {}
+_lock = threading.Lock()
+
+
+def tasa_actual(tipo):
+    """
+    Devuelve la TasaCambio más reciente del tipo indicado.
+
+    Cada llamada consulta solo la versión en la caché compartida; si coincide con
+    la de la copia en memoria, la tasa no se vuelve a leer. Así todos los workers
+    ven una tasa nueva en la siguiente petición sin consultar la tabla de tasas.
+    Sin una caché en memoria (CACHE_TASAS desactivado) se lee la tabla, que cuesta
+    lo mismo que consultar la versión.
+
+    Raises:
+        TasaCambio.DoesNotExist: si no hay tasas de ese tipo.
+    """
+    if not settings.CACHE_TASAS:
+        return TasaCambio.objects.filter(tipo=tipo).latest('fecha')
+
+    version = _version(CLAVE_VERSION_TASA.format(tipo=tipo))
+
+    local = _tasas.get(tipo)
+    if local and local[0] == version:
+        return local[1]
+
+    compartida = cache.get(CLAVE_TASA.format(tipo=tipo))
+    if compartida and compartida[0] == version:
+        tasa = compartida[1]
+    else:
+        tasa = TasaCambio.objects.filter(tipo=tipo).latest('fecha')
+        cache.set(CLAVE_TASA.format(tipo=tipo), (version, tasa), None)
+
+    with _lock:
+        _tasas[tipo] = (version, tasa)
+    return tasa
+
+
+def invalidar_tasa(tipo):
+    """
+    Invalida la tasa vigente de un tipo en todos los procesos
+    """
+    if not settings.CACHE_TASAS:
+        return
+    cache.set(CLAVE_VERSION_TASA.format(tipo=tipo), _nueva_version(), None)
+    cache.delete(CLAVE_TASA.format(tipo=tipo))
+
+
+def catalogo_cacheable():
+    """
+    Las respuestas del catálogo solo se guardan con una caché en memoria (Redis).
+    Sobre la tabla de caché de la base de datos leer una respuesta guardada cuesta
+    más consultas que construirla otra vez.
+    """
+    return settings.CACHE_RESPUESTAS_CATALOGO
+
+
+def version_catalogo():
+    """
+    Versión actual del catálogo: "<marca de tiempo>:<aleatorio>"
+    """
+    return _version(CLAVE_VERSION_CATALOGO)
+
+
+def fecha_version(version):
+    """
+    Momento en que se fijó una versión, o None si no lo lleva
+    """
+    try:
+        return datetime.datetime.fromtimestamp(float(version.split(':', 1)[0]), tz=datetime.timezone.utc)
+    except (AttributeError, ValueError):
+        return None
+
+
+def clave_peticion(request):
+    """
+    Resumen de la petición (host, ruta y parámetros, sin importar su orden)
+    """
+    peticion = '|'.join([
+        request.get_host(),
+        request.path,
+        *(f'{nombre}={valor}' for nombre, valores in sorted(request.GET.lists()) for valor in valores)
+    ])
+    return hashlib.sha1(peticion.encode()).hexdigest()
+
+
+def respuesta_catalogo(endpoint, version, peticion, construir):
+    """
+    Devuelve los datos guardados para la petición en esa versión del catálogo; si
+    no están, los construye con construir() y los guarda.
+
+    construir() debe devolver datos ya serializados, no un Response. La versión se
+    lee antes de consultar la base de datos: si el catálogo cambia mientras se
+    construye, los datos quedan guardados con la versión vieja y no se vuelven a servir.
+    """
+    clave = CLAVE_RESPUESTA_CATALOGO.format(version=version, peticion=peticion)
+    datos = cache.get(clave)
+    if datos is not None:
+        contar_catalogo(endpoint, 'aciertos')
+        return datos
+
+    contar_catalogo(endpoint, 'fallos')
+    datos = construir()
+    cache.set(clave, datos, TTL_RESPUESTA_CATALOGO)
+    return datos
+
+
+def invalidar_catalogo():
+    """
+    Deja sin efecto todas las respuestas del catálogo guardadas, en todos los procesos
+    """
+    if catalogo_cacheable():
+        cache.set(CLAVE_VERSION_CATALOGO, _nueva_version(), None)
+
+
+def contar_catalogo(endpoint, resultado):
+    """
+    Suma uno al contador de este proceso (aciertos, fallos o no_modificadas)
+    """
+    with _lock:
+        contadores = _estadisticas.setdefault(endpoint, {'aciertos': 0, 'fallos': 0, 'no_modificadas': 0})
+        contadores[resultado] += 1
+
+
+def estadisticas_catalogo():
+    """
+    Contadores de la caché de respuestas de cada endpoint del catálogo en este proceso
+    """
+    with _lock:
+        copia = {endpoint: dict(contadores) for endpoint, contadores in _estadisticas.items()}
+    for contadores in copia.values():
+        total = contadores['aciertos'] + contadores['fallos']
+        contadores['tasa_aciertos'] = round(contadores['aciertos'] / total, 4) if total else None
+    return {'activa': catalogo_cacheable(), 'endpoints': copia}
+
+
+def _nueva_version():
+    return f'{time.time():.6f}:{uuid.uuid4().hex[:8]}'
+
+
+def _version(clave):
+    """
+    Versión guardada en la clave, creándola si aún no existe
+    """
+    version = cache.get(clave)
+    if version is None:
+        version = _nueva_version()
+        # add no pisa la versión que otro proceso haya fijado entretanto
+        if not cache.add(clave, version, None):
+            version = cache.get(clave, version)
+    return version
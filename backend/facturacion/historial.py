@@ -0,0 +1,39 @@
+from django.utils import timezone
+
+from .models import HistorialPrecio
+
+# Filas del historial insertadas por sentencia
+LOTE_HISTORIAL = 1000
+
+
+def registrar_cambios_precio(cambios, fuente, fecha=None, factura=None):
+    """
+    Añade al historial de precios los cambios indicados con un bulk_create.
+
+    Args:
+        cambios: iterable de (producto_id, precio_anterior, precio_nuevo); se
+            descartan los que no cambian el precio. precio_anterior es None para
+            el primer precio conocido de un producto.
+        fuente: origen del cambio (loyverse, calculado, factura, manual)
+        fecha: momento del cambio; por defecto, ahora
+        factura: factura que originó los cambios, si la hay
+
+    Returns:
+        int: filas añadidas al historial
+    """
+    fecha = fecha or timezone.now()
+    filas = [
+        HistorialPrecio(
+            producto_id=producto_id,
+            precio_anterior=anterior,
+            precio=nuevo,
+            fuente=fuente,
+            factura=factura,
+            fecha=fecha
+        )
+        for producto_id, anterior, nuevo in cambios
+        if anterior is None or anterior != nuevo
+    ]
+    if filas:
+        HistorialPrecio.objects.bulk_create(filas, batch_size=LOTE_HISTORIAL)
+    return len(filas)
@@ -0,0 +1,353 @@
+import codecs
+import csv
+import itertools
+import json
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from django.db import transaction
+
+from .models import Producto, TasaCambio, Factura, DetalleFactura
+from .numeracion import reservar_numeros_factura
+from .resumenes import acumular_compras
+from .serializers import calcular_totales_factura
+
+
+class ErrorFila(Exception):
+    """
+    Error de validación de una fila concreta del archivo
+    """
+    def __init__(self, fila, mensaje):
+        super().__init__(mensaje)
+        self.fila = fila
+        self.mensaje = mensaje
+
+
+class ImportadorFacturas:
+    """
+    Importa muchas facturas desde CSV o JSON Lines leyendo el archivo como un flujo.
+
+    CSV: una fila por línea de factura. Las filas consecutivas con el mismo valor en
+    la columna `factura` forman una factura; moneda, tasa_cambio y porcentaje_ganancia
+    se toman de su primera fila. Columnas de la línea: producto (loyverse_id o nombre),
+    cantidad, precio_unitario, precio_compra_usd, unidades_paquete y
+    porcentaje_ganancia_linea.
+
+    JSON Lines: un objeto por línea con la misma forma que el POST a /api/facturas/,
+    salvo que el producto de cada detalle puede ser su loyverse_id o su nombre, y una
+    clave opcional `factura` como referencia para el informe de errores.
+
+    La memoria queda acotada por el lote en curso, el índice de productos y el
+    máximo de errores informados, no por el tamaño del archivo. Una factura con
+    alguna fila inválida no se crea; el resto sí.
+    """
+    # Facturas validadas que se escriben juntas en una transacción
+    FACTURAS_POR_LOTE = 100
+    # Errores que se devuelven en el informe; el resto solo se cuenta
+    MAX_ERRORES = 500
+    MONEDAS = {moneda for moneda, _ in Factura.MONEDA_CHOICES}
+
+    def __init__(self):
+        self.productos_por_loyverse_id = {}
+        self.productos_por_nombre = {}
+        self.tasas = {}
+        self.facturas_creadas = 0
+        self.lineas_creadas = 0
+        self.facturas_con_error = 0
+        self.errores = []
+        self.errores_omitidos = 0
+        self._cargar_indice_productos()
+
+    def _cargar_indice_productos(self):
+        """
+        Precarga los índices loyverse_id → id y nombre → id (los nombres repetidos
+        quedan marcados como ambiguos)
+        """
+        for producto_id, loyverse_id, nombre in Producto.objects.values_list('id', 'loyverse_id', 'nombre').iterator(chunk_size=5000):
+            self.productos_por_loyverse_id[loyverse_id] = producto_id
+            clave = nombre.strip().lower()
+            self.productos_por_nombre[clave] = None if clave in self.productos_por_nombre else producto_id
+
+    def importar(self, lineas, formato):
+        """
+        Importa las facturas de un iterable de líneas en bytes (un archivo abierto en
+        modo binario o un UploadedFile) en el formato 'csv' o 'jsonl'
+        """
+        texto = codecs.iterdecode(lineas, 'utf-8-sig')
+        if formato == 'csv':
+            facturas = self._facturas_csv(texto)
+        elif formato == 'jsonl':
+            facturas = self._facturas_jsonl(texto)
+        else:
+            return {'success': False, 'error': f'Formato no soportado: {formato}. Use csv o jsonl'}
+
+        lote = []
+        try:
+            for factura in facturas:
+                validada = self._validar_factura(factura)
+                if validada is None:
+                    continue
+                lote.append(validada)
+                if len(lote) >= self.FACTURAS_POR_LOTE:
+                    self._escribir_lote(lote)
+                    lote = []
+            self._escribir_lote(lote)
+        except ErrorFila as e:
+            # Errores del propio archivo (codificación, cabecera) que impiden seguir leyendo
+            self._registrar_error(e.fila, None, e.mensaje)
+            self._escribir_lote(lote)
+        except UnicodeDecodeError as e:
+            self._registrar_error(None, None, f'El archivo no está en UTF-8: {str(e)}')
+            self._escribir_lote(lote)
+
+        print(f"Importación de facturas: {self.facturas_creadas} creadas, {self.lineas_creadas} líneas, "
+              f"{self.facturas_con_error} con errores")
+        return {
+            # Se considera fallida solo si no se pudo crear ninguna factura y hubo errores
+            'success': self.facturas_creadas > 0 or (not self.facturas_con_error and not self.errores),
+            'facturas_creadas': self.facturas_creadas,
+            'lineas_creadas': self.lineas_creadas,
+            'facturas_con_error': self.facturas_con_error,
+            'errores': self.errores,
+            'errores_omitidos': self.errores_omitidos
+        }
+
+    def _facturas_csv(self, texto):
+        """
+        Genera (fila, referencia, cabecera, [(fila, línea)]) agrupando filas consecutivas
+        """
+        lector = csv.DictReader(texto)
+        if not lector.fieldnames or 'factura' not in lector.fieldnames or 'producto' not in lector.fieldnames:
+            raise ErrorFila(1, 'El CSV debe tener una cabecera con al menos las columnas factura y producto')
+
+        for referencia, filas in itertools.groupby(
+            ((lector.line_num, fila) for fila in lector),
+            key=lambda numerada: (numerada[1].get('factura') or '').strip()
+        ):
+            primera_fila = None
+            cabecera = None
+            lineas = []
+            for numero, fila in filas:
+                if primera_fila is None:
+                    primera_fila = numero
+                    cabecera = {
+                        'moneda': fila.get('moneda'),
+                        'tasa_cambio': fila.get('tasa_cambio'),
+                        'porcentaje_ganancia': fila.get('porcentaje_ganancia')
+                    }
+                lineas.append((numero, {
+                    'producto': fila.get('producto'),
+                    'cantidad': fila.get('cantidad'),
+                    'precio_unitario': fila.get('precio_unitario'),
+                    'precio_compra_usd': fila.get('precio_compra_usd'),
+                    'unidades_paquete': fila.get('unidades_paquete'),
+                    'porcentaje_ganancia': fila.get('porcentaje_ganancia_linea')
+                }))
+            if not referencia:
+                yield primera_fila, None, None, ErrorFila(primera_fila, 'Falta la referencia de la factura (columna factura)')
+                continue
+            yield primera_fila, referencia, cabecera, lineas
+
+    def _facturas_jsonl(self, texto):
+        """
+        Genera (fila, referencia, cabecera, [(fila, línea)]) con una factura por línea
+        """
+        for numero, linea in enumerate(texto, start=1):
+            if not linea.strip():
+                continue
+            try:
+                datos = json.loads(linea)
+                if not isinstance(datos, dict):
+                    raise ValueError('se esperaba un objeto')
+            except ValueError as e:
+                yield numero, None, None, ErrorFila(numero, f'JSON inválido: {str(e)}')
+                continue
+            detalles = datos.get('detalles')
+            if not isinstance(detalles, list) or not all(isinstance(detalle, dict) for detalle in detalles):
+                yield numero, datos.get('factura'), None, ErrorFila(numero, 'detalles debe ser una lista de objetos')
+                continue
+            yield numero, datos.get('factura'), datos, [(numero, detalle) for detalle in detalles]
+
+    def _validar_factura(self, factura):
+        """
+        Convierte una factura leída del archivo en (fila, referencia, Factura,
+        [DetalleFactura]) sin guardar, o registra sus errores y devuelve None.
+        Los lectores entregan un ErrorFila en lugar de las líneas cuando la factura
+        no se pudo leer.
+        """
+        fila, referencia, cabecera, lineas = factura
+        if isinstance(lineas, ErrorFila):
+            self._registrar_factura_con_error([lineas], referencia)
+            return None
+
+        errores = []
+        try:
+            moneda = (cabecera.get('moneda') or '').strip().upper()
+            if moneda not in self.MONEDAS:
+                raise ErrorFila(fila, f'Moneda inválida: {cabecera.get("moneda")!r}')
+            tasa_cambio = self._tasa(fila, cabecera.get('tasa_cambio'))
+            porcentaje = self._decimal(fila, 'porcentaje_ganancia', cabecera.get('porcentaje_ganancia'), 5, 2, requerido=False)
+        except ErrorFila as e:
+            errores.append(e)
+            moneda, tasa_cambio, porcentaje = None, None, None
+
+        detalles = []
+        for numero, linea in lineas:
+            try:
+                detalles.append(self._validar_linea(numero, linea))
+            except ErrorFila as e:
+                errores.append(e)
+
+        if not detalles and not errores:
+            errores.append(ErrorFila(fila, 'La factura no tiene líneas'))
+        if errores:
+            self._registrar_factura_con_error(errores, referencia)
+            return None
+
+        total_bs, total_usd = calcular_totales_factura(moneda, tasa_cambio, (detalle.total for detalle in detalles))
+        factura = Factura(
+            moneda=moneda,
+            tasa_cambio=tasa_cambio,
+            total_bs=total_bs,
+            total_usd=total_usd,
+            **({'porcentaje_ganancia': porcentaje} if porcentaje is not None else {})
+        )
+        return fila, referencia, factura, detalles
+
+    def _validar_linea(self, fila, linea):
+        """
+        Valida una línea igual que DetalleFacturaSerializer y la convierte en DetalleFactura
+        """
+        producto_id = self._producto(fila, linea.get('producto'))
+        cantidad = self._decimal(fila, 'cantidad', linea.get('cantidad'), 10, 2)
+        precio_unitario = self._decimal(fila, 'precio_unitario', linea.get('precio_unitario'), 10, 2)
+        precio_compra_usd = self._decimal(fila, 'precio_compra_usd', linea.get('precio_compra_usd'), 10, 2, requerido=False)
+        porcentaje = self._decimal(fila, 'porcentaje_ganancia', linea.get('porcentaje_ganancia'), 5, 2, requerido=False)
+        unidades = linea.get('unidades_paquete')
+        try:
+            unidades = int(unidades) if unidades not in (None, '') else 1
+        except (TypeError, ValueError):
+            raise ErrorFila(fila, f'unidades_paquete inválido: {unidades!r}')
+
+        return DetalleFactura(
+            producto_id=producto_id,
+            cantidad=cantidad,
+            precio_unitario=precio_unitario,
+            total=(cantidad * precio_unitario).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+            precio_compra_usd=precio_compra_usd,
+            unidades_paquete=unidades,
+            porcentaje_ganancia=porcentaje
+        )
+
+    def _producto(self, fila, valor):
+        """
+        Resuelve un producto por loyverse_id o, si no, por nombre (sin distinguir mayúsculas)
+        """
+        valor = str(valor).strip() if valor is not None else ''
+        if not valor:
+            raise ErrorFila(fila, 'Falta el producto')
+        if valor in self.productos_por_loyverse_id:
+            return self.productos_por_loyverse_id[valor]
+        clave = valor.lower()
+        if clave in self.productos_por_nombre:
+            producto_id = self.productos_por_nombre[clave]
+            if producto_id is None:
+                raise ErrorFila(fila, f'Hay varios productos llamados {valor!r}; use su loyverse_id')
+            return producto_id
+        raise ErrorFila(fila, f'Producto no encontrado: {valor!r}')
+
+    def _tasa(self, fila, valor):
+        """
+        Resuelve la tasa de cambio por id, recordando las ya consultadas
+        """
+        if valor in (None, ''):
+            return None
+        try:
+            tasa_id = int(valor)
+        except (TypeError, ValueError):
+            raise ErrorFila(fila, f'tasa_cambio inválida: {valor!r}')
+        if tasa_id not in self.tasas:
+            self.tasas[tasa_id] = TasaCambio.objects.filter(id=tasa_id).first()
+        if self.tasas[tasa_id] is None:
+            raise ErrorFila(fila, f'No existe la tasa de cambio {tasa_id}')
+        return self.tasas[tasa_id]
+
+    def _decimal(self, fila, campo, valor, max_digits, decimal_places, requerido=True):
+        """
+        Convierte un valor a Decimal con los mismos límites que el DecimalField del modelo
+        """
+        if valor is None or (isinstance(valor, str) and not valor.strip()):
+            if requerido:
+                raise ErrorFila(fila, f'Falta {campo}')
+            return None
+        try:
+            numero = Decimal(str(valor).strip())
+        except InvalidOperation:
+            raise ErrorFila(fila, f'{campo} no es un número: {valor!r}')
+        if not numero.is_finite():
+            raise ErrorFila(fila, f'{campo} no es un número: {valor!r}')
+        if -numero.as_tuple().exponent > decimal_places:
+            raise ErrorFila(fila, f'{campo} no puede tener más de {decimal_places} decimales: {valor!r}')
+        if abs(numero) >= 10 ** (max_digits - decimal_places):
+            raise ErrorFila(fila, f'{campo} tiene demasiados dígitos: {valor!r}')
+        return numero.quantize(Decimal(1).scaleb(-decimal_places), rounding=ROUND_HALF_UP)
+
+    def _escribir_lote(self, lote):
+        """
+        Guarda un lote de facturas validadas y sus líneas en una transacción. Si
+        falla, reintenta factura por factura para aislar la defectuosa.
+        """
+        if not lote:
+            return
+        try:
+            with transaction.atomic():
+                self._insertar(lote)
+        except Exception as e:
+            print(f"Error guardando un lote de {len(lote)} facturas, guardando una a una: {str(e)}")
+            for factura in lote:
+                try:
+                    with transaction.atomic():
+                        self._insertar([factura])
+                except Exception as e:
+                    self._registrar_factura_con_error([ErrorFila(factura[0], str(e))], factura[1])
+
+    def _insertar(self, lote):
+        numeros = reservar_numeros_factura(len(lote))
+        facturas = []
+        for (_, _, factura, _), numero in zip(lote, numeros):
+            factura.numero = numero
+            facturas.append(factura)
+        Factura.objects.bulk_create(facturas)
+
+        detalles = []
+        for _, _, factura, lineas in lote:
+            for detalle in lineas:
+                detalle.factura = factura
+                detalles.append(detalle)
+        DetalleFactura.objects.bulk_create(detalles, batch_size=1000)
+        acumular_compras(factura.id for factura in facturas)
+
+        self.facturas_creadas += len(facturas)
+        self.lineas_creadas += len(detalles)
+
+    def _registrar_factura_con_error(self, errores, referencia):
+        self.facturas_con_error += 1
+        for error in errores:
+            self._registrar_error(error.fila, referencia, error.mensaje)
+
+    def _registrar_error(self, fila, referencia, mensaje):
+        if len(self.errores) >= self.MAX_ERRORES:
+            self.errores_omitidos += 1
+            return
+        self.errores.append({'fila': fila, 'factura': referencia, 'error': mensaje})
+
+
+def formato_de_archivo(nombre):
+    """
+    Deduce el formato de importación a partir de la extensión del archivo
+    """
+    nombre = (nombre or '').lower()
+    if nombre.endswith('.csv'):
+        return 'csv'
+    if nombre.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
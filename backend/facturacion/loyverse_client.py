@@ -0,0 +1,230 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.utils import timezone
+
+
+class LimitadorVelocidad:
+    """
+    Token bucket compartido entre hilos: permite ráfagas de hasta `rafaga`
+    llamadas y un ritmo sostenido de `por_segundo` llamadas por segundo.
+    """
+
+    def __init__(self, por_segundo, rafaga=None):
+        self.intervalo = 1.0 / por_segundo if por_segundo > 0 else 0
+        self.capacidad = rafaga or max(1, int(por_segundo))
+        self.tokens = float(self.capacidad)
+        self.ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        """
+        Bloquea hasta que haya un token disponible y lo consume
+        """
+        if not self.intervalo:
+            return
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) / self.intervalo)
+                self.ultimo = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) * self.intervalo
+            time.sleep(espera)
+
+
+class LoyverseClient:
+    """
+    Cliente HTTP compartido para la API de Loyverse.
+
+    Mantiene una sesión con conexiones keep-alive reutilizables, aplica timeouts de
+    conexión y lectura, limita el ritmo de llamadas del proceso, reintenta con backoff
+    exponencial (respetando Retry-After en las respuestas 429) y lleva contadores por
+    endpoint.
+    """
+    BASE_URL = 'https://api.loyverse.com/v1.0'
+    # Códigos de estado que indican un fallo transitorio
+    STATUS_REINTENTABLES = {429, 500, 502, 503, 504}
+    # Métodos que se pueden repetir sin efectos secundarios ante un error del servidor
+    METODOS_IDEMPOTENTES = {'GET', 'PUT', 'DELETE', 'HEAD', 'OPTIONS'}
+    # Espera máxima entre reintentos, aunque Retry-After pida más
+    ESPERA_MAXIMA = 60
+
+    def __init__(self, token=None, connect_timeout=None, read_timeout=None,
+                 max_reintentos=None, backoff_base=None, pool_size=None, por_segundo=None):
+        self.token = token if token is not None else settings.LOYVERSE_API_TOKEN
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else getattr(settings, 'LOYVERSE_CONNECT_TIMEOUT', 5),
+            read_timeout if read_timeout is not None else getattr(settings, 'LOYVERSE_READ_TIMEOUT', 30),
+        )
+        self.max_reintentos = max_reintentos if max_reintentos is not None else getattr(settings, 'LOYVERSE_MAX_RETRIES', 3)
+        self.backoff_base = backoff_base if backoff_base is not None else getattr(settings, 'LOYVERSE_BACKOFF_BASE', 0.5)
+        pool_size = pool_size if pool_size is not None else getattr(settings, 'LOYVERSE_POOL_SIZE', 10)
+        por_segundo = por_segundo if por_segundo is not None else getattr(settings, 'LOYVERSE_RATE_LIMIT', 5)
+        self.limitador = LimitadorVelocidad(por_segundo)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {self.token}',
+            'Content-Type': 'application/json'
+        })
+
+        self._lock = threading.Lock()
+        self._contadores = {}
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """
+        Realiza una llamada a la API y devuelve la respuesta de requests.
+
+        Acepta tanto rutas relativas ('/items') como URLs completas de la API.
+        Las excepciones de red solo se propagan cuando se agotan los reintentos.
+        """
+        method = method.upper()
+        if not url.startswith('http'):
+            url = f"{self.BASE_URL}/{url.lstrip('/')}"
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = self._endpoint(method, url)
+
+        intento = 0
+        while True:
+            self.limitador.esperar()
+            inicio = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._registrar(endpoint, time.monotonic() - inicio, error=True)
+                if intento >= self.max_reintentos:
+                    raise
+                espera = self._backoff(intento)
+                print(f"Error de red en {endpoint} ({str(e)}). Reintento {intento + 1} en {espera:.2f}s")
+            else:
+                limitada = response.status_code == 429
+                self._registrar(
+                    endpoint,
+                    time.monotonic() - inicio,
+                    error=response.status_code >= 400,
+                    limitada=limitada
+                )
+                if not self._debe_reintentar(method, response) or intento >= self.max_reintentos:
+                    return response
+                espera = self._retry_after(response)
+                if espera is None:
+                    espera = self._backoff(intento)
+                print(f"Respuesta {response.status_code} en {endpoint}. Reintento {intento + 1} en {espera:.2f}s")
+
+            self._registrar_reintento(endpoint)
+            time.sleep(min(espera, self.ESPERA_MAXIMA))
+            intento += 1
+
+    def estadisticas(self):
+        """
+        Devuelve una copia de los contadores por endpoint
+        """
+        with self._lock:
+            return {
+                endpoint: {**contador, 'tiempo_total': round(contador['tiempo_total'], 3)}
+                for endpoint, contador in self._contadores.items()
+            }
+
+    def _debe_reintentar(self, method, response):
+        if response.status_code not in self.STATUS_REINTENTABLES:
+            return False
+        # Un 429 garantiza que la petición no se procesó; un 5xx solo se repite si es idempotente
+        return response.status_code == 429 or method in self.METODOS_IDEMPOTENTES
+
+    def _backoff(self, intento):
+        return self.backoff_base * (2 ** intento) + random.uniform(0, self.backoff_base)
+
+    def _retry_after(self, response):
+        """
+        Interpreta la cabecera Retry-After (segundos o fecha HTTP)
+        """
+        valor = response.headers.get('Retry-After')
+        if not valor:
+            return None
+        try:
+            return max(float(valor), 0)
+        except ValueError:
+            pass
+        try:
+            fecha = parsedate_to_datetime(valor)
+            return max((fecha - timezone.now()).total_seconds(), 0)
+        except (TypeError, ValueError):
+            return None
+
+    def _endpoint(self, method, url):
+        """
+        Normaliza la URL a 'MÉTODO /recurso/{id}' para agrupar los contadores
+        """
+        ruta = urlsplit(url).path
+        base = urlsplit(self.BASE_URL).path
+        if ruta.startswith(base):
+            ruta = ruta[len(base):]
+        partes = [parte for parte in ruta.split('/') if parte]
+        # En la API de Loyverse los segmentos alternan recurso / identificador
+        partes = [parte if i % 2 == 0 else '{id}' for i, parte in enumerate(partes)]
+        return f"{method} /{'/'.join(partes)}"
+
+    def _contador(self, endpoint):
+        if endpoint not in self._contadores:
+            self._contadores[endpoint] = {
+                'llamadas': 0,
+                'errores': 0,
+                'limitadas': 0,
+                'reintentos': 0,
+                'tiempo_total': 0.0
+            }
+        return self._contadores[endpoint]
+
+    def _registrar(self, endpoint, duracion, error=False, limitada=False):
+        with self._lock:
+            contador = self._contador(endpoint)
+            contador['llamadas'] += 1
+            contador['tiempo_total'] += duracion
+            if error:
+                contador['errores'] += 1
+            if limitada:
+                contador['limitadas'] += 1
+
+    def _registrar_reintento(self, endpoint):
+        with self._lock:
+            self._contador(endpoint)['reintentos'] += 1
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Devuelve el cliente compartido por todo el proceso
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LoyverseClient()
+    return _client
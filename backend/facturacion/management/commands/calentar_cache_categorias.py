@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from facturacion.services import LoyverseService
+
+
+class Command(BaseCommand):
+    help = 'Descarga las categorías de Loyverse y las guarda en la caché compartida'
+
+    def handle(self, *args, **options):
+        categorias = LoyverseService().obtener_categorias(refrescar=True)
+        if not categorias:
+            raise CommandError('No se pudieron obtener categorías de Loyverse')
+        self.stdout.write(self.style.SUCCESS(f'Caché de categorías cargada: {len(categorias)} categorías'))
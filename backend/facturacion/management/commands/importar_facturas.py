@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from facturacion.importacion import ImportadorFacturas, formato_de_archivo
+
+
+class Command(BaseCommand):
+    help = 'Importa facturas desde un archivo CSV o JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .jsonl')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'],
+                            help='Formato del archivo si no se puede deducir de la extensión')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or formato_de_archivo(options['archivo'])
+        if formato is None:
+            raise CommandError('No se pudo deducir el formato; use --formato csv o --formato jsonl')
+
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                result = ImportadorFacturas().importar(archivo, formato)
+        except OSError as e:
+            raise CommandError(f'No se pudo abrir el archivo: {str(e)}')
+
+        for error in result.get('errores', []):
+            self.stderr.write(f"Fila {error['fila']} (factura {error['factura']}): {error['error']}")
+        if result.get('errores_omitidos'):
+            self.stderr.write(f"... y {result['errores_omitidos']} errores más")
+        if not result['success']:
+            raise CommandError(result.get('error') or 'No se importó ninguna factura')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Facturas creadas: {result['facturas_creadas']} ({result['lineas_creadas']} líneas). "
+            f"Facturas con errores: {result['facturas_con_error']}"
+        ))
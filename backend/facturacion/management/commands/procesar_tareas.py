@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from facturacion.tareas import ejecutar_tarea, reclamar_tarea, recuperar_tareas_abandonadas
+
+
+class Command(BaseCommand):
+    help = 'Worker que ejecuta las tareas en segundo plano (sincronizaciones con Loyverse)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesar las tareas pendientes y terminar en lugar de quedarse esperando')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera entre consultas cuando no hay tareas pendientes')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Worker de tareas iniciado')
+        while True:
+            # El worker vive mucho tiempo: descartar conexiones caídas o vencidas
+            close_old_connections()
+            recuperar_tareas_abandonadas()
+            tarea = reclamar_tarea()
+            if tarea is not None:
+                ejecutar_tarea(tarea)
+                continue
+            if options['una_vez']:
+                break
+            time.sleep(options['intervalo'])
+        self.stdout.write(self.style.SUCCESS('Worker de tareas finalizado'))
@@ -0,0 +1,24 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from facturacion.resumenes import reconstruir_resumen
+
+
+def _dia(valor):
+    try:
+        return datetime.date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor} (use AAAA-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen diario de compras a partir de las facturas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_dia, help='Primer día a recalcular (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=_dia, help='Último día a recalcular (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        filas = reconstruir_resumen(options['desde'], options['hasta'])
+        self.stdout.write(self.style.SUCCESS(f'Resumen de compras reconstruido: {filas} filas'))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0008_producto_aplicar_iva'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoSincronizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recurso', models.CharField(help_text='Recurso de Loyverse (items, categories...)', max_length=50, unique=True)),
+                ('ultimo_updated_at', models.DateTimeField(blank=True, help_text='Mayor updated_at recibido de Loyverse', null=True)),
+                ('ultima_sincronizacion', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0009_estadosincronizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemLoyverse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('loyverse_id', models.CharField(max_length=255, unique=True)),
+                ('datos', models.JSONField(help_text='Documento del item tal como lo devuelve /items/{id}')),
+                ('updated_at_loyverse', models.DateTimeField(blank=True, null=True)),
+                ('sincronizado_en', models.DateTimeField(help_text='Momento en que se refrescó el espejo')),
+            ],
+        ),
+    ]
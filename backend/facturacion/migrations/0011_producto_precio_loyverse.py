@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0010_itemloyverse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='precio_loyverse',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Último precio confirmado en Loyverse (recibido o enviado)', max_digits=10, null=True),
+        ),
+    ]
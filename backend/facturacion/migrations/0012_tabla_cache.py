@@ -0,0 +1,18 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def crear_tabla_cache(apps, schema_editor):
+    # createcachetable no hace nada si la tabla ya existe o si la caché no es de base de datos
+    call_command('createcachetable', database=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0011_producto_precio_loyverse'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_tabla_cache, migrations.RunPython.noop),
+    ]
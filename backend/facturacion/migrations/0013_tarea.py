@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-17 14:38
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0012_tabla_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('sync_from_loyverse', 'Sincronizar productos desde Loyverse'), ('sync_to_loyverse', 'Enviar precios a Loyverse'), ('procesar_factura', 'Procesar factura')], max_length=50)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('clave', models.CharField(help_text='Hash de tipo y parámetros para fusionar solicitudes idénticas', max_length=64)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_PROCESO', 'En proceso'), ('COMPLETADA', 'Completada'), ('FALLIDA', 'Fallida')], default='PENDIENTE', max_length=20)),
+                ('progreso', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Avance reportado por el servicio (páginas, items, fallos...)')),
+                ('resultado', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('intentos', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('iniciada_en', models.DateTimeField(blank=True, null=True)),
+                ('finalizada_en', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Se renueva con cada avance; sirve de latido del worker')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['estado', 'created_at'], name='facturacion_estado_2ffc68_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tarea',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['PENDIENTE', 'EN_PROCESO'])), fields=('clave',), name='tarea_activa_unica'),
+        ),
+    ]
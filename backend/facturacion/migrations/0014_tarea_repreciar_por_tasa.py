@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0013_tarea'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tarea',
+            name='tipo',
+            field=models.CharField(choices=[('sync_from_loyverse', 'Sincronizar productos desde Loyverse'), ('sync_to_loyverse', 'Enviar precios a Loyverse'), ('procesar_factura', 'Procesar factura'), ('repreciar_por_tasa', 'Recalcular precios por nueva tasa PARALELO')], max_length=50),
+        ),
+    ]
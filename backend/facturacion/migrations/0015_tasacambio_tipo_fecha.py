@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0014_tarea_repreciar_por_tasa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tasacambio',
+            index=models.Index(fields=['tipo', '-fecha'], name='facturacion_tipo_b8f753_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0015_tasacambio_tipo_fecha'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            # Empieza en 10000 para no coincidir con los números aleatorios
+            # (1000-9999) que se asignaban antes
+            "CREATE SEQUENCE IF NOT EXISTS facturacion_factura_numero_seq START WITH 10000;",
+            "DROP SEQUENCE IF EXISTS facturacion_factura_numero_seq;"
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-17 14:51
+
+from django.db import migrations, models
+
+
+def marcar_lineas_sincronizadas(apps, schema_editor):
+    # Las líneas de facturas ya procesadas se consideran enviadas
+    DetalleFactura = apps.get_model('facturacion', 'DetalleFactura')
+    DetalleFactura.objects.filter(factura__sincronizado_loyverse=True).update(estado_sincronizacion='ENVIADO')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0016_secuencia_numero_factura'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detallefactura',
+            name='estado_sincronizacion',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('ENVIADO', 'Enviado'), ('FALLIDO', 'Fallido')], default='PENDIENTE', help_text='Estado del envío del precio de la línea a Loyverse', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='detallefactura',
+            name='intentos',
+            field=models.IntegerField(default=0, help_text='Envíos a Loyverse intentados para esta línea'),
+        ),
+        migrations.AddField(
+            model_name='detallefactura',
+            name='sincronizado_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='detallefactura',
+            name='ultimo_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.RunPython(marcar_lineas_sincronizadas, migrations.RunPython.noop),
+    ]
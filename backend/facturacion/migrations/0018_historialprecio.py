@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-17 14:54
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# Punto de partida del historial: el precio actual de cada producto
+SEMBRAR_HISTORIAL = """
+    INSERT INTO facturacion_historialprecio (producto_id, precio_anterior, precio, fuente, fecha)
+    SELECT id, NULL, precio_base,
+           CASE WHEN fuente_actualizacion IN ('loyverse', 'calculado', 'factura')
+                THEN fuente_actualizacion ELSE 'loyverse' END,
+           COALESCE(ultima_actualizacion_precio, updated_at)
+    FROM facturacion_producto
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0017_detallefactura_estado_sincronizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorialPrecio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precio_anterior', models.DecimalField(blank=True, decimal_places=2, help_text='Vacío en el primer precio conocido del producto', max_digits=10, null=True)),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('fuente', models.CharField(choices=[('loyverse', 'Loyverse'), ('calculado', 'Calculado'), ('factura', 'Factura'), ('manual', 'Manual')], max_length=10)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('factura', models.ForeignKey(blank=True, help_text='Factura que originó el cambio, si la hay', null=True, on_delete=django.db.models.deletion.SET_NULL, to='facturacion.factura')),
+                ('producto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='historial_precios', to='facturacion.producto')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='historialprecio',
+            index=models.Index(fields=['producto', '-fecha'], name='facturacion_product_1c59da_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialprecio',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['fecha'], name='historial_fecha_brin'),
+        ),
+        migrations.RunSQL(SEMBRAR_HISTORIAL, migrations.RunSQL.noop),
+    ]
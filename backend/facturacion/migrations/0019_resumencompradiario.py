@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-17 14:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def acumular_facturas_existentes(apps, schema_editor):
+    # Resumen inicial a partir de todas las facturas ya registradas
+    schema_editor.execute("""
+        INSERT INTO facturacion_resumencompradiario
+            (fecha, producto_id, moneda, categoria, lineas, cantidad, total, total_usd, total_bs, suma_porcentaje_ganancia)
+        SELECT (f.fecha AT TIME ZONE %s)::date, d.producto_id, f.moneda, COALESCE(p.categoria, ''),
+               COUNT(*), SUM(d.cantidad), SUM(d.total),
+               SUM(CASE WHEN f.moneda = 'USD' THEN d.total WHEN t.valor > 0 THEN d.total / t.valor ELSE 0 END),
+               SUM(CASE WHEN f.moneda = 'BS' THEN d.total WHEN t.valor IS NOT NULL THEN d.total * t.valor ELSE 0 END),
+               SUM(COALESCE(d.porcentaje_ganancia, f.porcentaje_ganancia))
+        FROM facturacion_detallefactura d
+        JOIN facturacion_factura f ON f.id = d.factura_id
+        JOIN facturacion_producto p ON p.id = d.producto_id
+        LEFT JOIN facturacion_tasacambio t ON t.id = f.tasa_cambio_id
+        GROUP BY 1, 2, 3, 4
+    """, [settings.TIME_ZONE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0018_historialprecio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCompraDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(help_text='Día de la factura en la zona horaria del proyecto')),
+                ('moneda', models.CharField(choices=[('USD', 'Dólares'), ('BS', 'Bolívares')], max_length=3)),
+                ('categoria', models.CharField(blank=True, default='', help_text='Categoría del producto en la última compra acumulada', max_length=255)),
+                ('lineas', models.IntegerField(default=0)),
+                ('cantidad', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total', models.DecimalField(decimal_places=2, default=0, help_text='Suma de los totales de línea en la moneda de la factura', max_digits=18)),
+                ('total_usd', models.DecimalField(decimal_places=4, default=0, max_digits=20)),
+                ('total_bs', models.DecimalField(decimal_places=4, default=0, max_digits=20)),
+                ('suma_porcentaje_ganancia', models.DecimalField(decimal_places=2, default=0, help_text='Se divide entre lineas para obtener el promedio', max_digits=15)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_compra', to='facturacion.producto')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='resumencompradiario',
+            constraint=models.UniqueConstraint(fields=('fecha', 'producto', 'moneda'), name='resumen_compra_dia_producto_moneda'),
+        ),
+        migrations.RunPython(acumular_facturas_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0019_resumencompradiario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre', 'id'], name='facturacion_nombre_2efe8d_idx'),
+        ),
+    ]
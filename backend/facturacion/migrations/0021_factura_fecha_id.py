@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0020_producto_nombre_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['fecha', 'id'], name='facturacion_fecha_1f0f77_idx'),
+        ),
+    ]
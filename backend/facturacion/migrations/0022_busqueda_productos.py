@@ -0,0 +1,35 @@
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0021_factura_fecha_id'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.RunSQL(
+            # unaccent() no es IMMUTABLE y no se puede indexar directamente; este
+            # envoltorio con el diccionario explícito sí lo es
+            """
+            CREATE OR REPLACE FUNCTION facturacion_producto_busqueda(nombre text, categoria text, loyverse_id text)
+            RETURNS text
+            LANGUAGE sql IMMUTABLE PARALLEL SAFE
+            AS $$
+                SELECT lower(public.unaccent('public.unaccent'::regdictionary,
+                             nombre || ' ' || coalesce(categoria, '') || ' ' || loyverse_id))
+            $$;
+            """,
+            "DROP FUNCTION IF EXISTS facturacion_producto_busqueda(text, text, text);"
+        ),
+        migrations.RunSQL(
+            """
+            CREATE INDEX IF NOT EXISTS facturacion_producto_busqueda_trgm ON facturacion_producto
+            USING gin (facturacion_producto_busqueda(nombre, categoria, loyverse_id) gin_trgm_ops);
+            """,
+            "DROP INDEX IF EXISTS facturacion_producto_busqueda_trgm;"
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 15:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0022_busqueda_productos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['updated_at'], name='facturacion_updated_9c8b0b_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-17 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0023_producto_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='porcentaje_ganancia',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Último porcentaje de ganancia aplicado al precio; sin él, una nueva tasa PARALELO no recalcula el producto', max_digits=5, null=True),
+        ),
+        migrations.RunSQL(
+            # Los productos cuyo precio salió de una factura toman el porcentaje de
+            # su línea más reciente; el del resto se desconoce
+            """
+            UPDATE facturacion_producto AS p
+            SET porcentaje_ganancia = u.porcentaje
+            FROM (
+                SELECT DISTINCT ON (d.producto_id)
+                       d.producto_id, COALESCE(d.porcentaje_ganancia, f.porcentaje_ganancia) AS porcentaje
+                FROM facturacion_detallefactura d
+                JOIN facturacion_factura f ON f.id = d.factura_id
+                ORDER BY d.producto_id, f.fecha DESC, d.id DESC
+            ) AS u
+            WHERE p.id = u.producto_id AND p.fuente_actualizacion = 'factura';
+            """,
+            migrations.RunSQL.noop
+        ),
+    ]
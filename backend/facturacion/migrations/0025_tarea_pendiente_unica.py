@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-17 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0024_producto_porcentaje_ganancia'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='tarea',
+            name='tarea_activa_unica',
+        ),
+        migrations.AlterField(
+            model_name='tarea',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Latido del worker: se renueva periódicamente mientras la tarea se ejecuta'),
+        ),
+        migrations.AddConstraint(
+            model_name='tarea',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'PENDIENTE')), fields=('clave',), name='tarea_pendiente_unica'),
+        ),
+    ]
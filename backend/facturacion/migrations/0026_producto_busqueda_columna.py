@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0025_tarea_pendiente_unica'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            # El índice de expresión obligaba a recalcular unaccent en cada fila
+            # candidata al comprobarla y ordenarla; la columna generada guarda el
+            # texto ya normalizado y lo mantiene Postgres en cada INSERT y UPDATE.
+            # El índice btree en orden binario (COLLATE "C") resuelve "empieza por"
+            # como un rango y da el orden de los resultados sin ordenar los candidatos.
+            """
+            ALTER TABLE facturacion_producto ADD COLUMN busqueda text
+            GENERATED ALWAYS AS (facturacion_producto_busqueda(nombre, categoria, loyverse_id)) STORED;
+            DROP INDEX IF EXISTS facturacion_producto_busqueda_trgm;
+            CREATE INDEX facturacion_producto_busqueda_trgm ON facturacion_producto
+            USING gin (busqueda gin_trgm_ops);
+            CREATE INDEX facturacion_producto_busqueda_orden ON facturacion_producto
+            ((busqueda COLLATE "C"), id);
+            """,
+            """
+            DROP INDEX IF EXISTS facturacion_producto_busqueda_orden;
+            DROP INDEX IF EXISTS facturacion_producto_busqueda_trgm;
+            ALTER TABLE facturacion_producto DROP COLUMN IF EXISTS busqueda;
+            CREATE INDEX facturacion_producto_busqueda_trgm ON facturacion_producto
+            USING gin (facturacion_producto_busqueda(nombre, categoria, loyverse_id) gin_trgm_ops);
+            """
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+def funcion_busqueda(texto):
+    return f"""
+    CREATE OR REPLACE FUNCTION facturacion_producto_busqueda(nombre text, categoria text, loyverse_id text)
+    RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS $$
+        SELECT {texto}
+    $$;
+    """
+
+
+# Regenera la columna con la función actual: Postgres no recalcula los valores
+# guardados al reemplazar la función. Sus índices se borran con ella y, tras
+# reescribir la tabla, ANALYZE deja al planificador estadísticas de la columna nueva.
+REGENERAR_COLUMNA = """
+    ALTER TABLE facturacion_producto DROP COLUMN busqueda;
+    ALTER TABLE facturacion_producto ADD COLUMN busqueda text
+    GENERATED ALWAYS AS (facturacion_producto_busqueda(nombre, categoria, loyverse_id)) STORED;
+    CREATE INDEX facturacion_producto_busqueda_trgm ON facturacion_producto
+    USING gin (busqueda gin_trgm_ops);
+    CREATE INDEX facturacion_producto_busqueda_orden ON facturacion_producto
+    ((busqueda COLLATE "C"), id);
+    ANALYZE facturacion_producto;
+"""
+
+TEXTO_ANTERIOR = """lower(public.unaccent('public.unaccent'::regdictionary,
+                     nombre || ' ' || coalesce(categoria, '') || ' ' || loyverse_id))"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturacion', '0026_producto_busqueda_columna'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            # Espacios colapsados y sin espacios en los extremos, como el texto buscado
+            # (busqueda.normalizar): "Leche  Entera" debe encontrarse con "leche entera"
+            funcion_busqueda(f"btrim(regexp_replace({TEXTO_ANTERIOR}, '\\s+', ' ', 'g'))") + REGENERAR_COLUMNA,
+            funcion_busqueda(TEXTO_ANTERIOR) + REGENERAR_COLUMNA
+        ),
+    ]
@@ -1,4 +1,7 @@
+from django.contrib.postgres.indexes import BrinIndex
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 class Producto(models.Model):
     loyverse_id = models.CharField(max_length=255, unique=True)
@@ -18,6 +21,16 @@ class Producto(models.Model):
     categoria = models.CharField(max_length=255, null=True, blank=True)
     fuente_actualizacion = models.CharField(max_length=50, default='loyverse', blank=True, help_text="Indica la fuente de la última actualización (loyverse, factura)")
     aplicar_iva = models.BooleanField(default=False, help_text="Indica si se debe aplicar IVA al producto")
+    precio_loyverse = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Último precio confirmado en Loyverse (recibido o enviado)")
+    porcentaje_ganancia = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, help_text="Último porcentaje de ganancia aplicado al precio; sin él, una nueva tasa PARALELO no recalcula el producto")
+
+    class Meta:
+        indexes = [
+            # Paginación por cursor del listado ordenado por nombre
+            models.Index(fields=['nombre', 'id']),
+            # max(updated_at) para los validadores de caché del listado
+            models.Index(fields=['updated_at']),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -32,6 +45,12 @@ class TasaCambio(models.Model):
     valor = models.DecimalField(max_digits=10, decimal_places=2)
     fecha = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Búsqueda de la tasa más reciente de cada tipo
+            models.Index(fields=['tipo', '-fecha']),
+        ]
+
     def __str__(self):
         return f"{self.tipo} - {self.valor} - {self.fecha.strftime('%Y-%m-%d')}"
 
@@ -50,10 +69,22 @@ class Factura(models.Model):
     sincronizado_loyverse = models.BooleanField(default=False)
     porcentaje_ganancia = models.DecimalField(max_digits=5, decimal_places=2, default=30.00)
 
+    class Meta:
+        indexes = [
+            # Paginación por cursor del listado, de la más reciente a la más antigua
+            models.Index(fields=['fecha', 'id']),
+        ]
+
     def __str__(self):
         return f"Factura #{self.numero}"
 
 class DetalleFactura(models.Model):
+    ESTADO_SINCRONIZACION_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('ENVIADO', 'Enviado'),
+        ('FALLIDO', 'Fallido'),
+    ]
+    
     factura = models.ForeignKey(Factura, related_name='detalles', on_delete=models.CASCADE)
     producto = models.ForeignKey(Producto, on_delete=models.PROTECT)
     cantidad = models.DecimalField(max_digits=10, decimal_places=2)
@@ -62,6 +93,10 @@ class DetalleFactura(models.Model):
     porcentaje_ganancia = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     precio_compra_usd = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     unidades_paquete = models.IntegerField(default=1)
+    estado_sincronizacion = models.CharField(max_length=10, choices=ESTADO_SINCRONIZACION_CHOICES, default='PENDIENTE', help_text="Estado del envío del precio de la línea a Loyverse")
+    ultimo_error = models.TextField(null=True, blank=True)
+    intentos = models.IntegerField(default=0, help_text="Envíos a Loyverse intentados para esta línea")
+    sincronizado_en = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.producto.nombre} - {self.cantidad} x {self.precio_unitario}"
@@ -89,4 +124,139 @@ class Webhook(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.type} - {self.url}" 
\ No newline at end of file
+        return f"{self.type} - {self.url}" 
+
+class EstadoSincronizacion(models.Model):
+    """
+    Marca de agua de la última sincronización completa de un recurso de Loyverse
+    """
+    recurso = models.CharField(max_length=50, unique=True, help_text="Recurso de Loyverse (items, categories...)")
+    ultimo_updated_at = models.DateTimeField(null=True, blank=True, help_text="Mayor updated_at recibido de Loyverse")
+    ultima_sincronizacion = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.recurso} - {self.ultimo_updated_at}"
+
+class ItemLoyverse(models.Model):
+    """
+    Espejo local del último documento completo conocido de un item de Loyverse
+    (variantes y configuración por tienda), usado para construir los PUT de precios
+    sin consultar antes la API
+    """
+    loyverse_id = models.CharField(max_length=255, unique=True)
+    datos = models.JSONField(help_text="Documento del item tal como lo devuelve /items/{id}")
+    updated_at_loyverse = models.DateTimeField(null=True, blank=True)
+    sincronizado_en = models.DateTimeField(help_text="Momento en que se refrescó el espejo")
+
+    def __str__(self):
+        return f"{self.loyverse_id} - {self.sincronizado_en}"
+
+class Tarea(models.Model):
+    """
+    Trabajo largo (sincronizaciones con Loyverse) ejecutado fuera de la petición HTTP
+    por el proceso `manage.py procesar_tareas`
+    """
+    TIPO_CHOICES = [
+        ('sync_from_loyverse', 'Sincronizar productos desde Loyverse'),
+        ('sync_to_loyverse', 'Enviar precios a Loyverse'),
+        ('procesar_factura', 'Procesar factura'),
+        ('repreciar_por_tasa', 'Recalcular precios por nueva tasa PARALELO'),
+    ]
+    
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En proceso'),
+        ('COMPLETADA', 'Completada'),
+        ('FALLIDA', 'Fallida'),
+    ]
+    
+    # Estados en los que una tarea todavía puede absorber solicitudes idénticas. Una
+    # tarea en proceso no: puede haber pasado ya por los datos que motivan la nueva
+    # solicitud, que se encola detrás de ella
+    ESTADOS_ACTIVOS = ['PENDIENTE']
+    
+    tipo = models.CharField(max_length=50, choices=TIPO_CHOICES)
+    parametros = models.JSONField(default=dict, blank=True)
+    clave = models.CharField(max_length=64, help_text="Hash de tipo y parámetros para fusionar solicitudes idénticas")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE')
+    progreso = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, help_text="Avance reportado por el servicio (páginas, items, fallos...)")
+    resultado = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(null=True, blank=True)
+    intentos = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    iniciada_en = models.DateTimeField(null=True, blank=True)
+    finalizada_en = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Latido del worker: se renueva periódicamente mientras la tarea se ejecuta")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['clave'],
+                condition=models.Q(estado='PENDIENTE'),
+                name='tarea_pendiente_unica'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.id} - {self.estado}"
+
+class HistorialPrecio(models.Model):
+    """
+    Registro de solo inserción de cada cambio de precio_base de un producto
+    """
+    FUENTE_CHOICES = [
+        ('loyverse', 'Loyverse'),
+        ('calculado', 'Calculado'),
+        ('factura', 'Factura'),
+        ('manual', 'Manual'),
+    ]
+    
+    # Sin índice propio: lo cubre el índice (producto, -fecha)
+    producto = models.ForeignKey(Producto, related_name='historial_precios', on_delete=models.CASCADE, db_index=False)
+    precio_anterior = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Vacío en el primer precio conocido del producto")
+    precio = models.DecimalField(max_digits=10, decimal_places=2)
+    fuente = models.CharField(max_length=10, choices=FUENTE_CHOICES)
+    factura = models.ForeignKey(Factura, on_delete=models.SET_NULL, null=True, blank=True, help_text="Factura que originó el cambio, si la hay")
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Precio de un producto en un momento dado: el primer registro con fecha <= T
+            models.Index(fields=['producto', '-fecha']),
+            # Cambios en una ventana de tiempo; la tabla solo crece en orden de fecha,
+            # así que un BRIN basta y ocupa una fracción de un B-tree
+            BrinIndex(fields=['fecha'], name='historial_fecha_brin'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} - {self.precio_anterior} -> {self.precio} ({self.fuente})"
+
+class ResumenCompraDiario(models.Model):
+    """
+    Compras acumuladas por día, producto y moneda, mantenidas al crear, modificar y
+    borrar facturas para que los reportes no recorran todas las líneas
+    """
+    fecha = models.DateField(help_text="Día de la factura en la zona horaria del proyecto")
+    producto = models.ForeignKey(Producto, related_name='resumenes_compra', on_delete=models.CASCADE)
+    moneda = models.CharField(max_length=3, choices=Factura.MONEDA_CHOICES)
+    categoria = models.CharField(max_length=255, blank=True, default='', help_text="Categoría del producto en la última compra acumulada")
+    lineas = models.IntegerField(default=0)
+    cantidad = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0, help_text="Suma de los totales de línea en la moneda de la factura")
+    # Con más decimales para que el redondeo de la conversión no se acumule entre filas
+    total_usd = models.DecimalField(max_digits=20, decimal_places=4, default=0)
+    total_bs = models.DecimalField(max_digits=20, decimal_places=4, default=0)
+    suma_porcentaje_ganancia = models.DecimalField(max_digits=15, decimal_places=2, default=0, help_text="Se divide entre lineas para obtener el promedio")
+
+    class Meta:
+        constraints = [
+            # También sirve de índice para las consultas por rango de fechas
+            models.UniqueConstraint(fields=['fecha', 'producto', 'moneda'], name='resumen_compra_dia_producto_moneda'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.producto_id} - {self.moneda}: {self.total}"
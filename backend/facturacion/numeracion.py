@@ -0,0 +1,37 @@
+import datetime
+
+from django.db import connection
+
+# Secuencia de Postgres creada en la migración 0016
+SECUENCIA_NUMERO_FACTURA = 'facturacion_factura_numero_seq'
+
+
+def siguiente_numero_factura(fecha=None):
+    """
+    Devuelve un número de factura con el formato F{YYYYMMDD}-{n}.
+
+    n sale de una secuencia de la base de datos: nextval no bloquea la tabla ni
+    se deshace con la transacción, así que las facturas creadas en paralelo
+    nunca reciben el mismo número. Los números son crecientes pero pueden quedar
+    huecos (facturas que fallaron tras pedir su número).
+    """
+    fecha = fecha or datetime.datetime.now()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(%s)", [SECUENCIA_NUMERO_FACTURA])
+        n = cursor.fetchone()[0]
+    return f"F{fecha.strftime('%Y%m%d')}-{n:04d}"
+
+
+def reservar_numeros_factura(cantidad, fecha=None):
+    """
+    Reserva `cantidad` números de factura con una sola consulta a la secuencia
+    """
+    if cantidad <= 0:
+        return []
+    fecha = fecha or datetime.datetime.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            [SECUENCIA_NUMERO_FACTURA, cantidad]
+        )
+        return [f"F{fecha.strftime('%Y%m%d')}-{n:04d}" for (n,) in cursor.fetchall()]
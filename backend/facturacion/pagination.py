@@ -0,0 +1,150 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PaginacionKeyset(BasePagination):
+    """
+    Paginación por cursor sobre una ordenación única (keyset): cada página se
+    pide con "WHERE (campos) > (última fila) ORDER BY campos LIMIT n", así que
+    su costo no depende de lo lejos que esté en el listado, a diferencia de OFFSET.
+
+    La respuesta es {'next': url de la siguiente página o None, 'results': [...]}.
+    No se devuelve el total: contarlo recorrería toda la tabla en cada página.
+
+    Las ordenaciones se declaran como en order_by ('-campo' es descendente).
+    """
+    page_size = 100
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    # Ordenaciones admitidas; el último campo de cada una debe ser único
+    ordenaciones = {
+        'id': ('id',),
+        'nombre': ('nombre', 'id'),
+    }
+    ordenacion_por_defecto = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Devuelve la página pedida; admite querysets de modelos o de values()
+        siempre que incluyan los campos de la ordenación
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.campos = self.get_ordering(request)
+        self.modelo = queryset.model
+
+        queryset = queryset.order_by(*self.campos)
+        posicion = self.decode_cursor(request)
+        if posicion is not None:
+            queryset = queryset.filter(self._despues_de(posicion))
+
+        filas = list(queryset[:self.page_size + 1])
+        self.siguiente = None
+        if len(filas) > self.page_size:
+            filas = filas[:self.page_size]
+            self.siguiente = self._posicion(filas[-1])
+        return filas
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data
+        })
+
+    def get_page_size(self, request):
+        try:
+            tamano = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(tamano, self.max_page_size))
+
+    def get_ordering(self, request):
+        ordenacion = request.query_params.get(self.ordering_query_param, self.ordenacion_por_defecto)
+        return self.ordenaciones.get(ordenacion, self.ordenaciones[self.ordenacion_por_defecto])
+
+    def get_next_link(self):
+        if self.siguiente is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.siguiente)
+        )
+
+    def encode_cursor(self, posicion):
+        return base64.urlsafe_b64encode(json.dumps(posicion).encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            posicion = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound('Cursor inválido')
+        if not isinstance(posicion, list) or len(posicion) != len(self.campos):
+            raise NotFound('Cursor inválido')
+        return [self._valor_cursor(campo, valor) for campo, valor in zip(self.campos, posicion)]
+
+    def _valor_cursor(self, campo, valor):
+        """
+        Convierte un valor del cursor al tipo del campo; un cursor bien codificado
+        pero con valores de otro tipo ([{}], fechas mal escritas...) es inválido
+        """
+        # bool es un int para Python, pero no es un valor que produzca _posicion
+        if not isinstance(valor, (str, int, float)) or isinstance(valor, bool):
+            raise NotFound('Cursor inválido')
+        try:
+            valor = self.modelo._meta.get_field(campo.lstrip('-')).to_python(valor)
+        except ValidationError:
+            raise NotFound('Cursor inválido')
+        if valor is None:
+            raise NotFound('Cursor inválido')
+        return valor
+
+    def _posicion(self, fila):
+        posicion = []
+        for campo in self.campos:
+            campo = campo.lstrip('-')
+            valor = fila[campo] if isinstance(fila, dict) else getattr(fila, campo)
+            # Fechas en ISO 8601 completo: el cursor no debe perder los microsegundos
+            posicion.append(valor.isoformat() if hasattr(valor, 'isoformat') else valor)
+        return posicion
+
+    def _despues_de(self, posicion):
+        """
+        Filtro (c1, c2, ...) > (v1, v2, ...) en el orden lexicográfico de la
+        ordenación (< en los campos descendentes). El primer campo se acota además
+        con >= (o <=) para que el índice pueda empezar el recorrido en la posición
+        del cursor.
+        """
+        def despues(campo, valor, inclusivo=False):
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            return Q(**{f"{campo.lstrip('-')}__{operador}{'e' if inclusivo else ''}": valor})
+
+        condicion = despues(self.campos[-1], posicion[-1])
+        for campo, valor in zip(reversed(self.campos[:-1]), reversed(posicion[:-1])):
+            condicion = despues(campo, valor) | (Q(**{campo.lstrip('-'): valor}) & condicion)
+        if len(self.campos) > 1:
+            condicion &= despues(self.campos[0], posicion[0], inclusivo=True)
+        return condicion
+
+
+class PaginacionFacturas(PaginacionKeyset):
+    """
+    Facturas de la más reciente a la más antigua
+    """
+    page_size = 25
+    max_page_size = 200
+    ordenaciones = {
+        '-fecha': ('-fecha', '-id'),
+    }
+    ordenacion_por_defecto = '-fecha'
@@ -0,0 +1,203 @@
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import DetalleFactura, Factura, Producto, ResumenCompraDiario, TasaCambio
+
+# Agrupa las líneas de las facturas seleccionadas por día (en la zona horaria
+# del proyecto), producto y moneda. El total de cada línea está en la moneda de
+# la factura y se convierte con su tasa igual que en calcular_totales_factura.
+# Se ordena por la clave del resumen para que dos transacciones que acumulan a
+# la vez bloqueen las filas en el mismo orden.
+SELECT_COMPRAS = f"""
+    SELECT (f.fecha AT TIME ZONE %(zona)s)::date, d.producto_id, f.moneda, COALESCE(p.categoria, ''),
+           %(signo)s * COUNT(*),
+           %(signo)s * SUM(d.cantidad),
+           %(signo)s * SUM(d.total),
+           %(signo)s * SUM(CASE WHEN f.moneda = 'USD' THEN d.total
+                                WHEN t.valor > 0 THEN d.total / t.valor ELSE 0 END),
+           %(signo)s * SUM(CASE WHEN f.moneda = 'BS' THEN d.total
+                                WHEN t.valor IS NOT NULL THEN d.total * t.valor ELSE 0 END),
+           %(signo)s * SUM(COALESCE(d.porcentaje_ganancia, f.porcentaje_ganancia))
+    FROM {DetalleFactura._meta.db_table} d
+    JOIN {Factura._meta.db_table} f ON f.id = d.factura_id
+    JOIN {Producto._meta.db_table} p ON p.id = d.producto_id
+    LEFT JOIN {TasaCambio._meta.db_table} t ON t.id = f.tasa_cambio_id
+    WHERE {{filtro}}
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1, 2, 3
+"""
+
+INSERT_RESUMEN = f"""
+    INSERT INTO {ResumenCompraDiario._meta.db_table} AS r
+        (fecha, producto_id, moneda, categoria, lineas, cantidad, total, total_usd, total_bs, suma_porcentaje_ganancia)
+"""
+
+ACUMULAR = INSERT_RESUMEN + SELECT_COMPRAS.format(filtro='f.id = ANY(%(facturas)s)') + """
+    ON CONFLICT (fecha, producto_id, moneda) DO UPDATE SET
+        categoria = EXCLUDED.categoria,
+        lineas = r.lineas + EXCLUDED.lineas,
+        cantidad = r.cantidad + EXCLUDED.cantidad,
+        total = r.total + EXCLUDED.total,
+        total_usd = r.total_usd + EXCLUDED.total_usd,
+        total_bs = r.total_bs + EXCLUDED.total_bs,
+        suma_porcentaje_ganancia = r.suma_porcentaje_ganancia + EXCLUDED.suma_porcentaje_ganancia
+    RETURNING r.id, r.lineas
+"""
+
+# Campos de la factura que cambian su aporte al resumen
+CAMPOS_RESUMEN = ('moneda', 'tasa_cambio', 'porcentaje_ganancia')
+
+# Agrupaciones admitidas por reporte_compras: nombre -> columnas de values()
+AGRUPACIONES = {
+    'dia': ['fecha'],
+    'mes': ['mes'],
+    'producto': ['producto', 'producto__nombre'],
+    'categoria': ['categoria'],
+    'moneda': ['moneda'],
+}
+
+
+def acumular_compras(factura_ids):
+    """
+    Suma al resumen diario las líneas de las facturas indicadas con un único
+    INSERT ... ON CONFLICT DO UPDATE. Debe llamarse en la misma transacción en
+    la que se crean las facturas.
+    """
+    _aplicar(factura_ids, 1)
+
+
+def descontar_compras(factura_ids):
+    """
+    Resta del resumen diario las líneas de las facturas indicadas (antes de
+    borrarlas) y elimina las filas de esas facturas que quedan sin líneas
+    """
+    vacias = [resumen_id for resumen_id, lineas in _aplicar(factura_ids, -1) if lineas <= 0]
+    if vacias:
+        ResumenCompraDiario.objects.filter(id__in=vacias).delete()
+
+
+def actualizar_factura(factura, guardar):
+    """
+    Guarda los cambios de una factura con guardar() manteniendo el resumen: resta
+    el aporte de la factura tal como está en la base de datos y suma el nuevo.
+    La fila de la factura queda bloqueada para que dos ediciones simultáneas no
+    resten el mismo aporte dos veces.
+
+    Returns:
+        lo que devuelva guardar()
+    """
+    with transaction.atomic():
+        Factura.objects.select_for_update().filter(id=factura.id).exists()
+        descontar_compras([factura.id])
+        resultado = guardar()
+        acumular_compras([factura.id])
+    return resultado
+
+
+def _aplicar(factura_ids, signo):
+    """
+    Suma (signo 1) o resta (signo -1) las líneas de las facturas al resumen
+
+    Returns:
+        list: (id, lineas) de las filas del resumen tocadas
+    """
+    factura_ids = list(factura_ids)
+    if not factura_ids:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(ACUMULAR, {'zona': settings.TIME_ZONE, 'signo': signo, 'facturas': factura_ids})
+        return cursor.fetchall()
+
+
+def reconstruir_resumen(desde=None, hasta=None):
+    """
+    Recalcula el resumen de los días [desde, hasta] (todos si no se indican) a
+    partir de las facturas. Bloquea las escrituras en el resumen mientras tanto
+    para que no se pierdan ni dupliquen las facturas creadas a la vez.
+
+    Returns:
+        int: filas de resumen escritas
+    """
+    filtros = []
+    params = {'zona': settings.TIME_ZONE, 'signo': 1}
+    resumenes = ResumenCompraDiario.objects.all()
+    if desde:
+        filtros.append('f.fecha >= %(inicio)s')
+        params['inicio'] = _inicio_del_dia(desde)
+        resumenes = resumenes.filter(fecha__gte=desde)
+    if hasta:
+        filtros.append('f.fecha < %(fin)s')
+        params['fin'] = _inicio_del_dia(hasta + datetime.timedelta(days=1))
+        resumenes = resumenes.filter(fecha__lte=hasta)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {ResumenCompraDiario._meta.db_table} IN EXCLUSIVE MODE")
+            resumenes.delete()
+            cursor.execute(
+                INSERT_RESUMEN + SELECT_COMPRAS.format(filtro=' AND '.join(filtros) or 'TRUE'),
+                params
+            )
+            return cursor.rowcount
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.datetime.combine(dia, datetime.time.min))
+
+
+def reporte_compras(desde=None, hasta=None, agrupar=('mes',), moneda=None, categoria=None, producto_ids=None):
+    """
+    Totales de compras entre dos días, agrupados por las claves de AGRUPACIONES,
+    calculados sobre el resumen diario
+
+    Returns:
+        list: un dict por grupo con sus claves, lineas, cantidad, total_usd,
+        total_bs, porcentaje_ganancia_promedio y, si todas las compras del grupo
+        son de una moneda, total en esa moneda
+    """
+    resumenes = ResumenCompraDiario.objects.all()
+    if desde:
+        resumenes = resumenes.filter(fecha__gte=desde)
+    if hasta:
+        resumenes = resumenes.filter(fecha__lte=hasta)
+    if moneda:
+        resumenes = resumenes.filter(moneda=moneda)
+    if categoria is not None:
+        resumenes = resumenes.filter(categoria=categoria)
+    if producto_ids:
+        resumenes = resumenes.filter(producto_id__in=producto_ids)
+    if 'mes' in agrupar:
+        resumenes = resumenes.annotate(mes=TruncMonth('fecha'))
+
+    columnas = [columna for clave in agrupar for columna in AGRUPACIONES[clave]]
+    filas = resumenes.values(*columnas).annotate(
+        suma_lineas=Sum('lineas'),
+        suma_cantidad=Sum('cantidad'),
+        suma_total=Sum('total'),
+        suma_total_usd=Sum('total_usd'),
+        suma_total_bs=Sum('total_bs'),
+        suma_porcentaje=Sum('suma_porcentaje_ganancia')
+    ).order_by(*columnas)
+
+    una_moneda = bool(moneda) or 'moneda' in agrupar
+    resultados = []
+    for fila in filas:
+        resultado = {columna.replace('producto__nombre', 'producto_nombre'): fila[columna] for columna in columnas}
+        resultado.update({
+            'lineas': fila['suma_lineas'],
+            'cantidad': fila['suma_cantidad'],
+            'total_usd': round(fila['suma_total_usd'], 2),
+            'total_bs': round(fila['suma_total_bs'], 2),
+            'porcentaje_ganancia_promedio': (
+                round(fila['suma_porcentaje'] / fila['suma_lineas'], 2) if fila['suma_lineas'] else None
+            ),
+        })
+        if una_moneda:
+            resultado['total'] = fila['suma_total']
+        resultados.append(resultado)
+    return resultados
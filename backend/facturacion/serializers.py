@@ -1,7 +1,29 @@
+from decimal import Decimal
+from django.db import transaction
 from rest_framework import serializers
-from .models import Producto, TasaCambio, Factura, DetalleFactura, Webhook
+from .models import Producto, TasaCambio, Factura, DetalleFactura, Webhook, Tarea, HistorialPrecio
+from .numeracion import siguiente_numero_factura
+from .resumenes import CAMPOS_RESUMEN, acumular_compras, actualizar_factura
 
-class ProductoSerializer(serializers.ModelSerializer):
+class CamposSeleccionablesMixin:
+    """
+    Permite pedir solo algunos campos en las lecturas con ?fields=campo1,campo2
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET' or not request.query_params.get('fields'):
+            return
+        pedidos = {campo.strip() for campo in request.query_params['fields'].split(',') if campo.strip()}
+        desconocidos = pedidos - set(self.fields)
+        if desconocidos:
+            raise serializers.ValidationError({
+                'fields': f"Campos desconocidos: {', '.join(sorted(desconocidos))}"
+            })
+        for campo in set(self.fields) - pedidos:
+            self.fields.pop(campo)
+
+class ProductoSerializer(CamposSeleccionablesMixin, serializers.ModelSerializer):
     class Meta:
         model = Producto
         fields = '__all__'
@@ -11,7 +33,24 @@ class TasaCambioSerializer(serializers.ModelSerializer):
         model = TasaCambio
         fields = '__all__'
 
+class ProductoEnBloqueField(serializers.PrimaryKeyRelatedField):
+    """
+    Relación con Producto que, al crear una factura, toma el producto del mapa
+    precargado por CrearFacturaSerializer en lugar de consultar uno por línea
+    """
+    def to_internal_value(self, data):
+        productos = self.context.get('productos_en_bloque')
+        if productos is not None:
+            try:
+                producto = productos.get(int(data))
+            except (TypeError, ValueError):
+                producto = None
+            if producto is not None:
+                return producto
+        return super().to_internal_value(data)
+
 class DetalleFacturaSerializer(serializers.ModelSerializer):
+    producto = ProductoEnBloqueField(queryset=Producto.objects.all())
     producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
     total = serializers.DecimalField(max_digits=15, decimal_places=2, required=False)
     precio_unitario = serializers.DecimalField(max_digits=10, decimal_places=2)
@@ -21,7 +60,9 @@ class DetalleFacturaSerializer(serializers.ModelSerializer):
     class Meta:
         model = DetalleFactura
         fields = ['id', 'producto', 'producto_nombre', 'cantidad', 'precio_unitario', 
-                 'precio_compra_usd', 'unidades_paquete', 'total', 'porcentaje_ganancia']
+                 'precio_compra_usd', 'unidades_paquete', 'total', 'porcentaje_ganancia',
+                 'estado_sincronizacion', 'ultimo_error', 'intentos', 'sincronizado_en']
+        read_only_fields = ['estado_sincronizacion', 'ultimo_error', 'intentos', 'sincronizado_en']
     
     def validate(self, data):
         # Calcular el total automáticamente
@@ -45,6 +86,43 @@ class FacturaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Factura
         fields = '__all__'
+    
+    def update(self, instance, validated_data):
+        # La moneda, la tasa y el margen entran en el resumen de compras: si cambian,
+        # se resta el aporte anterior de la factura y se suma el nuevo
+        cambia_resumen = any(
+            campo in validated_data and validated_data[campo] != getattr(instance, campo)
+            for campo in CAMPOS_RESUMEN
+        )
+        if not cambia_resumen:
+            return super().update(instance, validated_data)
+        return actualizar_factura(instance, lambda: super(FacturaSerializer, self).update(instance, validated_data))
+
+class FacturaResumenSerializer(serializers.ModelSerializer):
+    """
+    Cabecera de una factura con el número de líneas (anotado en la consulta)
+    """
+    num_lineas = serializers.IntegerField(read_only=True)
+    lineas_pendientes = serializers.IntegerField(read_only=True, help_text="Líneas aún no enviadas a Loyverse")
+    
+    class Meta:
+        model = Factura
+        fields = ['id', 'numero', 'fecha', 'moneda', 'tasa_cambio', 'total_bs', 'total_usd',
+                  'sincronizado_loyverse', 'porcentaje_ganancia', 'num_lineas', 'lineas_pendientes']
+
+def calcular_totales_factura(moneda, tasa_cambio, totales_lineas):
+    """
+    Devuelve (total_bs, total_usd) de una factura a partir de los totales de sus
+    líneas, expresados en la moneda de la factura
+    """
+    suma = sum(totales_lineas, Decimal('0'))
+    if moneda == 'BS':
+        total_bs = suma
+        total_usd = total_bs / tasa_cambio.valor if tasa_cambio else 0
+    else:
+        total_usd = suma
+        total_bs = total_usd * tasa_cambio.valor if tasa_cambio else 0
+    return total_bs, total_usd
 
 class CrearFacturaSerializer(serializers.ModelSerializer):
     detalles = DetalleFacturaSerializer(many=True)
@@ -53,45 +131,46 @@ class CrearFacturaSerializer(serializers.ModelSerializer):
         model = Factura
         fields = ['moneda', 'tasa_cambio', 'porcentaje_ganancia', 'detalles']
     
+    def to_internal_value(self, data):
+        # Resolver todos los productos de las líneas con una sola consulta; los
+        # campos producto de los detalles los toman de este mapa
+        ids = set()
+        detalles = data.get('detalles') if hasattr(data, 'get') else None
+        if isinstance(detalles, list):
+            for detalle in detalles:
+                producto_id = detalle.get('producto') if isinstance(detalle, dict) else None
+                if isinstance(producto_id, (int, str)) and str(producto_id).isdigit():
+                    ids.add(int(producto_id))
+        self.context['productos_en_bloque'] = Producto.objects.in_bulk(ids) if ids else {}
+        return super().to_internal_value(data)
+    
     def create(self, validated_data):
         detalles_data = validated_data.pop('detalles')
-        # Generar un número de factura único
-        import random
-        import datetime
-        now = datetime.datetime.now()
-        numero_factura = f"F{now.strftime('%Y%m%d')}-{random.randint(1000, 9999)}"
+        # Número de factura único tomado de la secuencia de la base de datos
+        numero_factura = siguiente_numero_factura()
         
-        # Inicializar la factura con totales en cero
-        factura = Factura.objects.create(
-            numero=numero_factura,
-            total_bs=0,
-            total_usd=0,
-            **validated_data
+        # Calcular los totales en una pasada antes de insertar la factura
+        total_bs, total_usd = calcular_totales_factura(
+            validated_data['moneda'],
+            validated_data.get('tasa_cambio'),
+            (detalle_data['total'] for detalle_data in detalles_data)
         )
         
-        total_bs = 0
-        total_usd = 0
-        
-        for detalle_data in detalles_data:
-            # También guardamos el precio de compra y las unidades para actualizar el producto después
-            precio_compra_usd = detalle_data.get('precio_compra_usd')
-            unidades_paquete = detalle_data.get('unidades_paquete')
-            
-            # Crear el detalle de factura con todos los campos
-            detalle = DetalleFactura.objects.create(factura=factura, **detalle_data)
-            
-            # Actualizar totales
-            if factura.moneda == 'BS':
-                total_bs += detalle.total
-                total_usd = total_bs / factura.tasa_cambio.valor if factura.tasa_cambio else 0
-            else:
-                total_usd += detalle.total
-                total_bs = total_usd * factura.tasa_cambio.valor if factura.tasa_cambio else 0
-        
-        factura.total_bs = total_bs
-        factura.total_usd = total_usd
-        factura.save()
+        # La factura y sus líneas se guardan juntas o no se guarda nada
+        with transaction.atomic():
+            factura = Factura.objects.create(
+                numero=numero_factura,
+                total_bs=total_bs,
+                total_usd=total_usd,
+                **validated_data
+            )
+            detalles = DetalleFactura.objects.bulk_create([
+                DetalleFactura(factura=factura, **detalle_data) for detalle_data in detalles_data
+            ])
+            acumular_compras([factura.id])
         
+        # Las líneas recién creadas ya traen su producto: evitar recargarlas al serializar la respuesta
+        factura._prefetched_objects_cache = {'detalles': detalles}
         return factura
 
 class ActualizarPreciosSerializer(serializers.Serializer):
@@ -108,6 +187,40 @@ class ActualizarPreciosSerializer(serializers.Serializer):
             )
         return data 
 
+class EscenarioPrecioSerializer(serializers.Serializer):
+    tasa = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'), required=False,
+                                    help_text="Tasa PARALELO del escenario; por defecto la vigente")
+    porcentaje_ganancia = serializers.DecimalField(max_digits=5, decimal_places=2, required=False,
+                                                   help_text="Porcentaje de ganancia del escenario; por defecto 30")
+
+class SimularPreciosSerializer(serializers.Serializer):
+    # Límite de escenarios por simulación (cada uno es una fila de la matriz de precios)
+    MAX_ESCENARIOS = 100
+    
+    escenarios = EscenarioPrecioSerializer(many=True, required=False)
+    tasas = serializers.ListField(child=serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01')),
+                                  required=False, help_text="Se combinan con cada uno de los porcentajes")
+    porcentajes = serializers.ListField(child=serializers.DecimalField(max_digits=5, decimal_places=2),
+                                        required=False, help_text="Se combinan con cada una de las tasas")
+    top = serializers.IntegerField(default=10, min_value=0, max_value=100,
+                                   help_text="Productos con mayor variación devueltos por escenario")
+    
+    def validate(self, data):
+        # Escenarios explícitos más la combinación de tasas × porcentajes
+        escenarios = [dict(escenario) for escenario in data.get('escenarios', [])]
+        if data.get('tasas') or data.get('porcentajes'):
+            escenarios += [
+                {'tasa': tasa, 'porcentaje_ganancia': porcentaje}
+                for tasa in data.get('tasas') or [None]
+                for porcentaje in data.get('porcentajes') or [None]
+            ]
+        if not escenarios:
+            raise serializers.ValidationError("Debe indicar escenarios o listas de tasas y porcentajes")
+        if len(escenarios) > self.MAX_ESCENARIOS:
+            raise serializers.ValidationError(f"Se admiten como máximo {self.MAX_ESCENARIOS} escenarios")
+        data['escenarios'] = escenarios
+        return data
+
 class WebhookSerializer(serializers.ModelSerializer):
     class Meta:
         model = Webhook
@@ -121,4 +234,17 @@ class CreateWebhookSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'id': {'required': False},  # Opcional para permitir actualizaciones
             'status': {'required': False}  # Opcional para usar el valor por defecto
-        } 
\ No newline at end of file
+        } 
+
+class TareaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tarea
+        fields = ['id', 'tipo', 'parametros', 'estado', 'progreso', 'resultado', 'error',
+                  'intentos', 'created_at', 'iniciada_en', 'finalizada_en', 'updated_at']
+
+class HistorialPrecioSerializer(serializers.ModelSerializer):
+    producto_nombre = serializers.CharField(source='producto.nombre', read_only=True)
+
+    class Meta:
+        model = HistorialPrecio
+        fields = ['id', 'producto', 'producto_nombre', 'precio_anterior', 'precio', 'fuente', 'factura', 'fecha']
@@ -1,31 +1,83 @@
 import requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from django.conf import settings
-from .models import Producto, TasaCambio
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, Q, QuerySet, Value, When
+from django.utils import timezone
+from .models import Producto, TasaCambio, EstadoSincronizacion, ItemLoyverse, HistorialPrecio
+from .loyverse_client import get_client
+from .cache import invalidar_catalogo, tasa_actual
+from .historial import registrar_cambios_precio
 from decimal import Decimal
 import datetime
+import itertools
+import queue
+import threading
+import time
 
 class LoyverseService:
     BASE_URL = 'https://api.loyverse.com/v1.0'
+    # Máximo permitido por la API de Loyverse para /items
+    ITEMS_POR_PAGINA = 250
+    # Clave del mapa de categorías en la caché compartida
+    CLAVE_CACHE_CATEGORIAS = 'loyverse:categorias'
+    # Páginas descargadas que pueden esperar a ser escritas en la base de datos
+    PAGINAS_EN_COLA = 2
+    # La marca de agua nunca pasa del inicio del recorrido menos este margen: un item
+    # editado durante el recorrido, después de leída su página, vuelve a pedirse en
+    # la siguiente sincronización (cubre también el desfase de relojes con Loyverse)
+    SOLAPE_MARCA = datetime.timedelta(minutes=5)
+    # Tiempo durante el que una verificación del espejo de items sirve para los PUT siguientes
+    VERIFICACION_ESPEJO = datetime.timedelta(seconds=60)
+    # Tamaño de los bloques de productos consultados y guardados en el espejo de items
+    BLOQUE_ESPEJO = 500
+    # Respuestas a un PUT construido desde el espejo que indican que el espejo está desactualizado
+    STATUS_RECHAZO_ESPEJO = {400, 409, 422}
+    # Productos enviados de una factura cuyo resultado se guarda de una vez; si el proceso
+    # muere a mitad, al reintentar solo se repiten los del último bloque sin guardar
+    LOTE_ESTADOS_FACTURA = 20
     
-    def __init__(self):
-        self.headers = {
-            'Authorization': f'Bearer {settings.LOYVERSE_API_TOKEN}',
-            'Content-Type': 'application/json'
-        }
+    # Campos que se sobrescriben siempre que un producto ya existe localmente
+    # (precio_loyverse refleja lo que tiene Loyverse, así que se actualiza aunque no se apliquen los precios)
+    CAMPOS_CATALOGO = ['nombre', 'descripcion', 'categoria', 'aplicar_iva', 'precio_loyverse', 'updated_at']
+    # Campos que solo se sobrescriben si está habilitada la actualización de precios
+    CAMPOS_PRECIO = ['precio_base', 'ultima_actualizacion_precio', 'fuente_actualizacion']
+    # Campos del producto que se actualizan desde una línea de factura
+    CAMPOS_FACTURA = [
+        'precio_compra_usd', 'precio_compra', 'unidades_paquete', 'unidades_compra', 'precio_base',
+        'precio_venta_calculado', 'ultima_actualizacion_precio', 'fuente_actualizacion', 'porcentaje_ganancia',
+        'updated_at'
+    ]
+    
+    def __init__(self, client=None):
+        # Cliente HTTP compartido: conexiones reutilizables, timeouts y reintentos
+        self.client = client or get_client()
+        self._espejo_verificado_en = None
     
-    def fetch_products(self, actualizar_precios=True):
+    def fetch_products(self, actualizar_precios=True, completo=False, progreso=None):
         """
-        Obtiene todos los productos de Loyverse y los almacena en la base de datos local
+        Obtiene los productos de Loyverse y los almacena en la base de datos local
+        
+        Por defecto la sincronización es incremental: solo se piden los items cuyo
+        updated_at sea posterior a la marca guardada en EstadoSincronizacion. La marca
+        avanza cuando se recorren todas las páginas, hasta el mayor updated_at visto
+        pero nunca más allá del inicio del recorrido menos SOLAPE_MARCA.
+        
+        Avanza también cuando no se aplican los precios (facturas recientes): en ese
+        caso el precio de Loyverse queda en precio_loyverse y el precio local de la
+        factura prevalece; para volver a tomar los precios de Loyverse se usa completo.
         
         Args:
             actualizar_precios (bool): Si es True, actualiza los precios de los productos.
                                       Si hay facturas recientes (2 días), no actualiza los precios.
+            completo (bool): Si es True, ignora la marca y recorre todo el catálogo.
+            progreso (callable): Si se indica, recibe un dict con el avance tras cada página.
         """
         # Verificar si hay facturas recientes (últimos 2 días) en caso de solicitar actualización de precios
         facturas_recientes = False
         if actualizar_precios:
             from .models import Factura
-            import datetime
             fecha_limite = datetime.datetime.now() - datetime.timedelta(days=2)
             facturas_recientes = Factura.objects.filter(fecha__gte=fecha_limite).exists()
             
@@ -34,25 +86,9 @@ class LoyverseService:
                 print(f"Se encontraron facturas recientes desde {fecha_limite}. No se actualizarán los precios.")
                 actualizar_precios = False
         
-        # Obtener las categorías para mapear IDs a nombres
-        categories_dict = {}
-        try:
-            print("Obteniendo categorías desde Loyverse...")
-            categories_response = requests.get(f"{self.BASE_URL}/categories", headers=self.headers)
-            if categories_response.status_code == 200:
-                categories_data = categories_response.json()
-                categories = categories_data.get('categories', [])
-                
-                for category in categories:
-                    category_id = category.get('id')
-                    category_name = category.get('name')
-                    if category_id and category_name:
-                        categories_dict[category_id] = category_name
-                print(f"Se encontraron {len(categories_dict)} categorías en Loyverse")
-            else:
-                print(f"Error al obtener categorías: {categories_response.status_code} - {categories_response.text}")
-        except Exception as e:
-            print(f"Error obteniendo categorías: {str(e)}")
+        # Obtener las categorías para mapear IDs a nombres (caché compartida entre workers)
+        categories_dict = self.obtener_categorias()
+        categorias_refrescadas = False
         
         # Inicializar contadores
         products_created = 0
@@ -60,236 +96,734 @@ class LoyverseService:
         prices_unchanged = 0
         total_items_processed = 0
         
-        # Inicializar cursor para paginación
-        cursor = None
+        # Determinar desde cuándo pedir cambios en modo incremental
+        estado, _ = EstadoSincronizacion.objects.get_or_create(recurso='items')
+        desde = None if completo else estado.ultimo_updated_at
+        max_updated_at = None
+        sincronizacion_completa = True
+        inicio_recorrido = timezone.now()
+        
+        # La descarga de páginas corre en un hilo productor mientras este hilo escribe
+        # en la base de datos; la cola acotada limita las páginas en memoria
+        cola = queue.Queue(maxsize=self.PAGINAS_EN_COLA)
+        detener = threading.Event()
+        tiempos = {'red': 0.0, 'espera_cola_llena': 0.0, 'db': 0.0, 'espera_red': 0.0}
+        inicio = time.monotonic()
         page = 1
         
-        print(f"Iniciando sincronización de productos con paginación. Actualizar precios: {actualizar_precios}")
+        print(f"Iniciando sincronización de productos con paginación. Actualizar precios: {actualizar_precios}. "
+              f"{'Cambios desde ' + str(desde) if desde else 'Catálogo completo'}")
         
-        while True:
-            # Construir URL con cursor si existe
-            url = f"{self.BASE_URL}/items"
+        productor = threading.Thread(
+            target=self._producir_paginas,
+            args=(desde, cola, detener, tiempos),
+            name='loyverse-items-productor',
+            daemon=True
+        )
+        productor.start()
+        
+        try:
+            while True:
+                espera_inicio = time.monotonic()
+                tipo, page, contenido = cola.get()
+                tiempos['espera_red'] += time.monotonic() - espera_inicio
+                
+                if tipo == 'error':
+                    print(f"Error en la API de Loyverse: {contenido}")
+                    if page == 1:  # Si falla en la primera página, devolver error
+                        return {
+                            'success': False,
+                            'error': f'Error al obtener productos: {contenido}'
+                        }
+                    else:  # Si falla después de la primera página, devolver los resultados parciales
+                        sincronizacion_completa = False
+                        break
+                
+                if tipo == 'fin':
+                    print(f"No hay más productos para procesar. Total procesados: {total_items_processed}")
+                    break
+                
+                items = contenido
+                print(f"Procesando {len(items)} productos en la página {page}")
+                total_items_processed += len(items)
+                
+                # Los updated_at de Loyverse son ISO 8601 en UTC con el mismo formato,
+                # por lo que se pueden comparar como cadenas
+                for item in items:
+                    if item.get('updated_at') and (max_updated_at is None or item['updated_at'] > max_updated_at):
+                        max_updated_at = item['updated_at']
+                
+                # Una categoría desconocida indica que la caché está desactualizada
+                if not categorias_refrescadas and any(
+                    item.get('category_id') and item['category_id'] not in categories_dict for item in items
+                ):
+                    print("Se encontraron categorías desconocidas, refrescando la caché de categorías")
+                    categories_dict = self.obtener_categorias(refrescar=True)
+                    categorias_refrescadas = True
+                
+                escritura_inicio = time.monotonic()
+                created, updated = self._upsert_page(items, categories_dict, actualizar_precios)
+                tiempos['db'] += time.monotonic() - escritura_inicio
+                products_created += created
+                products_updated += updated
+                if not actualizar_precios:
+                    prices_unchanged += updated
+                if progreso:
+                    progreso({
+                        'paginas': page,
+                        'items_procesados': total_items_processed,
+                        'creados': products_created,
+                        'actualizados': products_updated
+                    })
+        finally:
+            detener.set()
+            productor.join(timeout=1)
+        
+        tiempos['total'] = time.monotonic() - inicio
+        tiempos = {etapa: round(segundos, 3) for etapa, segundos in tiempos.items()}
+        print(f"Tiempos de sincronización (s): {tiempos}")
+        
+        # Avanzar la marca de agua solo si el recorrido fue completo
+        if sincronizacion_completa:
+            if max_updated_at:
+                nueva_marca = min(
+                    datetime.datetime.fromisoformat(max_updated_at.replace('Z', '+00:00')),
+                    inicio_recorrido - self.SOLAPE_MARCA
+                )
+                if estado.ultimo_updated_at is None or nueva_marca > estado.ultimo_updated_at:
+                    estado.ultimo_updated_at = nueva_marca
+            estado.ultima_sincronizacion = timezone.now()
+            estado.save()
+        
+        print(f"Sincronización completada. Creados: {products_created}, Actualizados: {products_updated}, Precios no modificados: {prices_unchanged}")
+        return {
+            'success': True,
+            'created': products_created,
+            'updated': products_updated,
+            'prices_unchanged': prices_unchanged,
+            'facturas_recientes': facturas_recientes,
+            'total_pages': page,
+            'total_processed': total_items_processed,
+            'incremental': desde is not None,
+            'desde': desde.isoformat() if desde else None,
+            'tiempos': tiempos
+        }
+    
+    def _producir_paginas(self, desde, cola, detener, tiempos):
+        """
+        Recorre el cursor de /items y deja cada página en la cola como
+        ('pagina', n, items), terminando con ('fin', n, None) o ('error', n, mensaje).
+        Se ejecuta en un hilo aparte y no toca la base de datos.
+        """
+        def encolar(mensaje):
+            espera_inicio = time.monotonic()
+            try:
+                while not detener.is_set():
+                    try:
+                        cola.put(mensaje, timeout=0.5)
+                        return True
+                    except queue.Full:
+                        continue
+                return False
+            finally:
+                tiempos['espera_cola_llena'] += time.monotonic() - espera_inicio
+        
+        cursor = None
+        page = 1
+        url = f"{self.BASE_URL}/items"
+        
+        while not detener.is_set():
+            # Construir parámetros con cursor y filtro incremental si existen
+            params = {'limit': self.ITEMS_POR_PAGINA}
+            if desde:
+                params['updated_at_min'] = self._format_fecha_api(desde)
             if cursor:
-                url += f"?cursor={cursor}"
+                params['cursor'] = cursor
             
-            print(f"Procesando página {page}, URL: {url}")
-            response = requests.get(url, headers=self.headers)
+            print(f"Descargando página {page}, URL: {url}, parámetros: {params}")
+            red_inicio = time.monotonic()
+            try:
+                response = self.client.get(url, params=params)
+            except Exception as e:
+                encolar(('error', page, str(e)))
+                return
+            finally:
+                tiempos['red'] += time.monotonic() - red_inicio
             
             if response.status_code != 200:
-                print(f"Error en la API de Loyverse: {response.status_code} - {response.text}")
-                if page == 1:  # Si falla en la primera página, devolver error
-                    return {
-                        'success': False,
-                        'error': f'Error al obtener productos: {response.status_code} - {response.text}'
-                    }
-                else:  # Si falla después de la primera página, devolver los resultados parciales
-                    break
+                encolar(('error', page, f'{response.status_code} - {response.text}'))
+                return
             
             data = response.json()
             items = data.get('items', [])
-            
             if not items:
-                print(f"No hay más productos para procesar. Total procesados: {total_items_processed}")
-                break
+                encolar(('fin', page, None))
+                return
             
-            print(f"Procesando {len(items)} productos en la página {page}")
-            total_items_processed += len(items)
-            
-            for item in items:
-                try:
-                    # Tomamos el primer variante como precio base
-                    precio = Decimal('0')
-                    if item.get('variants'):
-                        variant = item['variants'][0]
-                        precio_str = str(variant.get('default_price', '0'))
-                        # Asegurarse de que el precio sea un número válido
-                        try:
-                            precio = Decimal(precio_str)
-                        except:
-                            print(f"Precio inválido para {item['item_name']}: {precio_str}")
-                            precio = Decimal('0')
-                    
-                    # Obtener el ID de categoría y mapear al nombre
-                    categoria_id = item.get('category_id', '')
-                    categoria_nombre = categories_dict.get(categoria_id, '')
-                    
-                    # Convertir la fecha de actualización de Loyverse a formato datetime
-                    updated_at = None
-                    if item.get('updated_at'):
-                        try:
-                            updated_at = datetime.datetime.fromisoformat(item['updated_at'].replace('Z', '+00:00'))
-                        except Exception as e:
-                            print(f"Error al convertir fecha: {str(e)}")
-                    
-                    # Valores por defecto para todos los productos
-                    defaults = {
-                        'nombre': item['item_name'],
-                        'descripcion': item.get('description', ''),
-                        'categoria': categoria_nombre,
-                        'aplicar_iva': False  # Siempre establecer aplicar_iva como False
-                    }
-                    
-                    # Solo actualizar el precio si está habilitado y no hay facturas recientes
-                    if actualizar_precios:
-                        defaults.update({
-                            'precio_base': precio,
-                            'ultima_actualizacion_precio': updated_at,
-                            'fuente_actualizacion': 'loyverse'
-                        })
-                    
-                    # Crear o actualizar el producto
-                    producto, created = Producto.objects.update_or_create(
-                        loyverse_id=item['id'],
-                        defaults=defaults
-                    )
-                    
-                    if created:
-                        products_created += 1
-                        print(f"Nuevo producto creado: {producto.nombre} (ID: {producto.id}) - aplicar_iva=False")
-                    else:
-                        if not actualizar_precios:
-                            prices_unchanged += 1
-                        products_updated += 1
-                        print(f"Producto actualizado: {producto.nombre} (ID: {producto.id}) - aplicar_iva=False")
-                
-                except Exception as e:
-                    print(f"Error procesando producto {item.get('item_name', 'desconocido')}: {str(e)}")
-                    continue
+            if not encolar(('pagina', page, items)):
+                return
             
             # Obtener el cursor para la siguiente página
             cursor = data.get('cursor')
             if not cursor:
                 print("No hay más páginas para procesar (cursor es None)")
-                break
+                encolar(('fin', page, None))
+                return
             
             page += 1
-            print(f"Pasando a la página {page} con cursor: {cursor}")
+    
+    def obtener_categorias(self, refrescar=False):
+        """
+        Devuelve el mapa {category_id: nombre} de Loyverse desde la caché compartida,
+        descargándolo de la API si no está en caché, venció o refrescar es True.
+        
+        Si la descarga falla se devuelve lo que haya en caché (o un mapa vacío) y
+        no se guarda nada, para no fijar un mapa vacío durante todo el TTL.
+        """
+        categories_dict = None if refrescar else cache.get(self.CLAVE_CACHE_CATEGORIAS)
+        if categories_dict is not None:
+            return categories_dict
+        
+        try:
+            print("Obteniendo categorías desde Loyverse...")
+            categories_response = self.client.get(f"{self.BASE_URL}/categories")
+            if categories_response.status_code == 200:
+                categories_data = categories_response.json()
+                categories = categories_data.get('categories', [])
+                
+                categories_dict = {}
+                for category in categories:
+                    category_id = category.get('id')
+                    category_name = category.get('name')
+                    if category_id and category_name:
+                        categories_dict[category_id] = category_name
+                print(f"Se encontraron {len(categories_dict)} categorías en Loyverse")
+                cache.set(
+                    self.CLAVE_CACHE_CATEGORIAS,
+                    categories_dict,
+                    getattr(settings, 'LOYVERSE_CATEGORIES_TTL', 3600)
+                )
+                return categories_dict
+            print(f"Error al obtener categorías: {categories_response.status_code} - {categories_response.text}")
+        except Exception as e:
+            print(f"Error obteniendo categorías: {str(e)}")
+        
+        return cache.get(self.CLAVE_CACHE_CATEGORIAS) or {}
+    
+    def _format_fecha_api(self, fecha):
+        """
+        Formatea una fecha como la espera la API de Loyverse (ISO 8601 en UTC)
+        """
+        fecha_utc = fecha.astimezone(datetime.timezone.utc)
+        return fecha_utc.strftime('%Y-%m-%dT%H:%M:%S.') + f"{fecha_utc.microsecond // 1000:03d}Z"
+
+    def _parse_item(self, item, categories_dict):
+        """
+        Convierte un item de la API de Loyverse en los campos del modelo Producto
+        """
+        # Tomamos el primer variante como precio base
+        precio = Decimal('0')
+        if item.get('variants'):
+            variant = item['variants'][0]
+            precio_str = str(variant.get('default_price', '0'))
+            # Asegurarse de que el precio sea un número válido
+            try:
+                precio = Decimal(precio_str)
+            except:
+                print(f"Precio inválido para {item['item_name']}: {precio_str}")
+                precio = Decimal('0')
+        
+        # Obtener el ID de categoría y mapear al nombre
+        categoria_id = item.get('category_id', '')
+        categoria_nombre = categories_dict.get(categoria_id, '')
+        
+        # Convertir la fecha de actualización de Loyverse a formato datetime
+        updated_at = None
+        if item.get('updated_at'):
+            try:
+                updated_at = datetime.datetime.fromisoformat(item['updated_at'].replace('Z', '+00:00'))
+            except Exception as e:
+                print(f"Error al convertir fecha: {str(e)}")
         
-        print(f"Sincronización completada. Creados: {products_created}, Actualizados: {products_updated}, Precios no modificados: {prices_unchanged}")
         return {
-            'success': True,
-            'created': products_created,
-            'updated': products_updated,
-            'prices_unchanged': prices_unchanged,
-            'facturas_recientes': facturas_recientes,
-            'total_pages': page,
-            'total_processed': total_items_processed
+            'loyverse_id': item['id'],
+            'nombre': item['item_name'],
+            'descripcion': item.get('description', ''),
+            'categoria': categoria_nombre,
+            'aplicar_iva': False,  # Siempre establecer aplicar_iva como False
+            'precio_base': precio,
+            'precio_loyverse': precio,
+            'ultima_actualizacion_precio': updated_at,
+            'fuente_actualizacion': 'loyverse'
         }
+    
+    def _upsert_page(self, items, categories_dict, actualizar_precios):
+        """
+        Inserta o actualiza una página de items de Loyverse con un único
+        INSERT ... ON CONFLICT (loyverse_id) dentro de una transacción.
+        
+        Los productos nuevos se crean con todos los campos; en los existentes solo
+        se sobrescriben los campos de precio si actualizar_precios es True.
+        Los precios nuevos y los que cambian se añaden al historial de precios.
+        
+        Returns:
+            tuple: (productos creados, productos actualizados)
+        """
+        filas = {}
+        for item in items:
+            try:
+                fila = self._parse_item(item, categories_dict)
+                # Si un item se repite en la página, prevalece la última aparición
+                filas[fila['loyverse_id']] = fila
+            except Exception as e:
+                print(f"Error procesando producto {item.get('item_name', 'desconocido')}: {str(e)}")
+        
+        if not filas:
+            return 0, 0
+        
+        # Mantener fresco el espejo de items usado por los envíos de precios
+        self.guardar_items_espejo(items)
+        
+        update_fields = list(self.CAMPOS_CATALOGO)
+        if actualizar_precios:
+            update_fields += self.CAMPOS_PRECIO
+        
+        try:
+            with transaction.atomic():
+                # {loyverse_id: (id, precio_base)} de los que ya existen
+                existentes = {
+                    loyverse_id: (id_, precio_base)
+                    for loyverse_id, id_, precio_base in Producto.objects.filter(loyverse_id__in=filas.keys())
+                    .values_list('loyverse_id', 'id', 'precio_base')
+                }
+                Producto.objects.bulk_create(
+                    [Producto(**fila) for fila in filas.values()],
+                    update_conflicts=True,
+                    unique_fields=['loyverse_id'],
+                    update_fields=update_fields
+                )
+                self._registrar_historial_pagina(filas, existentes, actualizar_precios)
+                transaction.on_commit(invalidar_catalogo)
+        except Exception as e:
+            # Si la escritura masiva falla, procesar la página fila por fila para
+            # no perder los productos válidos por culpa de uno defectuoso
+            print(f"Error en escritura masiva de la página, procesando por producto: {str(e)}")
+            return self._upsert_rows(filas.values(), update_fields)
+        
+        created = len(filas) - len(existentes)
+        print(f"Página guardada: {created} productos nuevos, {len(existentes)} actualizados")
+        return created, len(existentes)
+    
+    def _registrar_historial_pagina(self, filas, existentes, actualizar_precios):
+        """
+        Añade al historial el precio de los productos creados en la página y, si se
+        aplicaron los precios, el de los existentes cuyo precio_base cambió
+        """
+        cambios = []
+        if actualizar_precios:
+            cambios = [
+                (id_, precio_base, filas[loyverse_id]['precio_base'])
+                for loyverse_id, (id_, precio_base) in existentes.items()
+            ]
+        nuevos = [loyverse_id for loyverse_id in filas if loyverse_id not in existentes]
+        if nuevos:
+            # bulk_create con update_conflicts no devuelve los ids en Django 4.2
+            cambios += [
+                (id_, None, filas[loyverse_id]['precio_base'])
+                for loyverse_id, id_ in Producto.objects.filter(loyverse_id__in=nuevos).values_list('loyverse_id', 'id')
+            ]
+        registrar_cambios_precio(cambios, 'loyverse')
+    
+    def _upsert_rows(self, filas, update_fields):
+        """
+        Inserta o actualiza productos uno a uno (camino lento de respaldo)
+        """
+        created_count = 0
+        updated_count = 0
+        for fila in filas:
+            try:
+                loyverse_id = fila['loyverse_id']
+                with transaction.atomic():
+                    producto = Producto.objects.filter(loyverse_id=loyverse_id).first()
+                    if producto is None:
+                        producto = Producto.objects.create(**fila)
+                        registrar_cambios_precio([(producto.id, None, producto.precio_base)], 'loyverse')
+                        created_count += 1
+                        continue
+                    precio_anterior = producto.precio_base
+                    for campo in update_fields:
+                        if campo in fila:
+                            setattr(producto, campo, fila[campo])
+                    producto.save(update_fields=update_fields)
+                    registrar_cambios_precio([(producto.id, precio_anterior, producto.precio_base)], 'loyverse')
+                    updated_count += 1
+            except Exception as e:
+                print(f"Error procesando producto {fila.get('nombre', 'desconocido')}: {str(e)}")
+        return created_count, updated_count
 
-    def sync_prices(self, products):
+    def sync_prices(self, products, max_workers=None, forzar=False, progreso=None):
         """
         Sincroniza los precios de los productos con Loyverse
+        
+        Solo se envían los productos cuyo precio_base difiere del último precio
+        confirmado en Loyverse (precio_loyverse), salvo que forzar sea True.
+        Los productos se envían en paralelo con un número acotado de hilos; el cliente
+        HTTP comparte un limitador de velocidad para no superar la cuota de la API.
+        Si se recibe un QuerySet se recorre por bloques sin cargarlo entero en memoria.
+        Si se indica progreso, recibe un dict con los contadores tras cada envío.
         """
+        max_workers = max_workers or getattr(settings, 'LOYVERSE_PUSH_WORKERS', 4)
         updated_count = 0
         failed_count = 0
+        contadores = {'omitidos': 0}
+        items_espejo = []
+        precios_enviados = {}
         
-        for product in products:
-            try:
-                # Primero obtener la información completa del producto
-                url = f"{self.BASE_URL}/items/{product.loyverse_id}"
-                response = requests.get(url, headers=self.headers)
-                print(f"Consultando producto en Loyverse: {url}")
-                print(f"Status Code: {response.status_code}")
-                
-                if response.status_code == 200:
-                    data = response.json()
+        precios = self._iterar_precios(products, forzar, contadores)
+        for loyverse_id, precio, resultado, item in self._push_precios_concurrente(precios, max_workers):
+            if resultado['success']:
+                updated_count += 1
+                precios_enviados[loyverse_id] = precio
+            else:
+                failed_count += 1
+            if item:
+                items_espejo.append(item)
+            if len(items_espejo) >= self.BLOQUE_ESPEJO:
+                self.guardar_items_espejo(items_espejo)
+                items_espejo = []
+            if len(precios_enviados) >= self.BLOQUE_ESPEJO:
+                self._marcar_precios_loyverse(precios_enviados)
+                precios_enviados = {}
+            if progreso:
+                progreso({'enviados': updated_count, 'fallidos': failed_count, 'omitidos': contadores['omitidos']})
+        
+        self.guardar_items_espejo(items_espejo)
+        self._marcar_precios_loyverse(precios_enviados)
+        
+        print(f"Precios enviados: {updated_count}, fallidos: {failed_count}, sin cambios: {contadores['omitidos']}")
+        result = {
+            'success': failed_count == 0 or updated_count > 0,
+            'updated': updated_count,
+            'failed': failed_count,
+            'skipped': contadores['omitidos']
+        }
+        if not result['success']:
+            result['error'] = f"No se pudo actualizar ningún precio en Loyverse ({failed_count} fallidos)"
+        return result
+    
+    def _iterar_precios(self, products, forzar=False, contadores=None):
+        """
+        Genera tuplas (loyverse_id, nombre, precio, item del espejo o None) a partir
+        de productos o de un QuerySet, consultando el espejo por bloques.
+        
+        Salvo que forzar sea True, omite los productos cuyo precio ya está en Loyverse
+        y los cuenta en contadores['omitidos'].
+        """
+        if isinstance(products, QuerySet):
+            products = products.only(
+                'loyverse_id', 'nombre', 'precio_base', 'precio_loyverse'
+            ).iterator(chunk_size=self.BLOQUE_ESPEJO)
+        products = iter(products)
+        while True:
+            bloque = list(itertools.islice(products, self.BLOQUE_ESPEJO))
+            if not bloque:
+                return
+            if not forzar:
+                pendientes = [product for product in bloque if product.precio_base != product.precio_loyverse]
+                if contadores is not None:
+                    contadores['omitidos'] += len(bloque) - len(pendientes)
+                bloque = pendientes
+            espejo = self._items_espejo([product.loyverse_id for product in bloque])
+            for product in bloque:
+                yield product.loyverse_id, product.nombre, product.precio_base, espejo.get(product.loyverse_id)
+    
+    def _push_precios_concurrente(self, precios, max_workers):
+        """
+        Envía cada (loyverse_id, nombre, precio, item) a Loyverse usando hasta
+        max_workers hilos y genera tuplas (loyverse_id, precio, resultado, item) a
+        medida que terminan. Nunca hay más de 2 × max_workers envíos pendientes, de
+        modo que la entrada se consume en streaming.
+        
+        Los hilos solo hablan con la API; no acceden a la base de datos.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='loyverse-push') as executor:
+            pendientes = {}
+            
+            def terminados(futuros):
+                for futuro in futuros:
+                    loyverse_id, precio = pendientes.pop(futuro)
+                    resultado, item = futuro.result()
+                    yield loyverse_id, precio, resultado, item
+            
+            for loyverse_id, nombre, precio, item in precios:
+                if len(pendientes) >= max_workers * 2:
+                    listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                    yield from terminados(listos)
+                futuro = executor.submit(self._push_precio, loyverse_id, nombre, precio, item)
+                pendientes[futuro] = (loyverse_id, precio)
+            
+            yield from terminados(as_completed(list(pendientes)))
+    
+    def _marcar_precios_loyverse(self, precios):
+        """
+        Registra {loyverse_id: precio} como últimos precios confirmados en Loyverse
+        con un único UPDATE (renovando updated_at, que sirve de validador del listado)
+        """
+        if not precios:
+            return
+        Producto.objects.filter(loyverse_id__in=precios.keys()).update(
+            precio_loyverse=Case(
+                *[When(loyverse_id=loyverse_id, then=Value(precio)) for loyverse_id, precio in precios.items()],
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            ),
+            updated_at=timezone.now()
+        )
+        transaction.on_commit(invalidar_catalogo)
+    
+    def _push_precio(self, loyverse_id, nombre, precio, item=None):
+        """
+        Envía el nuevo precio a todas las variantes y tiendas de un item de Loyverse
+        
+        Si se recibe el item del espejo local, el PUT se construye a partir de él sin
+        consultar la API; si Loyverse lo rechaza se repite una vez con el item obtenido
+        en vivo. Sin item del espejo se consulta la API antes de enviar el PUT.
+        
+        Returns:
+            tuple: (resultado, documento del item para refrescar el espejo o None)
+        """
+        item_espejo = None
+        try:
+            fuentes = [item, None] if item is not None else [None]
+            for item in fuentes:
+                if item is None:
+                    # Obtener la información completa del producto
+                    url = f"{self.BASE_URL}/items/{loyverse_id}"
+                    response = self.client.get(url)
+                    print(f"Consultando producto en Loyverse: {url}")
+                    print(f"Status Code: {response.status_code}")
                     
-                    # Verificar que existan variantes
-                    if 'variants' in data and len(data['variants']) > 0:
-                        # Crear un payload más completo pero solo modificando los precios
-                        update_payload = {
-                            'id': data['id'],
-                            'item_name': data['item_name'],
-                            'description': data.get('description', ''),
-                            'reference_id': data.get('reference_id'),
-                            'category_id': data.get('category_id'),
-                            'track_stock': data.get('track_stock', False),
-                            'sold_by_weight': data.get('sold_by_weight', False),
-                            'is_composite': data.get('is_composite', False),
-                            'use_production': data.get('use_production', False),
-                            'primary_supplier_id': data.get('primary_supplier_id'),
-                            'tax_ids': data.get('tax_ids', []),
-                            'form': data.get('form', 'SQUARE'),
-                            'color': data.get('color', 'GREY'),
-                            'option1_name': data.get('option1_name'),
-                            'option2_name': data.get('option2_name'),
-                            'option3_name': data.get('option3_name'),
-                            'variants': []
-                        }
-                        
-                        # Actualizar solo el precio en las variantes
-                        for variant in data['variants']:
-                            variant_update = {
-                                'variant_id': variant['variant_id'],
-                                'item_id': variant['item_id'],
-                                'sku': variant.get('sku', ''),
-                                'reference_variant_id': variant.get('reference_variant_id'),
-                                'option1_value': variant.get('option1_value'),
-                                'option2_value': variant.get('option2_value'),
-                                'option3_value': variant.get('option3_value'),
-                                'barcode': variant.get('barcode'),
-                                'cost': variant.get('cost', 0),
-                                'purchase_cost': variant.get('purchase_cost'),
-                                'default_pricing_type': variant.get('default_pricing_type', 'VARIABLE'),
-                                'default_price': float(product.precio_base),
-                                'stores': []
-                            }
-                            
-                            # Actualizar también el precio en cada tienda
-                            if 'stores' in variant:
-                                for store in variant['stores']:
-                                    store_update = {
-                                        'store_id': store['store_id'],
-                                        'pricing_type': store.get('pricing_type', 'VARIABLE'),
-                                        'price': float(product.precio_base),
-                                        'available_for_sale': store.get('available_for_sale', True),
-                                        'optimal_stock': store.get('optimal_stock'),
-                                        'low_stock': store.get('low_stock')
-                                    }
-                                    variant_update['stores'].append(store_update)
-                            
-                            update_payload['variants'].append(variant_update)
-                        
-                        print(f"Actualizando precio de {product.nombre} a {float(product.precio_base)}")
-                        
-                        # Realizar la actualización usando PUT en lugar de POST
-                        update_url = f"{self.BASE_URL}/items/{data['id']}"
-                        print(f"Actualizando precio en: {update_url}")
-                        
-                        update_headers = self.headers.copy()
-                        update_headers['Content-Type'] = 'application/json'
-                        
-                        update_response = requests.put(
-                            update_url, 
-                            headers=update_headers,
-                            json=update_payload
-                        )
-                        
-                        print(f"Status Code: {update_response.status_code}")
-                        
-                        if update_response.status_code in [200, 201, 204]:
-                            updated_count += 1
-                            print(f"Producto actualizado exitosamente: {product.nombre}")
-                        else:
-                            failed_count += 1
-                            print(f"Error actualizando {product.nombre}: {update_response.text}")
-                    else:
-                        failed_count += 1
-                        print(f"No se encontraron variantes para el producto {product.nombre}")
-                else:
-                    failed_count += 1
-                    print(f"Error obteniendo producto {product.nombre}: {response.text}")
+                    if response.status_code != 200:
+                        return {
+                            "success": False,
+                            "product": nombre,
+                            "error": f"Error obteniendo producto: {response.text}"
+                        }, item_espejo
+                    
+                    item = response.json()
+                    item_espejo = item
+                
+                # Verificar que existan variantes
+                if not item.get('variants'):
+                    return {
+                        "success": False,
+                        "product": nombre,
+                        "error": "No se encontraron variantes"
+                    }, item_espejo
+                
+                update_payload = self._build_update_payload(item, precio)
+                print(f"Actualizando precio de {nombre} de {float(item['variants'][0].get('default_price') or 0)} a {float(precio)}")
+                
+                # Realizar la actualización usando PUT en lugar de POST
+                update_url = f"{self.BASE_URL}/items/{item['id']}"
+                print(f"Actualizando precio en: {update_url}")
+                update_response = self.client.put(update_url, json=update_payload)
+                print(f"Status Code: {update_response.status_code}")
+                
+                if update_response.status_code in [200, 201, 204]:
+                    return {
+                        "success": True,
+                        "product": nombre,
+                        "price": float(precio)
+                    }, self._item_tras_put(item, update_payload, update_response)
+                
+                if item_espejo is not None or update_response.status_code not in self.STATUS_RECHAZO_ESPEJO:
+                    break
+                print(f"Loyverse rechazó el PUT construido desde el espejo para {nombre}; reintentando con el item en vivo")
             
+            return {
+                "success": False,
+                "product": nombre,
+                "error": update_response.text
+            }, item_espejo
+        
+        except Exception as e:
+            return {
+                "success": False,
+                "product": nombre,
+                "error": str(e)
+            }, item_espejo
+    
+    def _item_tras_put(self, item, update_payload, update_response):
+        """
+        Documento del item tras un PUT exitoso: el que devuelve Loyverse o, si la
+        respuesta no lo incluye, el item anterior con las variantes enviadas
+        """
+        try:
+            data = update_response.json()
+            if data.get('id') and data.get('variants'):
+                return data
+        except ValueError:
+            pass
+        return {**item, 'variants': update_payload['variants']}
+    
+    def _items_espejo(self, loyverse_ids):
+        """
+        Devuelve {loyverse_id: documento} de los items del espejo que no están vencidos.
+        
+        Antes se traen de Loyverse los items que cambiaron desde la última
+        verificación, para no construir un PUT con un documento viejo que revierta
+        ediciones hechas en el back office (nombre, impuestos, categoría, tiendas...).
+        Si la verificación falla no se usa el espejo y los PUT se construyen con el
+        item consultado en vivo.
+        """
+        if not loyverse_ids or not self._verificar_espejo():
+            return {}
+        limite = timezone.now() - datetime.timedelta(seconds=getattr(settings, 'LOYVERSE_MIRROR_TTL', 86400))
+        return dict(
+            ItemLoyverse.objects.filter(loyverse_id__in=loyverse_ids, sincronizado_en__gte=limite)
+            .values_list('loyverse_id', 'datos')
+        )
+    
+    def _verificar_espejo(self):
+        """
+        Descarga los items con updated_at posterior a la última verificación del
+        espejo (o al TTL, si es más reciente) y los guarda en él.
+        
+        La marca de EstadoSincronizacion('espejo_items') es el inicio de la última
+        verificación completa: todo el espejo refleja Loyverse hasta ese momento.
+        
+        Returns:
+            bool: True si el espejo está al día
+        """
+        ahora = timezone.now()
+        if self._espejo_verificado_en and ahora - self._espejo_verificado_en < self.VERIFICACION_ESPEJO:
+            return True
+        
+        estado, _ = EstadoSincronizacion.objects.get_or_create(recurso='espejo_items')
+        limite = ahora - datetime.timedelta(seconds=getattr(settings, 'LOYVERSE_MIRROR_TTL', 86400))
+        desde = max(estado.ultimo_updated_at or limite, limite) - self.SOLAPE_MARCA
+        
+        cursor = None
+        refrescados = 0
+        while True:
+            params = {'limit': self.ITEMS_POR_PAGINA, 'updated_at_min': self._format_fecha_api(desde)}
+            if cursor:
+                params['cursor'] = cursor
+            try:
+                response = self.client.get(f"{self.BASE_URL}/items", params=params)
             except Exception as e:
-                failed_count += 1
-                print(f"Error procesando {product.nombre}: {str(e)}")
+                print(f"No se pudo verificar el espejo de items: {str(e)}")
+                return False
+            if response.status_code != 200:
+                print(f"No se pudo verificar el espejo de items: {response.status_code} - {response.text}")
+                return False
+            data = response.json()
+            items = data.get('items', [])
+            self.guardar_items_espejo(items)
+            refrescados += len(items)
+            cursor = data.get('cursor')
+            if not items or not cursor:
+                break
         
-        return {
-            'success': updated_count > 0,
-            'updated': updated_count,
-            'failed': failed_count
+        estado.ultimo_updated_at = ahora
+        estado.ultima_sincronizacion = ahora
+        estado.save()
+        self._espejo_verificado_en = ahora
+        print(f"Espejo de items verificado desde {desde}: {refrescados} items refrescados")
+        return True
+    
+    def guardar_items_espejo(self, items):
+        """
+        Inserta o actualiza en el espejo local los documentos completos de items de Loyverse
+        """
+        filas = {}
+        ahora = timezone.now()
+        for item in items:
+            if not item.get('id'):
+                continue
+            updated_at = None
+            if item.get('updated_at'):
+                try:
+                    updated_at = datetime.datetime.fromisoformat(item['updated_at'].replace('Z', '+00:00'))
+                except ValueError:
+                    pass
+            filas[item['id']] = ItemLoyverse(
+                loyverse_id=item['id'],
+                datos=item,
+                updated_at_loyverse=updated_at,
+                sincronizado_en=ahora
+            )
+        if not filas:
+            return
+        try:
+            ItemLoyverse.objects.bulk_create(
+                filas.values(),
+                update_conflicts=True,
+                unique_fields=['loyverse_id'],
+                update_fields=['datos', 'updated_at_loyverse', 'sincronizado_en']
+            )
+        except Exception as e:
+            print(f"Error guardando el espejo de items de Loyverse: {str(e)}")
+    
+    def _build_update_payload(self, data, precio):
+        """
+        Construye el payload de PUT /items a partir del item de Loyverse,
+        modificando solo el precio de las variantes y de cada tienda
+        """
+        # Crear un payload más completo pero solo modificando los precios
+        update_payload = {
+            'id': data['id'],
+            'item_name': data['item_name'],
+            'description': data.get('description', ''),
+            'reference_id': data.get('reference_id'),
+            'category_id': data.get('category_id'),
+            'track_stock': data.get('track_stock', False),
+            'sold_by_weight': data.get('sold_by_weight', False),
+            'is_composite': data.get('is_composite', False),
+            'use_production': data.get('use_production', False),
+            'primary_supplier_id': data.get('primary_supplier_id'),
+            'tax_ids': data.get('tax_ids', []),
+            'form': data.get('form', 'SQUARE'),
+            'color': data.get('color', 'GREY'),
+            'option1_name': data.get('option1_name'),
+            'option2_name': data.get('option2_name'),
+            'option3_name': data.get('option3_name'),
+            'variants': []
         }
         
+        # Actualizar solo el precio en las variantes
+        for variant in data['variants']:
+            variant_update = {
+                'variant_id': variant['variant_id'],
+                'item_id': variant['item_id'],
+                'sku': variant.get('sku', ''),
+                'reference_variant_id': variant.get('reference_variant_id'),
+                'option1_value': variant.get('option1_value'),
+                'option2_value': variant.get('option2_value'),
+                'option3_value': variant.get('option3_value'),
+                'barcode': variant.get('barcode'),
+                'cost': variant.get('cost', 0),
+                'purchase_cost': variant.get('purchase_cost'),
+                'default_pricing_type': variant.get('default_pricing_type', 'VARIABLE'),
+                'default_price': float(precio),
+                'stores': []
+            }
+            
+            # Actualizar también el precio en cada tienda
+            for store in variant.get('stores', []):
+                variant_update['stores'].append({
+                    'store_id': store['store_id'],
+                    'pricing_type': store.get('pricing_type', 'VARIABLE'),
+                    'price': float(precio),
+                    'available_for_sale': store.get('available_for_sale', True),
+                    'optimal_stock': store.get('optimal_stock'),
+                    'low_stock': store.get('low_stock')
+                })
+            
+            update_payload['variants'].append(variant_update)
+        
+        return update_payload
+        
     def calcular_precios_venta(self, producto_id=None, porcentaje_ganancia=None):
         """
         Calcula los precios de venta para productos basados en:
@@ -297,56 +831,24 @@ class LoyverseService:
         
         Si se proporciona producto_id, solo calcula para ese producto.
         Si se proporciona porcentaje_ganancia, usa ese valor, de lo contrario usa el porcentaje por defecto.
+        El porcentaje usado queda guardado como margen de cada producto.
+        
+        Solo se leen las columnas necesarias y solo se escriben los productos cuyo
+        precio cambia, con un único UPDATE en lugar de un save() por producto.
         """
         try:
-            # Obtener la tasa de cambio paralelo más reciente
-            tasa_paralelo = TasaCambio.objects.filter(tipo='PARALELO').latest('fecha')
+            # Obtener la tasa de cambio paralelo más reciente (caché compartida)
+            tasa_paralelo = tasa_actual('PARALELO')
             
-            if producto_id:
-                productos = Producto.objects.filter(id=producto_id)
-            else:
-                productos = Producto.objects.all()
-                
-            for producto in productos:
-                # Verificar si tenemos información de precio_compra_usd y unidades_paquete
-                if producto.precio_compra_usd > 0 and producto.unidades_paquete > 0:
-                    # Si no se proporciona un porcentaje específico, usar el valor por defecto (30%)
-                    porcentaje = porcentaje_ganancia if porcentaje_ganancia is not None else Decimal('30.0')
-                    
-                    # Calcular el precio de venta según la fórmula actualizada
-                    precio_base = (producto.precio_compra_usd * tasa_paralelo.valor) / Decimal(producto.unidades_paquete)
-                    precio_venta = precio_base * (Decimal('1.0') + (porcentaje / Decimal('100.0')))
-                    
-                    # Redondear a 2 decimales
-                    producto.precio_venta_calculado = round(precio_venta, 2)
-                    # También actualizar el precio base para sincronizar con Loyverse
-                    producto.precio_base = producto.precio_venta_calculado
-                    producto.ultima_actualizacion_precio = datetime.datetime.now()
-                    producto.fuente_actualizacion = 'calculado'  # Indicar que fue calculado automáticamente
-                    producto.save()
-                # Mantener la compatibilidad con el método anterior
-                elif producto.precio_compra > 0 and producto.unidades_compra > 0:
-                    # Si no se proporciona un porcentaje específico, usar el valor por defecto (30%)
-                    porcentaje = porcentaje_ganancia if porcentaje_ganancia is not None else Decimal('30.0')
-                    
-                    # Calcular el precio de venta según la fórmula
-                    precio_venta = (
-                        (producto.precio_compra * tasa_paralelo.valor / Decimal(producto.unidades_compra)) *
-                        (Decimal('1.0') + (porcentaje / Decimal('100.0')))
-                    )
-                    
-                    # Redondear a 2 decimales
-                    producto.precio_venta_calculado = round(precio_venta, 2)
-                    # También actualizar el precio base para sincronizar con Loyverse
-                    producto.precio_base = producto.precio_venta_calculado
-                    producto.ultima_actualizacion_precio = datetime.datetime.now()
-                    producto.fuente_actualizacion = 'calculado'  # Indicar que fue calculado automáticamente
-                    producto.save()
+            # Si no se proporciona un porcentaje específico, usar el valor por defecto (30%)
+            porcentaje = porcentaje_ganancia if porcentaje_ganancia is not None else Decimal('30.0')
+            evaluados, actualizados = self._repreciar(tasa_paralelo.valor, porcentaje, producto_id)
             
             return {
                 'success': True,
-                'count': productos.count(),
-                'message': f"Se calcularon los precios de {productos.count()} productos"
+                'count': evaluados,
+                'actualizados': len(actualizados),
+                'message': f"Se calcularon los precios de {evaluados} productos ({len(actualizados)} con cambios)"
             }
             
         except TasaCambio.DoesNotExist:
@@ -360,178 +862,342 @@ class LoyverseService:
                 'error': str(e)
             }
     
-    def actualizar_precios_desde_factura(self, factura_id):
+    def repreciar_por_tasa(self, tasa_id=None, progreso=None):
+        """
+        Recalcula los precios que dependen de la tasa PARALELO más reciente y envía
+        a Loyverse solo los productos cuyo precio redondeado cambió.
+        
+        Cada producto conserva el último porcentaje de ganancia que se le aplicó
+        (de su factura o de un cálculo explícito); los que no lo tienen no se tocan.
+        
+        Si se indica tasa_id y ya hay una tasa PARALELO más nueva, no se hace nada:
+        la tarea de esa tasa se encargará del recálculo.
+        """
+        try:
+            tasa_paralelo = tasa_actual('PARALELO')
+        except TasaCambio.DoesNotExist:
+            return {
+                'success': False,
+                'error': 'No hay tasa de cambio PARALELO registrada'
+            }
+        
+        if tasa_id is not None and tasa_paralelo.id != tasa_id:
+            print(f"La tasa {tasa_id} fue reemplazada por la {tasa_paralelo.id}; no se recalculan precios")
+            return {'success': True, 'reemplazada': True, 'count': 0, 'actualizados': 0}
+        
+        evaluados, actualizados = self._repreciar(tasa_paralelo.valor)
+        print(f"Recalculados {evaluados} productos con la tasa {tasa_paralelo.valor}: {len(actualizados)} con cambios "
+              f"(se omiten los que no tienen porcentaje de ganancia conocido)")
+        if progreso:
+            progreso({'evaluados': evaluados, 'con_cambios': len(actualizados)})
+        
+        result = {
+            'success': True,
+            'tasa': tasa_paralelo.valor,
+            'count': evaluados,
+            'actualizados': len(actualizados),
+            'sync': None
+        }
+        if actualizados:
+            # sync_prices vuelve a descartar los que ya tienen ese precio en Loyverse
+            result['sync'] = self.sync_prices(Producto.objects.filter(id__in=actualizados), progreso=progreso)
+            result['success'] = result['sync']['success']
+            if not result['success']:
+                result['error'] = result['sync']['error']
+        return result
+    
+    def _repreciar(self, tasa, porcentaje_ganancia=None, producto_id=None):
+        """
+        Calcula y guarda el precio de venta de los productos con datos de compra (o
+        solo del indicado) en una sola sentencia, sin traer los productos a Python:
+        el cálculo, el UPDATE de los que cambian y su registro en el historial.
+        
+        Con porcentaje_ganancia se aplica ese margen a todos y queda guardado; sin él,
+        cada producto usa el último margen que se le aplicó y los que no lo tienen se omiten.
+        
+        El precio en céntimos es compra × tasa × (100 + porcentaje) / unidades. Postgres
+        hace esa división entera de forma exacta (cociente y resto), así que redondear
+        es comparar el doble del resto con las unidades. Los empates exactos a medio
+        céntimo se calculan con Decimal como antes (_precio_venta), que es lo que
+        define el resultado: round(precio_venta, 2), mitad al par.
+        
+        Returns:
+            tuple: (productos evaluados, ids de los productos cuyo precio se escribió)
+        """
+        ahora = timezone.now()
+        filtro = 'AND p.id = %(producto_id)s' if producto_id else ''
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH entradas AS (
+                    SELECT p.id, p.precio_base, p.precio_venta_calculado, p.fuente_actualizacion,
+                           p.porcentaje_ganancia,
+                           COALESCE(%(porcentaje)s::numeric, p.porcentaje_ganancia) AS porcentaje,
+                           -- Priorizar precio_compra_usd / unidades_paquete; precio_compra /
+                           -- unidades_compra se mantiene por compatibilidad
+                           CASE WHEN p.precio_compra_usd > 0 AND p.unidades_paquete > 0
+                                THEN p.precio_compra_usd ELSE p.precio_compra END
+                               * %(tasa)s::numeric * (100 + COALESCE(%(porcentaje)s::numeric, p.porcentaje_ganancia)) AS bruto,
+                           CASE WHEN p.precio_compra_usd > 0 AND p.unidades_paquete > 0
+                                THEN p.unidades_paquete ELSE p.unidades_compra END AS unidades
+                    FROM {Producto._meta.db_table} p
+                    WHERE ((p.precio_compra_usd > 0 AND p.unidades_paquete > 0)
+                           OR (p.precio_compra > 0 AND p.unidades_compra > 0))
+                      AND COALESCE(%(porcentaje)s::numeric, p.porcentaje_ganancia) IS NOT NULL
+                      {filtro}
+                ),
+                calculados AS (
+                    SELECT e.*,
+                           (sign(e.bruto) * (div(abs(e.bruto), e.unidades)
+                               + CASE WHEN 2 * mod(abs(e.bruto), e.unidades) > e.unidades THEN 1 ELSE 0 END)
+                           / 100)::numeric(10, 2) AS precio,
+                           2 * mod(abs(e.bruto), e.unidades) = e.unidades AS empate
+                    FROM entradas e
+                ),
+                actualizados AS (
+                    UPDATE {Producto._meta.db_table} AS p
+                    SET precio_venta_calculado = c.precio,
+                        precio_base = c.precio,
+                        ultima_actualizacion_precio = %(ahora)s,
+                        fuente_actualizacion = 'calculado',
+                        porcentaje_ganancia = c.porcentaje,
+                        updated_at = %(ahora)s
+                    FROM calculados c
+                    WHERE p.id = c.id AND NOT c.empate
+                      AND (c.precio <> c.precio_base OR c.precio <> c.precio_venta_calculado
+                           OR c.fuente_actualizacion <> 'calculado'
+                           OR c.porcentaje IS DISTINCT FROM c.porcentaje_ganancia)
+                    RETURNING p.id, c.precio_base AS anterior, c.precio
+                ),
+                -- Como registrar_cambios_precio: solo los que cambian de precio
+                historial AS (
+                    INSERT INTO {HistorialPrecio._meta.db_table} (producto_id, precio_anterior, precio, fuente, fecha)
+                    SELECT id, anterior, precio, 'calculado', %(ahora)s
+                    FROM actualizados
+                    WHERE anterior <> precio
+                )
+                SELECT (SELECT count(*) FROM calculados),
+                       ARRAY(SELECT id FROM actualizados),
+                       ARRAY(SELECT id FROM calculados WHERE empate)
+                """,
+                {'tasa': tasa, 'porcentaje': porcentaje_ganancia, 'producto_id': producto_id, 'ahora': ahora}
+            )
+            evaluados, actualizados, empates = cursor.fetchone()
+            
+            nuevos_precios = {}
+            anteriores = {}
+            for (id_, compra_usd, unidades_paquete, compra, unidades_compra, precio_base, precio_calculado,
+                 fuente, porcentaje_producto) in Producto.objects.filter(id__in=empates).values_list(
+                    'id', 'precio_compra_usd', 'unidades_paquete', 'precio_compra', 'unidades_compra',
+                    'precio_base', 'precio_venta_calculado', 'fuente_actualizacion', 'porcentaje_ganancia'):
+                porcentaje = porcentaje_ganancia if porcentaje_ganancia is not None else porcentaje_producto
+                precio = self._precio_venta(compra_usd, unidades_paquete, compra, unidades_compra, porcentaje, tasa)
+                if (precio != precio_base or precio != precio_calculado or fuente != 'calculado'
+                        or porcentaje != porcentaje_producto):
+                    nuevos_precios[id_] = precio
+                    anteriores[id_] = precio_base
+            self._guardar_precios_calculados(nuevos_precios, anteriores, porcentaje_ganancia)
+            
+            if actualizados:
+                transaction.on_commit(invalidar_catalogo)
+        return evaluados, actualizados + list(nuevos_precios)
+    
+    def _precio_venta(self, compra_usd, unidades_paquete, compra, unidades_compra, porcentaje, tasa):
+        """
+        Precio de venta de un producto calculado con Decimal y redondeado a 2 decimales (mitad al par)
+        """
+        margen = Decimal('1.0') + (porcentaje / Decimal('100.0'))
+        # Priorizar precio_compra_usd / unidades_paquete; precio_compra / unidades_compra
+        # se mantiene por compatibilidad con el método anterior
+        if compra_usd > 0 and unidades_paquete > 0:
+            precio_venta = (compra_usd * tasa) / Decimal(unidades_paquete) * margen
+        else:
+            precio_venta = (compra * tasa / Decimal(unidades_compra)) * margen
+        return round(precio_venta, 2)
+    
+    def _guardar_precios_calculados(self, nuevos_precios, anteriores, porcentaje_ganancia=None):
+        """
+        Escribe {id: precio} como precio calculado y precio base con un único
+        UPDATE ... FROM unnest(ids, precios), tocando solo las columnas del precio
+        (y el porcentaje de ganancia, si se indica), y añade al historial los que
+        cambian respecto a anteriores ({id: precio_base})
+        """
+        if not nuevos_precios:
+            return
+        ahora = timezone.now()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {Producto._meta.db_table} AS p
+                SET precio_venta_calculado = v.precio,
+                    precio_base = v.precio,
+                    ultima_actualizacion_precio = %s,
+                    fuente_actualizacion = 'calculado',
+                    porcentaje_ganancia = COALESCE(%s, p.porcentaje_ganancia),
+                    updated_at = %s
+                FROM unnest(%s::bigint[], %s::numeric[]) AS v(id, precio)
+                WHERE p.id = v.id
+                """,
+                [ahora, porcentaje_ganancia, ahora, list(nuevos_precios.keys()), list(nuevos_precios.values())]
+            )
+            registrar_cambios_precio(
+                ((id_, anteriores[id_], precio) for id_, precio in nuevos_precios.items()),
+                'calculado',
+                ahora
+            )
+            transaction.on_commit(invalidar_catalogo)
+    
+    def actualizar_precios_desde_factura(self, factura_id, progreso=None, max_workers=None):
         """
         Actualiza los precios de los productos basados en los datos de una factura
         y los sincroniza con Loyverse
+        
+        Cada línea guarda su estado de envío (pendiente, enviado o fallido), el último
+        error y los intentos, de modo que volver a procesar la factura solo reintenta
+        las líneas que no llegaron a Loyverse. La factura queda como sincronizada
+        únicamente cuando todas sus líneas están enviadas. Al reintentar no se vuelve
+        a aplicar el precio de la línea: se envía el precio base actual del producto,
+        que una factura posterior puede haber cambiado.
+        
+        Las líneas se leen con su producto en una consulta y los productos se guardan
+        con un único bulk_update. Si varias líneas tocan el mismo producto prevalece la
+        última, como al procesarlas en orden, y el producto se envía una sola vez.
+        Los envíos a Loyverse van en paralelo bajo el limitador del cliente y su
+        resultado se guarda cada LOTE_ESTADOS_FACTURA productos, no solo al final.
+        
+        Si se indica progreso, recibe un dict con el avance tras cada envío.
         """
         from .models import Factura, DetalleFactura
         
         try:
-            factura = Factura.objects.get(id=factura_id)
-            porcentaje_global = factura.porcentaje_ganancia
+            factura = Factura.objects.select_related('tasa_cambio').get(id=factura_id)
+            max_workers = max_workers or getattr(settings, 'LOYVERSE_PUSH_WORKERS', 4)
+            ahora = timezone.now()
             
-            productos_actualizados = 0
-            sync_results = []
+            detalles = list(
+                DetalleFactura.objects.filter(factura=factura).select_related('producto').order_by('id')
+            )
+            pendientes_detalles = [detalle for detalle in detalles if detalle.estado_sincronizacion != 'ENVIADO']
+            lineas_reintentadas = sum(1 for detalle in pendientes_detalles if detalle.intentos > 0)
+            superados = self._productos_con_factura_posterior(
+                factura, {detalle.producto_id for detalle in pendientes_detalles}
+            )
             
-            # Procesar cada detalle de la factura
-            for detalle in DetalleFactura.objects.filter(factura=factura):
-                producto = detalle.producto
-                precio_unitario = detalle.precio_unitario  # El precio unitario introducido en la interfaz
-                
-                # Guardar información en el modelo de producto para referencia
-                if factura.moneda == 'USD':
-                    # Si la factura es en USD, guardamos directamente el precio en USD
-                    producto.precio_compra_usd = detalle.precio_compra_usd
-                    # Para compatibilidad con el sistema anterior
-                    if factura.tasa_cambio:
-                        producto.precio_compra = detalle.precio_compra_usd * factura.tasa_cambio.valor
-                    else:
-                        producto.precio_compra = detalle.precio_compra_usd
-                else:
-                    # Si la factura es en BS, convertimos a USD usando la tasa
-                    if factura.tasa_cambio and factura.tasa_cambio.valor > 0:
-                        producto.precio_compra_usd = detalle.precio_compra_usd
-                        producto.precio_compra = detalle.precio_unitario
-                
-                # Guardamos la información de unidades
-                producto.unidades_paquete = detalle.unidades_paquete
-                producto.unidades_compra = detalle.unidades_paquete  # Para compatibilidad
-                
-                # Actualizar el precio base con el precio unitario de la factura
-                producto.precio_base = precio_unitario
-                producto.precio_venta_calculado = precio_unitario
-                producto.ultima_actualizacion_precio = datetime.datetime.now()
-                producto.fuente_actualizacion = 'factura'  # Registrar que fue actualizado desde factura
-                producto.save()
-                
-                print(f"Precio actualizado para {producto.nombre}: Original: {producto.precio_base}, Nuevo: {precio_unitario}")
-                
-                # Sincronizar con Loyverse
-                try:
-                    # Obtener la información completa del producto de Loyverse
-                    url = f"{self.BASE_URL}/items/{producto.loyverse_id}"
-                    response = requests.get(url, headers=self.headers)
-                    print(f"Consultando producto en Loyverse: {url}")
-                    print(f"Status Code: {response.status_code}")
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        
-                        # Verificar que existan variantes
-                        if 'variants' in data and len(data['variants']) > 0:
-                            # Crear un payload más completo pero solo modificando los precios
-                            update_payload = {
-                                'id': data['id'],
-                                'item_name': data['item_name'],
-                                'description': data.get('description', ''),
-                                'reference_id': data.get('reference_id'),
-                                'category_id': data.get('category_id'),
-                                'track_stock': data.get('track_stock', False),
-                                'sold_by_weight': data.get('sold_by_weight', False),
-                                'is_composite': data.get('is_composite', False),
-                                'use_production': data.get('use_production', False),
-                                'primary_supplier_id': data.get('primary_supplier_id'),
-                                'tax_ids': data.get('tax_ids', []),
-                                'form': data.get('form', 'SQUARE'),
-                                'color': data.get('color', 'GREY'),
-                                'option1_name': data.get('option1_name'),
-                                'option2_name': data.get('option2_name'),
-                                'option3_name': data.get('option3_name'),
-                                'variants': []
-                            }
-                            
-                            # Actualizar solo el precio en las variantes
-                            for variant in data['variants']:
-                                variant_update = {
-                                    'variant_id': variant['variant_id'],
-                                    'item_id': variant['item_id'],
-                                    'sku': variant.get('sku', ''),
-                                    'reference_variant_id': variant.get('reference_variant_id'),
-                                    'option1_value': variant.get('option1_value'),
-                                    'option2_value': variant.get('option2_value'),
-                                    'option3_value': variant.get('option3_value'),
-                                    'barcode': variant.get('barcode'),
-                                    'cost': variant.get('cost', 0),
-                                    'purchase_cost': variant.get('purchase_cost'),
-                                    'default_pricing_type': variant.get('default_pricing_type', 'VARIABLE'),
-                                    'default_price': float(precio_unitario),
-                                    'stores': []
-                                }
-                                
-                                # Actualizar también el precio en cada tienda
-                                if 'stores' in variant:
-                                    for store in variant['stores']:
-                                        store_update = {
-                                            'store_id': store['store_id'],
-                                            'pricing_type': store.get('pricing_type', 'VARIABLE'),
-                                            'price': float(precio_unitario),
-                                            'available_for_sale': store.get('available_for_sale', True),
-                                            'optimal_stock': store.get('optimal_stock'),
-                                            'low_stock': store.get('low_stock')
-                                        }
-                                        variant_update['stores'].append(store_update)
-                                
-                                update_payload['variants'].append(variant_update)
-                            
-                            print(f"Actualizando precio de {producto.nombre} de {float(data['variants'][0].get('default_price', 0))} a {float(precio_unitario)}")
-                            
-                            # Enviar la actualización a Loyverse usando PUT
-                            update_url = f"{self.BASE_URL}/items/{data['id']}"
-                            print(f"Actualizando precio en: {update_url}")
-                            
-                            update_headers = self.headers.copy()
-                            update_headers['Content-Type'] = 'application/json'
-                            
-                            update_response = requests.put(
-                                update_url, 
-                                headers=update_headers,
-                                json=update_payload
-                            )
-                            
-                            print(f"Status Code: {update_response.status_code}")
-                            
-                            if update_response.status_code in [200, 201, 204]:
-                                productos_actualizados += 1
-                                sync_results.append({
-                                    "success": True,
-                                    "product": producto.nombre,
-                                    "price": float(precio_unitario)
-                                })
-                            else:
-                                sync_results.append({
-                                    "success": False,
-                                    "product": producto.nombre,
-                                    "error": update_response.text
-                                })
-                        else:
-                            sync_results.append({
-                                "success": False,
-                                "product": producto.nombre,
-                                "error": "No se encontraron variantes"
-                            })
-                    else:
-                        sync_results.append({
-                            "success": False,
-                            "product": producto.nombre,
-                            "error": f"Error obteniendo producto: {response.text}"
-                        })
-                except Exception as e:
+            # Un producto por id; las líneas posteriores sobrescriben a las anteriores.
+            # Una línea ya intentada se aplicó al producto en una pasada anterior y una
+            # línea superada por otra factura más reciente no debe devolverle su precio
+            # viejo: en ambos casos solo se envía el precio base actual del producto.
+            productos = {}
+            aplicados = {}
+            precios_anteriores = {}
+            lineas_por_producto = {}
+            for detalle in pendientes_detalles:
+                if detalle.producto_id not in productos:
+                    productos[detalle.producto_id] = detalle.producto
+                    precios_anteriores[detalle.producto_id] = detalle.producto.precio_base
+                producto = productos[detalle.producto_id]
+                if detalle.intentos == 0 and detalle.producto_id not in superados:
+                    self._aplicar_linea_factura(factura, detalle, producto, ahora)
+                    aplicados[producto.id] = producto
+                lineas_por_producto.setdefault(detalle.producto_id, []).append(detalle)
+            
+            with transaction.atomic():
+                Producto.objects.bulk_update(aplicados.values(), self.CAMPOS_FACTURA, batch_size=500)
+                registrar_cambios_precio(
+                    ((producto.id, precios_anteriores[producto.id], producto.precio_base) for producto in aplicados.values()),
+                    'factura',
+                    ahora,
+                    factura
+                )
+                transaction.on_commit(invalidar_catalogo)
+            print(f"Precios actualizados desde la factura {factura.numero}: {len(aplicados)} productos "
+                  f"({len(detalles) - len(pendientes_detalles)} líneas ya sincronizadas, "
+                  f"{lineas_reintentadas} reintentadas, {len(superados)} productos con una factura posterior)")
+            
+            # Sincronizar con Loyverse, salvo los que ya tienen ese precio
+            sync_results = []
+            pendientes = []
+            lineas_sin_guardar = []
+            for producto in productos.values():
+                if producto.precio_loyverse == producto.precio_base:
+                    self._marcar_lineas(lineas_por_producto[producto.id], 'ENVIADO', ahora)
+                    lineas_sin_guardar += lineas_por_producto[producto.id]
                     sync_results.append({
-                        "success": False,
+                        "success": True,
                         "product": producto.nombre,
-                        "error": str(e)
+                        "price": float(producto.precio_base),
+                        "skipped": True
+                    })
+                else:
+                    pendientes.append(producto)
+            self._guardar_estados_factura(lineas_sin_guardar, {}, [])
+            
+            omitidos = len(sync_results)
+            productos_actualizados = 0
+            fallidos = 0
+            guardados = 0
+            lineas_sin_guardar = []
+            items_espejo = []
+            precios_enviados = {}
+            producto_por_loyverse_id = {producto.loyverse_id: producto for producto in pendientes}
+            espejo = self._items_espejo(list(producto_por_loyverse_id))
+            precios = (
+                (producto.loyverse_id, producto.nombre, producto.precio_base, espejo.get(producto.loyverse_id))
+                for producto in pendientes
+            )
+            for loyverse_id, precio, resultado, item in self._push_precios_concurrente(precios, max_workers):
+                lineas = lineas_por_producto[producto_por_loyverse_id[loyverse_id].id]
+                if resultado['success']:
+                    productos_actualizados += 1
+                    precios_enviados[loyverse_id] = precio
+                    self._marcar_lineas(lineas, 'ENVIADO', timezone.now(), intento=True)
+                else:
+                    fallidos += 1
+                    self._marcar_lineas(lineas, 'FALLIDO', error=resultado.get('error'), intento=True)
+                sync_results.append(resultado)
+                if item:
+                    items_espejo.append(item)
+                lineas_sin_guardar += lineas
+                guardados += 1
+                # Guardar lo confirmado sobre la marcha: si el worker muere a mitad de
+                # la factura, al reprocesarla no se vuelven a enviar estas líneas
+                if guardados % self.LOTE_ESTADOS_FACTURA == 0:
+                    self._guardar_estados_factura(lineas_sin_guardar, precios_enviados, items_espejo)
+                    lineas_sin_guardar, precios_enviados, items_espejo = [], {}, []
+                if progreso:
+                    progreso({
+                        'productos': len(productos),
+                        'pendientes': len(pendientes),
+                        'enviados': productos_actualizados,
+                        'fallidos': fallidos
                     })
             
-            # Actualizar la factura como sincronizada
-            factura.sincronizado_loyverse = True
-            factura.save()
+            self._guardar_estados_factura(lineas_sin_guardar, precios_enviados, items_espejo)
             
-            return {
-                'success': True,
-                'productos_actualizados': productos_actualizados,
+            # La factura solo está sincronizada si lo están todas sus líneas
+            lineas_fallidas = sum(1 for detalle in detalles if detalle.estado_sincronizacion != 'ENVIADO')
+            factura.sincronizado_loyverse = lineas_fallidas == 0
+            factura.save(update_fields=['sincronizado_loyverse'])
+            
+            print(f"Factura {factura.numero}: {productos_actualizados} productos enviados a Loyverse, "
+                  f"{omitidos} ya tenían el precio y {fallidos} fallidos")
+            
+            result = {
+                'success': lineas_fallidas == 0,
+                'productos_actualizados': len(aplicados),
+                'productos_enviados': productos_actualizados,
+                'productos_sin_cambios': omitidos,
+                'productos_fallidos': fallidos,
+                'lineas_reintentadas': lineas_reintentadas,
+                'lineas_fallidas': lineas_fallidas,
                 'sync_results': sync_results
             }
+            if lineas_fallidas:
+                result['error'] = (
+                    f"{lineas_fallidas} líneas no se pudieron sincronizar con Loyverse; "
+                    f"vuelva a procesar la factura para reintentarlas"
+                )
+            return result
             
         except Factura.DoesNotExist:
             return {
@@ -544,124 +1210,108 @@ class LoyverseService:
                 'error': str(e)
             }
             
-    def sync_single_product(self, product):
+    def _guardar_estados_factura(self, lineas, precios_enviados, items_espejo):
         """
-        Sincroniza un solo producto con Loyverse
+        Guarda juntos el estado de envío de las líneas de factura, los precios
+        confirmados en Loyverse ({loyverse_id: precio}) y los items devueltos por Loyverse
         """
-        try:
-            # Primero obtener la información completa del producto
-            url = f"{self.BASE_URL}/items/{product.loyverse_id}"
-            response = requests.get(url, headers=self.headers)
-            print(f"Consultando producto en Loyverse: {url}")
-            print(f"Status Code: {response.status_code}")
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Verificar que existan variantes
-                if 'variants' in data and len(data['variants']) > 0:
-                    # Crear un payload más completo pero solo modificando los precios
-                    update_payload = {
-                        'id': data['id'],
-                        'item_name': data['item_name'],
-                        'description': data.get('description', ''),
-                        'reference_id': data.get('reference_id'),
-                        'category_id': data.get('category_id'),
-                        'track_stock': data.get('track_stock', False),
-                        'sold_by_weight': data.get('sold_by_weight', False),
-                        'is_composite': data.get('is_composite', False),
-                        'use_production': data.get('use_production', False),
-                        'primary_supplier_id': data.get('primary_supplier_id'),
-                        'tax_ids': data.get('tax_ids', []),
-                        'form': data.get('form', 'SQUARE'),
-                        'color': data.get('color', 'GREY'),
-                        'option1_name': data.get('option1_name'),
-                        'option2_name': data.get('option2_name'),
-                        'option3_name': data.get('option3_name'),
-                        'variants': []
-                    }
-                    
-                    # Actualizar solo el precio en las variantes
-                    for variant in data['variants']:
-                        variant_update = {
-                            'variant_id': variant['variant_id'],
-                            'item_id': variant['item_id'],
-                            'sku': variant.get('sku', ''),
-                            'reference_variant_id': variant.get('reference_variant_id'),
-                            'option1_value': variant.get('option1_value'),
-                            'option2_value': variant.get('option2_value'),
-                            'option3_value': variant.get('option3_value'),
-                            'barcode': variant.get('barcode'),
-                            'cost': variant.get('cost', 0),
-                            'purchase_cost': variant.get('purchase_cost'),
-                            'default_pricing_type': variant.get('default_pricing_type', 'VARIABLE'),
-                            'default_price': float(product.precio_base),
-                            'stores': []
-                        }
-                        
-                        # Actualizar también el precio en cada tienda
-                        if 'stores' in variant:
-                            for store in variant['stores']:
-                                store_update = {
-                                    'store_id': store['store_id'],
-                                    'pricing_type': store.get('pricing_type', 'VARIABLE'),
-                                    'price': float(product.precio_base),
-                                    'available_for_sale': store.get('available_for_sale', True),
-                                    'optimal_stock': store.get('optimal_stock'),
-                                    'low_stock': store.get('low_stock')
-                                }
-                                variant_update['stores'].append(store_update)
-                        
-                        update_payload['variants'].append(variant_update)
-                    
-                    print(f"Actualizando precio de {product.nombre} de {float(data['variants'][0].get('default_price', 0))} a {float(product.precio_base)}")
-                    
-                    # Realizar la actualización usando PUT en lugar de POST
-                    update_url = f"{self.BASE_URL}/items/{data['id']}"
-                    print(f"Actualizando precio en: {update_url}")
-                    
-                    update_headers = self.headers.copy()
-                    update_headers['Content-Type'] = 'application/json'
-                    
-                    update_response = requests.put(
-                        update_url, 
-                        headers=update_headers,
-                        json=update_payload
-                    )
-                    
-                    print(f"Status Code: {update_response.status_code}")
-                    
-                    if update_response.status_code in [200, 201, 204]:
-                        return {
-                            "success": True,
-                            "product": product.nombre,
-                            "price": float(product.precio_base)
-                        }
-                    else:
-                        return {
-                            "success": False,
-                            "product": product.nombre,
-                            "error": update_response.text
-                        }
-                else:
-                    return {
-                        "success": False,
-                        "product": product.nombre,
-                        "error": "No se encontraron variantes"
-                    }
+        from .models import DetalleFactura
+        
+        # El espejo va aparte: sus errores se registran y no deben abortar la transacción
+        self.guardar_items_espejo(items_espejo)
+        with transaction.atomic():
+            self._marcar_precios_loyverse(precios_enviados)
+            DetalleFactura.objects.bulk_update(
+                lineas,
+                ['estado_sincronizacion', 'ultimo_error', 'intentos', 'sincronizado_en'],
+                batch_size=500
+            )
+    
+    def _productos_con_factura_posterior(self, factura, producto_ids):
+        """
+        Ids de los productos que ya recibieron el precio de una factura posterior a esta.
+        
+        Factura.fecha se fija al crearla, así que el id sigue el mismo orden. Cuenta como
+        recibida una línea enviada o ya intentada (se aplicó al producto en esa pasada).
+        """
+        from .models import DetalleFactura
+        
+        if not producto_ids:
+            return set()
+        return set(
+            DetalleFactura.objects.filter(producto_id__in=producto_ids, factura_id__gt=factura.id)
+            .filter(Q(estado_sincronizacion='ENVIADO') | Q(intentos__gt=0))
+            .values_list('producto_id', flat=True)
+            .distinct()
+        )
+    
+    def _aplicar_linea_factura(self, factura, detalle, producto, ahora):
+        """
+        Copia en el producto (sin guardarlo) los datos de compra y el precio de una línea de factura
+        """
+        precio_unitario = detalle.precio_unitario  # El precio unitario introducido en la interfaz
+        
+        # Guardar información en el modelo de producto para referencia
+        if factura.moneda == 'USD':
+            # Si la factura es en USD, guardamos directamente el precio en USD
+            producto.precio_compra_usd = detalle.precio_compra_usd
+            # Para compatibilidad con el sistema anterior
+            if factura.tasa_cambio:
+                producto.precio_compra = detalle.precio_compra_usd * factura.tasa_cambio.valor
             else:
-                return {
-                    "success": False,
-                    "product": product.nombre,
-                    "error": f"Error obteniendo producto: {response.text}"
-                }
+                producto.precio_compra = detalle.precio_compra_usd
+        else:
+            # Si la factura es en BS, convertimos a USD usando la tasa
+            if factura.tasa_cambio and factura.tasa_cambio.valor > 0:
+                producto.precio_compra_usd = detalle.precio_compra_usd
+                producto.precio_compra = detalle.precio_unitario
         
-        except Exception as e:
+        # Guardamos la información de unidades
+        producto.unidades_paquete = detalle.unidades_paquete
+        producto.unidades_compra = detalle.unidades_paquete  # Para compatibilidad
+        
+        # Actualizar el precio base con el precio unitario de la factura
+        producto.precio_base = precio_unitario
+        producto.precio_venta_calculado = precio_unitario
+        producto.ultima_actualizacion_precio = ahora
+        producto.fuente_actualizacion = 'factura'  # Registrar que fue actualizado desde factura
+        # Margen con el que se calculó el precio; lo reutiliza el recálculo por tasa PARALELO
+        producto.porcentaje_ganancia = (
+            detalle.porcentaje_ganancia if detalle.porcentaje_ganancia is not None else factura.porcentaje_ganancia
+        )
+        # bulk_update no aplica auto_now
+        producto.updated_at = ahora
+    
+    def _marcar_lineas(self, lineas, estado, sincronizado_en=None, error=None, intento=False):
+        """
+        Registra en memoria el resultado del envío de las líneas de un producto
+        """
+        for detalle in lineas:
+            detalle.estado_sincronizacion = estado
+            detalle.ultimo_error = error
+            if sincronizado_en:
+                detalle.sincronizado_en = sincronizado_en
+            if intento:
+                detalle.intentos += 1
+    
+    def sync_single_product(self, product):
+        """
+        Sincroniza un solo producto con Loyverse
+        """
+        if product.precio_base == product.precio_loyverse:
             return {
-                "success": False,
+                "success": True,
                 "product": product.nombre,
-                "error": str(e)
+                "price": float(product.precio_base),
+                "skipped": True
             }
+        item = self._items_espejo([product.loyverse_id]).get(product.loyverse_id)
+        resultado, item = self._push_precio(product.loyverse_id, product.nombre, product.precio_base, item)
+        if item:
+            self.guardar_items_espejo([item])
+        if resultado['success']:
+            self._marcar_precios_loyverse({product.loyverse_id: product.precio_base})
+        return resultado
 
     def test_webhook(self, webhook):
         """
@@ -679,7 +1329,9 @@ class LoyverseService:
                     'Content-Type': 'application/json',
                     'X-Loyverse-API-version': 'v1.0',
                     # No incluimos firma para pruebas
-                }
+                },
+                # El webhook no es la API de Loyverse: no usar el cliente con el token
+                timeout=self.client.timeout
             )
             
             return {
@@ -753,7 +1405,7 @@ class LoyverseService:
             'type': webhook_type
         }
         
-        response = requests.post(webhook_url, json=payload, headers=self.headers)
+        response = self.client.post(webhook_url, json=payload)
         
         if response.status_code == 200:
             return {
@@ -771,7 +1423,7 @@ class LoyverseService:
         Lista todos los webhooks configurados en Loyverse
         """
         webhook_url = f"{self.BASE_URL}/webhooks"
-        response = requests.get(webhook_url, headers=self.headers)
+        response = self.client.get(webhook_url)
         
         if response.status_code == 200:
             return {
@@ -789,7 +1441,7 @@ class LoyverseService:
         Elimina un webhook en Loyverse
         """
         webhook_url = f"{self.BASE_URL}/webhooks/{webhook_id}"
-        response = requests.delete(webhook_url, headers=self.headers)
+        response = self.client.delete(webhook_url)
         
         if response.status_code == 204:
             return {
@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import invalidar_catalogo, invalidar_tasa
+from .models import Factura, Producto, TasaCambio
+from .resumenes import descontar_compras
+
+
+@receiver(post_save, sender=TasaCambio)
+def tasa_guardada(sender, instance, created, **kwargs):
+    """
+    Invalida la tasa vigente en caché y, si es una nueva tasa PARALELO, encola el
+    recálculo de los precios que dependen de ella (con el porcentaje de ganancia
+    de cada producto) y el envío a Loyverse de los que cambien. Ambas cosas
+    ocurren al confirmar la transacción, en ese orden, para que el worker ya vea
+    la tasa nueva. Si entran varias tasas seguidas, el recálculo de las ya
+    reemplazadas termina sin hacer nada (repreciar_por_tasa).
+    """
+    transaction.on_commit(lambda: invalidar_tasa(instance.tipo))
+
+    if not created or instance.tipo != 'PARALELO':
+        return
+
+    from .tareas import encolar_tarea
+    transaction.on_commit(lambda: encolar_tarea('repreciar_por_tasa', {'tasa_id': instance.id}))
+
+
+@receiver(post_delete, sender=TasaCambio)
+def tasa_borrada(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidar_tasa(instance.tipo))
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def producto_modificado(sender, **kwargs):
+    # save() y delete() de cualquier origen: API, admin, webhooks de inventario...
+    # Las escrituras masivas de services invalidan por su cuenta
+    transaction.on_commit(invalidar_catalogo)
+
+
+@receiver(pre_delete, sender=Factura)
+def factura_borrada(sender, instance, **kwargs):
+    # Antes del borrado en cascada, mientras sus líneas todavía existen
+    descontar_compras([instance.id])
@@ -0,0 +1,138 @@
+import numpy as np
+from django.db import connection
+
+from .models import Producto
+
+# Percentiles devueltos en las distribuciones de cada escenario
+PERCENTILES = [10, 25, 50, 75, 90]
+
+
+def cargar_entradas_precios():
+    """
+    Lee de una vez los datos de compra de los productos con los que se puede
+    calcular un precio (los mismos que evalúa calcular_precios_venta) y los
+    devuelve como arreglos columnares.
+
+    Returns:
+        tuple: (ids, costo unitario en USD, precio_base actual), arreglos de numpy
+        alineados por producto
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT id,
+                   CASE WHEN precio_compra_usd > 0 AND unidades_paquete > 0
+                        THEN precio_compra_usd::float8 / unidades_paquete
+                        ELSE precio_compra::float8 / unidades_compra END,
+                   precio_base::float8
+            FROM {Producto._meta.db_table}
+            WHERE (precio_compra_usd > 0 AND unidades_paquete > 0)
+               OR (precio_compra > 0 AND unidades_compra > 0)
+            """
+        )
+        filas = cursor.fetchall()
+
+    if not filas:
+        vacio = np.empty(0)
+        return np.empty(0, dtype=np.int64), vacio, vacio
+    ids, costos, precios = zip(*filas)
+    return (
+        np.array(ids, dtype=np.int64),
+        np.array(costos, dtype=np.float64),
+        np.array(precios, dtype=np.float64)
+    )
+
+
+def simular_precios(escenarios, top=10):
+    """
+    Evalúa la fórmula de calcular_precios_venta para varios escenarios de tasa y
+    margen sobre todo el catálogo, sin escribir nada:
+
+        precio_venta = costo_unitario_usd × tasa × (1 + porcentaje_ganancia/100)
+
+    Todos los escenarios se calculan juntos como una matriz escenarios × productos.
+    El cálculo es en coma flotante, así que algún precio puede diferir en un
+    céntimo del que guardaría calcular_precios_venta.
+
+    Args:
+        escenarios: lista de dicts con 'tasa' y 'porcentaje_ganancia'
+        top: productos con mayor variación devueltos por escenario
+
+    Returns:
+        dict: productos evaluados y, por escenario, la distribución de los precios
+        nuevos, la de su variación respecto al precio actual y los mayores cambios
+    """
+    ids, costos, actuales = cargar_entradas_precios()
+
+    tasas = np.array([float(escenario['tasa']) for escenario in escenarios])
+    margenes = 1.0 + np.array([float(escenario['porcentaje_ganancia']) for escenario in escenarios]) / 100.0
+    # (escenarios, productos)
+    precios = np.round(np.outer(tasas * margenes, costos), 2)
+    diferencias = precios - actuales
+    # La variación porcentual solo tiene sentido para productos con precio actual
+    con_precio = actuales > 0
+    variaciones = np.full_like(precios, np.nan)
+    np.divide(diferencias, actuales, out=variaciones, where=con_precio)
+    variaciones *= 100.0
+
+    resultados = []
+    mayores = []
+    for i, escenario in enumerate(escenarios):
+        resultados.append({
+            'tasa': escenario['tasa'],
+            'porcentaje_ganancia': escenario['porcentaje_ganancia'],
+            'suben': int(np.count_nonzero(diferencias[i] > 0)),
+            'bajan': int(np.count_nonzero(diferencias[i] < 0)),
+            'sin_cambio': int(np.count_nonzero(diferencias[i] == 0)),
+            'precio': _distribucion(precios[i]),
+            'variacion_pct': _distribucion(variaciones[i][con_precio]),
+        })
+        mayores.append(_mayores_cambios(variaciones[i], diferencias[i], top))
+
+    # Los nombres de todos los productos destacados se leen en una sola consulta
+    nombres = Producto.objects.only('nombre').in_bulk(
+        {int(ids[j]) for indices in mayores for j in indices}
+    )
+    for i, indices in enumerate(mayores):
+        resultados[i]['mayores_cambios'] = [
+            {
+                'producto': int(ids[j]),
+                'nombre': nombres[int(ids[j])].nombre if int(ids[j]) in nombres else None,
+                'precio_actual': round(float(actuales[j]), 2),
+                'precio_nuevo': round(float(precios[i, j]), 2),
+                'variacion_pct': None if np.isnan(variaciones[i, j]) else round(float(variaciones[i, j]), 2),
+            }
+            for j in indices
+        ]
+
+    return {'productos': len(ids), 'escenarios': resultados}
+
+
+def _distribucion(valores):
+    """
+    Mínimo, máximo, media y percentiles de un arreglo (None si está vacío)
+    """
+    if not len(valores):
+        return None
+    percentiles = np.percentile(valores, PERCENTILES)
+    distribucion = {
+        'min': round(float(valores.min()), 2),
+        'max': round(float(valores.max()), 2),
+        'media': round(float(valores.mean()), 2),
+    }
+    distribucion.update({f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, percentiles)})
+    return distribucion
+
+
+def _mayores_cambios(variaciones, diferencias, top):
+    """
+    Índices de los `top` productos con mayor variación absoluta, de mayor a menor.
+    Se ordena por variación porcentual; los productos sin precio actual, por la
+    diferencia en valor absoluto, detrás de los demás.
+    """
+    if top <= 0 or not len(diferencias):
+        return []
+    orden = np.where(np.isnan(variaciones), -1.0 / (1.0 + np.abs(diferencias)), np.abs(variaciones))
+    top = min(top, len(orden))
+    candidatos = np.argpartition(-orden, top - 1)[:top]
+    return candidatos[np.argsort(-orden[candidatos], kind='stable')].tolist()
@@ -0,0 +1,283 @@
+import hashlib
+import json
+import threading
+import time
+import traceback
+import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import Tarea, Producto
+from .services import LoyverseService
+
+
+def _clave(tipo, parametros):
+    """
+    Identifica una solicitud por su tipo y sus parámetros normalizados
+    """
+    contenido = json.dumps({'tipo': tipo, 'parametros': parametros}, sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def encolar_tarea(tipo, parametros=None):
+    """
+    Registra una tarea pendiente para el worker.
+
+    Si ya hay una tarea pendiente con el mismo tipo y parámetros, no se crea
+    otra: se devuelve la existente. Si la idéntica ya está en proceso se crea una
+    nueva, que el worker no toma hasta que la anterior termine.
+
+    Returns:
+        tuple: (tarea, creada)
+    """
+    parametros = parametros or {}
+    clave = _clave(tipo, parametros)
+
+    existente = Tarea.objects.filter(clave=clave, estado__in=Tarea.ESTADOS_ACTIVOS).first()
+    if existente:
+        return existente, False
+
+    try:
+        with transaction.atomic():
+            return Tarea.objects.create(tipo=tipo, parametros=parametros, clave=clave), True
+    except IntegrityError:
+        # Otra petición idéntica ganó la carrera; el índice único parcial lo garantiza
+        existente = Tarea.objects.filter(clave=clave, estado__in=Tarea.ESTADOS_ACTIVOS).first()
+        if existente:
+            return existente, False
+        raise
+
+
+def reclamar_tarea():
+    """
+    Toma la tarea pendiente más antigua y la marca en proceso. Con
+    SKIP LOCKED varios workers pueden reclamar tareas a la vez sin repetirlas.
+    Las que tienen una idéntica en proceso esperan a que esta termine.
+    """
+    with transaction.atomic():
+        tarea = (
+            Tarea.objects.select_for_update(skip_locked=True)
+            .filter(estado='PENDIENTE')
+            .exclude(clave__in=Tarea.objects.filter(estado='EN_PROCESO').values('clave'))
+            .order_by('created_at')
+            .first()
+        )
+        if tarea is None:
+            return None
+        tarea.estado = 'EN_PROCESO'
+        tarea.iniciada_en = timezone.now()
+        tarea.intentos += 1
+        tarea.save(update_fields=['estado', 'iniciada_en', 'intentos', 'updated_at'])
+        return tarea
+
+
+def recuperar_tareas_abandonadas():
+    """
+    Devuelve a la cola las tareas en proceso cuyo worker dejó de latir (por
+    ejemplo, porque el proceso se reinició). Tras agotar los intentos, o si ya hay
+    una solicitud idéntica pendiente que la reemplaza, se marcan como fallidas.
+    """
+    limite = timezone.now() - datetime.timedelta(seconds=getattr(settings, 'TAREAS_TIMEOUT', 900))
+    max_intentos = getattr(settings, 'TAREAS_MAX_INTENTOS', 3)
+    abandonadas = Tarea.objects.filter(estado='EN_PROCESO', updated_at__lt=limite)
+
+    fallidas = abandonadas.filter(intentos__gte=max_intentos).update(
+        estado='FALLIDA',
+        error='El worker dejó de responder',
+        finalizada_en=timezone.now(),
+        updated_at=timezone.now()
+    )
+    reencoladas = 0
+    # Pocas filas: una a una, porque solo puede haber una pendiente por clave
+    for tarea_id in abandonadas.filter(intentos__lt=max_intentos).values_list('id', flat=True):
+        try:
+            with transaction.atomic():
+                reencoladas += Tarea.objects.filter(id=tarea_id, estado='EN_PROCESO').update(
+                    estado='PENDIENTE',
+                    updated_at=timezone.now()
+                )
+        except IntegrityError:
+            fallidas += Tarea.objects.filter(id=tarea_id).update(
+                estado='FALLIDA',
+                error='El worker dejó de responder; la reemplaza una solicitud idéntica pendiente',
+                finalizada_en=timezone.now(),
+                updated_at=timezone.now()
+            )
+    if fallidas or reencoladas:
+        print(f"Tareas abandonadas: {reencoladas} reencoladas, {fallidas} fallidas")
+    return reencoladas + fallidas
+
+
+class Latido:
+    """
+    Renueva updated_at de la tarea desde un hilo propio mientras se ejecuta, para
+    que un paso largo que no reporta progreso no se tome por abandonado
+    """
+
+    def __init__(self, tarea, intervalo=None):
+        self.tarea = tarea
+        self.intervalo = intervalo or getattr(settings, 'TAREAS_LATIDO', 30)
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._latir, name=f'latido-tarea-{tarea.id}', daemon=True)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._parar.set()
+        self._hilo.join()
+
+    def _latir(self):
+        try:
+            while not self._parar.wait(self.intervalo):
+                try:
+                    Tarea.objects.filter(id=self.tarea.id, estado='EN_PROCESO').update(updated_at=timezone.now())
+                except Exception as e:
+                    print(f"Error renovando el latido de la tarea {self.tarea.id}: {str(e)}")
+        finally:
+            # El hilo tiene su propia conexión a la base de datos
+            connection.close()
+
+
+class ReportadorProgreso:
+    """
+    Callback de progreso para los servicios: guarda el avance en la tarea, como
+    máximo una vez por intervalo
+    """
+
+    def __init__(self, tarea, intervalo=1.0):
+        self.tarea = tarea
+        self.intervalo = intervalo
+        self.ultimo = 0.0
+
+    def __call__(self, progreso, forzar=False):
+        self.tarea.progreso = {**self.tarea.progreso, **progreso}
+        ahora = time.monotonic()
+        if forzar or ahora - self.ultimo >= self.intervalo:
+            Tarea.objects.filter(id=self.tarea.id).update(
+                progreso=self.tarea.progreso,
+                updated_at=timezone.now()
+            )
+            self.ultimo = ahora
+
+
+def ejecutar_tarea(tarea):
+    """
+    Ejecuta una tarea ya reclamada y registra su resultado
+    """
+    manejador = MANEJADORES.get(tarea.tipo)
+    progreso = ReportadorProgreso(tarea)
+    print(f"Ejecutando tarea {tarea.id} ({tarea.tipo}) con parámetros {tarea.parametros}")
+
+    try:
+        if manejador is None:
+            raise ValueError(f"Tipo de tarea desconocido: {tarea.tipo}")
+        with Latido(tarea):
+            resultado = manejador(tarea.parametros, progreso)
+    except Exception as e:
+        traceback.print_exc()
+        resultado = {'success': False, 'error': str(e)}
+
+    progreso({}, forzar=True)
+    tarea.resultado = resultado
+    tarea.estado = 'COMPLETADA' if resultado.get('success') else 'FALLIDA'
+    tarea.error = None if resultado.get('success') else resultado.get('error')
+    tarea.finalizada_en = timezone.now()
+    tarea.save(update_fields=['resultado', 'estado', 'error', 'finalizada_en', 'updated_at'])
+    print(f"Tarea {tarea.id} finalizada: {tarea.estado}")
+    return tarea
+
+
+def _sync_from_loyverse(parametros, progreso):
+    """
+    Sincroniza productos desde Loyverse; el resultado conserva la forma de la
+    respuesta que devolvía antes el endpoint
+    """
+    result = LoyverseService().fetch_products(
+        parametros.get('actualizar_precios', True),
+        completo=parametros.get('completo', False),
+        progreso=progreso
+    )
+    if not result['success']:
+        return result
+
+    mensaje = f"Productos sincronizados. Creados: {result['created']}, Actualizados: {result['updated']}"
+    if 'prices_unchanged' in result and result['prices_unchanged'] > 0:
+        mensaje += f", Precios no modificados: {result['prices_unchanged']}"
+    if result.get('facturas_recientes'):
+        mensaje += ". No se actualizaron precios debido a facturas recientes (últimos 2 días)."
+
+    # Añadir información sobre el campo aplicar_iva
+    mensaje += ". Todos los productos tienen aplicar_iva=false por defecto."
+
+    # Añadir información sobre páginas procesadas y total
+    if 'total_pages' in result:
+        mensaje += f" Páginas procesadas: {result['total_pages']}."
+    if 'total_processed' in result:
+        mensaje += f" Total productos procesados: {result['total_processed']}."
+    if result.get('incremental'):
+        mensaje += f" Sincronización incremental de cambios desde {result['desde']}."
+
+    return {
+        'success': True,
+        'message': mensaje,
+        'created': result['created'],
+        'updated': result['updated'],
+        'prices_unchanged': result.get('prices_unchanged', 0),
+        'facturas_recientes': result.get('facturas_recientes', False),
+        'total_pages': result.get('total_pages', 1),
+        'total_processed': result.get('total_processed', result['created'] + result['updated']),
+        'incremental': result.get('incremental', False),
+        'desde': result.get('desde'),
+        'tiempos': result.get('tiempos', {}),
+        'total': result['created'] + result['updated']
+    }
+
+
+def _sync_to_loyverse(parametros, progreso):
+    """
+    Envía a Loyverse los precios de todos los productos
+    """
+    result = LoyverseService().sync_prices(
+        Producto.objects.all(),
+        forzar=parametros.get('forzar', False),
+        progreso=progreso
+    )
+    if result['success']:
+        result['message'] = (
+            f"Precios sincronizados correctamente. Actualizados: {result['updated']}, "
+            f"Sin cambios: {result['skipped']}, Fallidos: {result['failed']}"
+        )
+    return result
+
+
+def _procesar_factura(parametros, progreso):
+    """
+    Actualiza los precios desde una factura y los envía a Loyverse
+    """
+    result = LoyverseService().actualizar_precios_desde_factura(parametros['factura_id'], progreso=progreso)
+    if result['success']:
+        return {
+            'success': True,
+            'message': f"Factura procesada correctamente. Productos actualizados: {result['productos_actualizados']}",
+            'detalle': result
+        }
+    return result
+
+
+def _repreciar_por_tasa(parametros, progreso):
+    """
+    Recalcula y envía los precios afectados por una nueva tasa PARALELO
+    """
+    return LoyverseService().repreciar_por_tasa(parametros.get('tasa_id'), progreso=progreso)
+
+
+MANEJADORES = {
+    'sync_from_loyverse': _sync_from_loyverse,
+    'sync_to_loyverse': _sync_to_loyverse,
+    'procesar_factura': _procesar_factura,
+    'repreciar_por_tasa': _repreciar_por_tasa,
+}
@@ -1,19 +1,42 @@
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Producto, TasaCambio, Factura, Webhook
+from .models import Producto, TasaCambio, Factura, DetalleFactura, Webhook, Tarea, HistorialPrecio
 from .serializers import (
     ProductoSerializer,
     TasaCambioSerializer,
     FacturaSerializer,
+    FacturaResumenSerializer,
     CrearFacturaSerializer,
     ActualizarPreciosSerializer,
+    SimularPreciosSerializer,
     WebhookSerializer,
-    CreateWebhookSerializer
+    CreateWebhookSerializer,
+    TareaSerializer,
+    HistorialPrecioSerializer
 )
 from .services import LoyverseService
+from .loyverse_client import get_client
+from .tareas import encolar_tarea
+from .cache import (
+    catalogo_cacheable,
+    clave_peticion,
+    contar_catalogo,
+    estadisticas_catalogo,
+    fecha_version,
+    respuesta_catalogo,
+    tasa_actual,
+    version_catalogo
+)
+from .importacion import ImportadorFacturas, formato_de_archivo
+from .historial import registrar_cambios_precio
+from .resumenes import AGRUPACIONES, reporte_compras
+from .simulacion import simular_precios
+from .pagination import PaginacionKeyset, PaginacionFacturas
+from .busqueda import buscar_productos
 import json
+from decimal import Decimal
 import hmac
 import hashlib
 import base64
@@ -22,68 +45,154 @@ from django.conf import settings
 import datetime
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from django.db import connection
+from django.db import connection, transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date, quote_etag
 
 class ProductoViewSet(viewsets.ModelViewSet):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
+    pagination_class = PaginacionKeyset
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        nombre = self.request.query_params.get('nombre')
+        if self.action == 'list' and nombre:
+            queryset = queryset.filter(nombre__icontains=nombre)
+        return queryset
+    
+    def list(self, request, *args, **kwargs):
+        """
+        Listado paginado por cursor (?cursor=, ?page_size=, ?ordering=id|nombre),
+        filtrable por ?nombre= y con ?fields= para pedir solo algunos campos.
+        Las filas se leen con values() y se convierten con los campos del
+        serializer, sin construir instancias del modelo.
+        
+        Lleva ETag/Last-Modified calculados con el mayor updated_at y el número
+        de productos (o, con la caché de respuestas activa, con la versión del
+        catálogo); si siguen vigentes se responde 304 sin leer ni serializar la página.
+        """
+        if catalogo_cacheable():
+            return self._respuesta_cacheada('listado', request, lambda: self._listar(request).data)
+        catalogo = Producto.objects.aggregate(ultimo=Max('updated_at'), total=Count('id'))
+        ultimo = catalogo['ultimo']
+        return respuesta_condicional(
+            request,
+            lambda: self._listar(request),
+            etag=f"productos-{catalogo['total']}-{ultimo.timestamp() if ultimo else 0}",
+            last_modified=ultimo
+        )
+    
+    def _listar(self, request):
+        campos = self.get_serializer().fields
+        # Los campos de la ordenación hacen falta para construir el cursor
+        columnas = set(campos) | {campo.lstrip('-') for campo in self.paginator.get_ordering(request)}
+        filas = self.paginate_queryset(self.get_queryset().values(*columnas))
+        return self.get_paginated_response([
+            {
+                nombre: None if fila[campo.source] is None else campo.to_representation(fila[campo.source])
+                for nombre, campo in campos.items()
+            }
+            for fila in filas
+        ])
+    
+    def retrieve(self, request, *args, **kwargs):
+        if catalogo_cacheable():
+            return self._respuesta_cacheada('detalle', request, lambda: self.get_serializer(self.get_object()).data)
+        producto = self.get_object()
+        return respuesta_condicional(
+            request,
+            lambda: Response(self.get_serializer(producto).data),
+            etag=f'producto-{producto.id}-{producto.updated_at.timestamp()}',
+            last_modified=producto.updated_at
+        )
+    
+    def _respuesta_cacheada(self, endpoint, request, construir):
+        """
+        Respuesta condicional con la caché de respuestas del catálogo. El ETag sale
+        de la versión del catálogo y de la petición, así que el 304 se decide antes
+        de leer la caché o la base de datos; solo si hace falta se toman los datos
+        guardados o se construyen con construir().
+        """
+        version = version_catalogo()
+        peticion = clave_peticion(request)
+        response = respuesta_condicional(
+            request,
+            lambda: Response(respuesta_catalogo(endpoint, version, peticion, construir)),
+            etag=f'catalogo-{version}-{peticion}',
+            last_modified=fecha_version(version)
+        )
+        if response.status_code == status.HTTP_304_NOT_MODIFIED:
+            contar_catalogo(endpoint, 'no_modificadas')
+        return response
+    
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            producto = serializer.save()
+            registrar_cambios_precio([(producto.id, None, producto.precio_base)], 'manual')
+    
+    def perform_update(self, serializer):
+        # Los cambios de precio hechos a mano también quedan en el historial
+        precio_anterior = serializer.instance.precio_base
+        with transaction.atomic():
+            producto = serializer.save()
+            registrar_cambios_precio([(producto.id, precio_anterior, producto.precio_base)], 'manual')
+    
+    @action(detail=False, methods=['get'])
+    def buscar(self, request):
+        """
+        Búsqueda para autocompletar (?q=, al menos 3 caracteres; ?limite=, 20 por
+        defecto y 50 como máximo) por nombre, categoría o loyverse_id, sin
+        distinguir acentos ni mayúsculas. Primero los que empiezan por el texto,
+        luego los que lo contienen y por último los parecidos. Admite ?fields=.
+        """
+        try:
+            limite = int(request.query_params.get('limite', 20))
+        except ValueError:
+            limite = 20
+        productos = buscar_productos(request.query_params.get('q', ''), limite)
+        data = self.get_serializer(productos, many=True).data
+        for item, producto in zip(data, productos):
+            item['relevancia'] = round(producto.relevancia, 3)
+        return Response(data)
+    
+    @action(detail=False, methods=['get'])
+    def estadisticas_cache(self, request):
+        """
+        Aciertos y fallos de la caché de respuestas del listado y el detalle en
+        este proceso, y si la caché está activa
+        """
+        return Response(estadisticas_catalogo())
     
     @action(detail=False, methods=['post'])
     def sync_from_loyverse(self, request):
+        """
+        Encola la sincronización de productos desde Loyverse; el avance y el
+        resultado se consultan en /api/tareas/{id}/
+        """
         # Obtener el parámetro de actualización de precios, por defecto True
         actualizar_precios = request.data.get('actualizar_precios', True)
+        # Sincronización completa explícita; por defecto solo se piden los cambios
+        completo = request.data.get('completo', False)
         
-        print(f"Iniciando sync_from_loyverse desde API. Actualizar precios: {actualizar_precios}")
-        service = LoyverseService()
-        result = service.fetch_products(actualizar_precios)
-        
-        if result['success']:
-            mensaje = f"Productos sincronizados. Creados: {result['created']}, Actualizados: {result['updated']}"
-            if 'prices_unchanged' in result and result['prices_unchanged'] > 0:
-                mensaje += f", Precios no modificados: {result['prices_unchanged']}"
-            if result.get('facturas_recientes'):
-                mensaje += ". No se actualizaron precios debido a facturas recientes (últimos 2 días)."
-                
-            print(f"Sincronización exitosa: {mensaje}")
-            
-            # Añadir información sobre el campo aplicar_iva
-            mensaje += ". Todos los productos tienen aplicar_iva=false por defecto."
-            
-            # Añadir información sobre páginas procesadas y total
-            if 'total_pages' in result:
-                mensaje += f" Páginas procesadas: {result['total_pages']}."
-            if 'total_processed' in result:
-                mensaje += f" Total productos procesados: {result['total_processed']}."
-                
-            return Response({
-                'message': mensaje,
-                'created': result['created'], 
-                'updated': result['updated'],
-                'prices_unchanged': result.get('prices_unchanged', 0),
-                'facturas_recientes': result.get('facturas_recientes', False),
-                'total_pages': result.get('total_pages', 1),
-                'total_processed': result.get('total_processed', result['created'] + result['updated']),
-                'total': result['created'] + result['updated']
-            })
-        
-        print(f"Error en sincronización: {result['error']}")
-        return Response({
-            'error': result['error']
-        }, status=status.HTTP_400_BAD_REQUEST)
+        print(f"Encolando sync_from_loyverse desde API. Actualizar precios: {actualizar_precios}. Completo: {completo}")
+        return respuesta_tarea(*encolar_tarea('sync_from_loyverse', {
+            'actualizar_precios': bool(actualizar_precios),
+            'completo': bool(completo)
+        }))
     
     @action(detail=False, methods=['post'])
     def sync_to_loyverse(self, request):
-        service = LoyverseService()
-        products = Producto.objects.all()
-        result = service.sync_prices(products)
-        
-        if result['success']:
-            return Response({
-                'message': f"Precios sincronizados correctamente. Actualizados: {result['updated']}"
-            })
-        return Response({
-            'error': result['error']
-        }, status=status.HTTP_400_BAD_REQUEST)
+        """
+        Encola el envío de precios a Loyverse
+        """
+        # Por defecto solo se envían los productos cuyo precio difiere del de Loyverse
+        forzar = request.data.get('forzar', False)
+        return respuesta_tarea(*encolar_tarea('sync_to_loyverse', {'forzar': bool(forzar)}))
     
     @action(detail=False, methods=['post'])
     def calcular_precios(self, request):
@@ -116,6 +225,33 @@ class ProductoViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'])
+    def simular_precios(self, request):
+        """
+        Simula, sin guardar nada, los precios de venta de todo el catálogo para
+        varios escenarios de tasa y porcentaje de ganancia. Los escenarios sin
+        tasa usan la tasa PARALELO vigente y los que no tienen porcentaje, el 30%.
+        """
+        serializer = SimularPreciosSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        escenarios = serializer.validated_data['escenarios']
+        if any(escenario.get('tasa') is None for escenario in escenarios):
+            try:
+                tasa_vigente = tasa_actual('PARALELO').valor
+            except TasaCambio.DoesNotExist:
+                return Response({
+                    'error': 'No hay tasa de cambio PARALELO registrada; indique la tasa de cada escenario'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        for escenario in escenarios:
+            if escenario.get('tasa') is None:
+                escenario['tasa'] = tasa_vigente
+            if escenario.get('porcentaje_ganancia') is None:
+                escenario['porcentaje_ganancia'] = Decimal('30.0')
+        
+        return Response(simular_precios(escenarios, serializer.validated_data['top']))
 
 class TasaCambioViewSet(viewsets.ModelViewSet):
     queryset = TasaCambio.objects.all().order_by('-fecha')
@@ -123,24 +259,80 @@ class TasaCambioViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def latest(self, request):
+        """
+        Tasa vigente del tipo indicado (BCV o PARALELO), con ETag/Last-Modified
+        para que los clientes puedan consultarla con peticiones condicionales (304)
+        """
         tipo = request.query_params.get('tipo', 'BCV')
+        if tipo not in dict(TasaCambio.TIPO_CHOICES):
+            return Response({
+                'error': f'Tipo de tasa no válido: {tipo}'
+            }, status=status.HTTP_400_BAD_REQUEST)
         try:
-            tasa = TasaCambio.objects.filter(tipo=tipo).latest('fecha')
-            serializer = self.get_serializer(tasa)
-            return Response(serializer.data)
+            tasa = tasa_actual(tipo)
+            return respuesta_condicional(
+                request,
+                lambda: Response(self.get_serializer(tasa).data),
+                etag=f'tasa-{tasa.id}-{tasa.valor}',
+                last_modified=tasa.fecha
+            )
         except TasaCambio.DoesNotExist:
             return Response({
                 'error': f'No hay tasa de cambio {tipo} registrada'
             }, status=status.HTTP_404_NOT_FOUND)
+    
+    @action(detail=True, methods=['post'])
+    def repreciar(self, request, pk=None):
+        """
+        Encola el recálculo de los precios con esta tasa PARALELO, usando el
+        porcentaje de ganancia de cada producto, y el envío a Loyverse de los que cambien.
+        Al crear una tasa PARALELO ya se encola solo; esto permite repetirlo a mano
+        """
+        tasa = self.get_object()
+        if tasa.tipo != 'PARALELO':
+            return Response({
+                'error': 'Solo se recalculan precios con tasas PARALELO'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return respuesta_tarea(*encolar_tarea('repreciar_por_tasa', {'tasa_id': tasa.id}))
 
 class FacturaViewSet(viewsets.ModelViewSet):
+    """
+    Facturas con sus líneas. El listado se pagina por cursor (de la más reciente a
+    la más antigua) y con ?resumen=1 devuelve solo las cabeceras con el número de
+    líneas, para cargar las líneas de cada factura bajo demanda.
+    """
     queryset = Factura.objects.all().order_by('-fecha')
+    pagination_class = PaginacionFacturas
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.es_resumen():
+            # Subconsultas correlacionadas: solo se evalúan para las facturas de la página
+            lineas = DetalleFactura.objects.filter(factura=OuterRef('pk')).order_by().values('factura')
+            return queryset.annotate(
+                num_lineas=Coalesce(Subquery(lineas.annotate(n=Count('id')).values('n'), output_field=IntegerField()), 0),
+                lineas_pendientes=Coalesce(Subquery(
+                    lineas.exclude(estado_sincronizacion='ENVIADO').annotate(n=Count('id')).values('n'),
+                    output_field=IntegerField()
+                ), 0)
+            )
+        if self.action in ('list', 'retrieve'):
+            # Todas las líneas de las facturas leídas, con el nombre de su producto, en una consulta
+            return queryset.prefetch_related(
+                Prefetch('detalles', queryset=DetalleFactura.objects.select_related('producto').order_by('id'))
+            )
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'create':
             return CrearFacturaSerializer
+        if self.es_resumen():
+            return FacturaResumenSerializer
         return FacturaSerializer
     
+    def es_resumen(self):
+        return self.action == 'list' and self.request.query_params.get('resumen') in ('1', 'true')
+    
     def create(self, request, *args, **kwargs):
         print("Datos recibidos:", request.data)
         serializer = self.get_serializer(data=request.data)
@@ -155,23 +347,147 @@ class FacturaViewSet(viewsets.ModelViewSet):
             print("Error al crear factura:", str(e))
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    @action(detail=True, methods=['post'])
-    def procesar_factura(self, request, pk=None):
+    @action(detail=False, methods=['post'])
+    def importar(self, request):
         """
-        Procesa una factura existente para actualizar precios y sincronizar con Loyverse
+        Importa muchas facturas desde un archivo CSV o JSON Lines (campo 'archivo').
+        El formato se deduce de la extensión o del parámetro 'formato'.
+        Devuelve el número de facturas creadas y un informe de errores por fila.
         """
-        service = LoyverseService()
-        result = service.actualizar_precios_desde_factura(pk)
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return Response({'error': 'Debe enviar el archivo en el campo archivo'}, status=status.HTTP_400_BAD_REQUEST)
         
-        if result['success']:
-            return Response({
-                'message': f"Factura procesada correctamente. Productos actualizados: {result['productos_actualizados']}",
-                'detalle': result
-            })
+        formato = request.data.get('formato') or formato_de_archivo(archivo.name)
+        result = ImportadorFacturas().importar(archivo, formato)
         
+        if result['success']:
+            return Response(result, status=status.HTTP_201_CREATED if result['facturas_creadas'] else status.HTTP_200_OK)
+        return Response(result, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['post'])
+    def procesar_factura(self, request, pk=None):
+        """
+        Encola el procesamiento de una factura existente para actualizar precios y sincronizar con Loyverse
+        """
+        factura = self.get_object()
+        return respuesta_tarea(*encolar_tarea('procesar_factura', {'factura_id': factura.id}))
+
+class TareaViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Estado, avance y resultado de las tareas en segundo plano
+    """
+    queryset = Tarea.objects.all().order_by('-created_at')
+    serializer_class = TareaSerializer
+
+class HistorialPrecioViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Historial de cambios de precio_base, del más reciente al más antiguo.
+
+    Filtros: producto (uno o varios ids separados por comas), fuente, desde y
+    hasta (fecha u hora ISO 8601; una fecha sola equivale a su medianoche).
+    """
+    queryset = HistorialPrecio.objects.select_related('producto').order_by('-fecha', '-id')
+    serializer_class = HistorialPrecioSerializer
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        if 'producto' in params:
+            queryset = queryset.filter(producto_id__in=parametro_ids(params, 'producto'))
+        if params.get('fuente'):
+            queryset = queryset.filter(fuente=params['fuente'])
+        if 'desde' in params:
+            queryset = queryset.filter(fecha__gte=parametro_fecha(params, 'desde'))
+        if 'hasta' in params:
+            queryset = queryset.filter(fecha__lte=parametro_fecha(params, 'hasta'))
+        return queryset
+    
+    @action(detail=False, methods=['get'])
+    def precio_en(self, request):
+        """
+        Precio de uno o varios productos (?producto=1,2) en un momento dado (?fecha=T):
+        el último cambio registrado hasta esa fecha, resuelto con el índice
+        (producto, -fecha). Los productos sin historial hasta T no aparecen.
+        """
+        params = request.query_params
+        ids = parametro_ids(params, 'producto')
+        fecha = parametro_fecha(params, 'fecha') if 'fecha' in params else timezone.now()
+        registros = (
+            HistorialPrecio.objects.select_related('producto')
+            .filter(producto_id__in=ids, fecha__lte=fecha)
+            .order_by('producto_id', '-fecha', '-id')
+            .distinct('producto_id')
+        )
         return Response({
-            'error': result['error']
-        }, status=status.HTTP_400_BAD_REQUEST)
+            'fecha': fecha,
+            'precios': self.get_serializer(registros, many=True).data
+        })
+
+def parametro_ids(params, nombre):
+    """
+    Lista de ids enteros de un parámetro separado por comas (p. ej. ?producto=1,2)
+    """
+    try:
+        ids = [int(valor) for valor in params.get(nombre, '').split(',') if valor.strip()]
+    except ValueError:
+        raise serializers.ValidationError({nombre: 'Debe ser uno o varios ids separados por comas'})
+    if not ids:
+        raise serializers.ValidationError({nombre: 'Este parámetro es obligatorio'})
+    return ids
+
+def parametro_fecha(params, nombre):
+    """
+    Fecha u hora ISO 8601 de un parámetro; sin zona horaria se usa la del proyecto
+    """
+    valor = params.get(nombre, '')
+    try:
+        fecha = parse_datetime(valor)
+        if fecha is None:
+            dia = parse_date(valor)
+            fecha = datetime.datetime.combine(dia, datetime.time.min) if dia else None
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise serializers.ValidationError({nombre: 'Fecha inválida; use el formato ISO 8601 (AAAA-MM-DD[THH:MM:SS])'})
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+def respuesta_condicional(request, construir, etag=None, last_modified=None):
+    """
+    Responde 304 si los validadores del cliente (If-None-Match / If-Modified-Since)
+    siguen vigentes; si no, construye la respuesta y le añade ETag y Last-Modified.
+    La respuesta solo se construye cuando hace falta.
+    """
+    etag = quote_etag(etag) if etag else None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    no_modificada = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+    if no_modificada is not None:
+        if etag:
+            no_modificada['ETag'] = etag
+        return no_modificada
+
+    response = construir()
+    if etag:
+        response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    # Permitir guardar la respuesta, pero revalidarla siempre
+    patch_cache_control(response, no_cache=True)
+    return response
+
+def respuesta_tarea(tarea, creada):
+    """
+    Respuesta 202 para una tarea encolada (o fusionada con una idéntica pendiente)
+    """
+    return Response({
+        'message': 'Tarea encolada' if creada else 'Ya hay una tarea idéntica pendiente',
+        'tarea_id': tarea.id,
+        'estado': tarea.estado,
+        'duplicada': not creada,
+        'url': f'/api/tareas/{tarea.id}/'
+    }, status=status.HTTP_202_ACCEPTED)
 
 class WebhookViewSet(viewsets.ModelViewSet):
     queryset = Webhook.objects.all()
@@ -234,6 +550,8 @@ class WebhookReceiveView(APIView):
             # Manejar el evento según su tipo
             if event_type == 'inventory_levels.update':
                 self._handle_inventory_update(data)
+            elif event_type == 'items.update':
+                self._handle_items_update(data)
             # Otros tipos se pueden manejar aquí
             
             return Response({'status': 'success'}, status=status.HTTP_200_OK)
@@ -259,6 +577,15 @@ class WebhookReceiveView(APIView):
         # Comparar con la firma recibida
         return hmac.compare_digest(expected, signature)
     
+    def _handle_items_update(self, data):
+        """
+        Refresca el espejo local de items con los documentos recibidos, para que
+        los envíos de precios no tengan que consultarlos antes en Loyverse
+        """
+        items = data.get('items', [])
+        LoyverseService().guardar_items_espejo(items)
+        print(f"Espejo de items actualizado desde webhook: {len(items)} items")
+    
     def _handle_inventory_update(self, data):
         """
         Maneja la actualización de inventario
@@ -326,4 +653,46 @@ def health_check(request):
         return Response(
             {"status": "degraded", "error": str(e)}, 
             status=200  # Aún devolvemos 200 para que Railway no reinicie el servicio
-        ) 
\ No newline at end of file
+        )
+
+@api_view(['GET'])
+def loyverse_estadisticas(request):
+    """
+    Contadores por endpoint del cliente HTTP de Loyverse en este proceso
+    (llamadas, errores, respuestas 429, reintentos y tiempo acumulado).
+    """
+    return Response(get_client().estadisticas())
+
+@api_view(['GET'])
+def reportes_compras(request):
+    """
+    Compras entre dos días calculadas sobre el resumen diario, sin recorrer las
+    líneas de factura.
+
+    Parámetros: desde, hasta (AAAA-MM-DD), agrupar (una o varias de dia, mes,
+    producto, categoria y moneda separadas por comas; por defecto mes), y los
+    filtros moneda, categoria y producto (ids separados por comas).
+    """
+    params = request.query_params
+    agrupar = [clave.strip() for clave in params.get('agrupar', 'mes').split(',') if clave.strip()]
+    invalidas = [clave for clave in agrupar if clave not in AGRUPACIONES]
+    if invalidas or not agrupar:
+        return Response({
+            'error': f"agrupar admite: {', '.join(AGRUPACIONES)}"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    desde = timezone.localtime(parametro_fecha(params, 'desde')).date() if 'desde' in params else None
+    hasta = timezone.localtime(parametro_fecha(params, 'hasta')).date() if 'hasta' in params else None
+    return Response({
+        'desde': desde,
+        'hasta': hasta,
+        'agrupar': agrupar,
+        'resultados': reporte_compras(
+            desde,
+            hasta,
+            agrupar,
+            moneda=params.get('moneda'),
+            categoria=params.get('categoria'),
+            producto_ids=parametro_ids(params, 'producto') if 'producto' in params else None
+        )
+    })
@@ -0,0 +1,91 @@
+import os
+import re
+import sys
+import time
+import argparse
+import django
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+# Configurar Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db import connection
+from facturacion.models import Producto, Factura
+from facturacion.serializers import CrearFacturaSerializer
+
+FORMATO_NUMERO = re.compile(r'^F\d{8}-\d{4,}$')
+
+
+def crear_factura(producto_id):
+    """Crea una factura de una línea como lo hace el endpoint"""
+    try:
+        serializer = CrearFacturaSerializer(data={
+            'moneda': 'USD',
+            'porcentaje_ganancia': '30.00',
+            'detalles': [{
+                'producto': producto_id,
+                'cantidad': '1.00',
+                'precio_unitario': '1.00',
+                'precio_compra_usd': '1.00',
+                'unidades_paquete': 1
+            }]
+        })
+        serializer.is_valid(raise_exception=True)
+        factura = serializer.save()
+        return factura.id, factura.numero, None
+    except Exception as e:
+        return None, None, str(e)
+    finally:
+        # Cada hilo usa su propia conexión
+        connection.close()
+
+
+def test_numeracion(total, hilos):
+    """Crear facturas en paralelo y comprobar que los números no se repiten"""
+    print(f"=== Creando {total} facturas con {hilos} hilos ===\n")
+
+    producto = Producto.objects.create(
+        loyverse_id=f'test-numeracion-{time.time()}',
+        nombre='Producto de prueba de numeración',
+        precio_base=Decimal('1.00')
+    )
+    ids = []
+    try:
+        inicio = time.monotonic()
+        with ThreadPoolExecutor(max_workers=hilos) as executor:
+            resultados = list(executor.map(crear_factura, [producto.id] * total))
+        duracion = time.monotonic() - inicio
+
+        ids = [factura_id for factura_id, _, _ in resultados if factura_id]
+        numeros = [numero for _, numero, _ in resultados if numero]
+        errores = [error for _, _, error in resultados if error]
+
+        print(f"⏱️  {total} facturas en {duracion:.2f}s ({total / duracion:.0f} facturas/s)")
+        print(f"   - Creadas: {len(ids)}")
+        print(f"   - Errores: {len(errores)}")
+        for error in errores[:5]:
+            print(f"     {error}")
+
+        duplicados = len(numeros) - len(set(numeros))
+        mal_formados = [numero for numero in numeros if not FORMATO_NUMERO.match(numero)]
+        print(f"   - Números repetidos: {duplicados}")
+        print(f"   - Números con formato inválido: {len(mal_formados)}")
+
+        ok = not errores and not duplicados and not mal_formados and len(ids) == total
+        print("\n✅ Numeración correcta" if ok else "\n❌ La numeración falló")
+        return ok
+    finally:
+        # Limpiar los datos de prueba
+        Factura.objects.filter(id__in=ids).delete()
+        producto.delete()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prueba de concurrencia de la numeración de facturas')
+    parser.add_argument('--facturas', type=int, default=3000, help='Número de facturas a crear')
+    parser.add_argument('--hilos', type=int, default=16, help='Facturas creadas en paralelo')
+    args = parser.parse_args()
+
+    sys.exit(0 if test_numeracion(args.facturas, args.hilos) else 1)
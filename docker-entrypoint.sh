@@ -80,6 +80,17 @@ wait_for_postgres() {
   return 0
 }
 
+# Worker de tareas (sincronizaciones con Loyverse) como proceso propio; si
+# termina por cualquier motivo se vuelve a iniciar. Solo para el modo alternativo
+# sin Docker Compose: en Railway el worker es un servicio aparte (railway.worker.toml)
+supervisar_worker() {
+  while true; do
+    python3 /app/backend/manage.py procesar_tareas
+    echo "El worker de tareas terminó (código $?). Reiniciando en 5 segundos..."
+    sleep 5
+  done
+}
+
 # Ejecutar aplicación en Railway sin usar Docker
 start_railway_app() {
   echo "Iniciando aplicación en Railway directamente (sin Docker)..."
@@ -117,6 +128,7 @@ else
     exec docker-compose up
   else
     echo "Docker Compose no está disponible. Ejecutando en modo alternativo..."
+    supervisar_worker &
     start_railway_app
   fi
 fi 
\ No newline at end of file
@@ -1,7 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useDispatch, useSelector } from 'react-redux';
-import { useNavigate } from 'react-router-dom';
-import { fetchFacturas } from '../store/facturasSlice';
+import { fetchFacturas, fetchLineasFactura } from '../store/facturasSlice';
 import {
   Container,
   Typography,
@@ -12,75 +11,135 @@ import {
   TableContainer,
   TableHead,
   TableRow,
-  Button,
   CircularProgress,
   Box,
   TablePagination,
-  Chip
+  Chip,
+  Collapse,
+  IconButton
 } from '@mui/material';
-import DescriptionIcon from '@mui/icons-material/Description';
+import KeyboardArrowDownIcon from '@mui/icons-material/KeyboardArrowDown';
+import KeyboardArrowUpIcon from '@mui/icons-material/KeyboardArrowUp';
 import moment from 'moment';
 import 'moment/locale/es';
 
 moment.locale('es');
 
+const formatearTotal = (factura) => (
+  factura.moneda === 'USD'
+    ? `$${Number(factura.total_usd).toFixed(2)}`
+    : `${Number(factura.total_bs).toFixed(2)} Bs`
+);
+
+// Fila de una factura; sus líneas se piden al desplegarla por primera vez
+const FilaFactura = ({ factura }) => {
+  const dispatch = useDispatch();
+  const lineas = useSelector((state) => state.facturas.lineasPorFactura[factura.id]);
+  const [abierta, setAbierta] = useState(false);
+
+  const alternar = () => {
+    if (!abierta && !lineas) {
+      dispatch(fetchLineasFactura(factura.id));
+    }
+    setAbierta(!abierta);
+  };
+
+  const getEstadoChip = () => {
+    if (factura.sincronizado_loyverse) {
+      return <Chip label="SINCRONIZADA" color="success" size="small" />;
+    }
+    if (factura.lineas_pendientes > 0 && factura.lineas_pendientes < factura.num_lineas) {
+      return <Chip label={`${factura.lineas_pendientes} LÍNEAS PENDIENTES`} color="warning" size="small" />;
+    }
+    return <Chip label="PENDIENTE" color="default" size="small" />;
+  };
+
+  return (
+    <>
+      <TableRow hover sx={{ '& > *': { borderBottom: 'unset' } }}>
+        <TableCell>
+          <IconButton size="small" onClick={alternar} aria-label="ver líneas">
+            {abierta ? <KeyboardArrowUpIcon /> : <KeyboardArrowDownIcon />}
+          </IconButton>
+        </TableCell>
+        <TableCell>{factura.numero}</TableCell>
+        <TableCell>{moment(factura.fecha).format('DD/MM/YYYY HH:mm')}</TableCell>
+        <TableCell>{factura.moneda}</TableCell>
+        <TableCell>{factura.num_lineas}</TableCell>
+        <TableCell>{formatearTotal(factura)}</TableCell>
+        <TableCell>{getEstadoChip()}</TableCell>
+      </TableRow>
+      <TableRow>
+        <TableCell sx={{ py: 0 }} colSpan={7}>
+          <Collapse in={abierta} timeout="auto" unmountOnExit>
+            <Box sx={{ m: 1 }}>
+              {!lineas ? (
+                <Box display="flex" justifyContent="center" p={2}>
+                  <CircularProgress size={24} />
+                </Box>
+              ) : (
+                <Table size="small" aria-label="líneas de la factura">
+                  <TableHead>
+                    <TableRow>
+                      <TableCell>Producto</TableCell>
+                      <TableCell align="right">Cantidad</TableCell>
+                      <TableCell align="right">Precio unitario</TableCell>
+                      <TableCell align="right">Total</TableCell>
+                      <TableCell>Loyverse</TableCell>
+                    </TableRow>
+                  </TableHead>
+                  <TableBody>
+                    {lineas.map((linea) => (
+                      <TableRow key={linea.id}>
+                        <TableCell>{linea.producto_nombre}</TableCell>
+                        <TableCell align="right">{linea.cantidad}</TableCell>
+                        <TableCell align="right">{Number(linea.precio_unitario).toFixed(2)}</TableCell>
+                        <TableCell align="right">{Number(linea.total).toFixed(2)}</TableCell>
+                        <TableCell>{linea.estado_sincronizacion}</TableCell>
+                      </TableRow>
+                    ))}
+                  </TableBody>
+                </Table>
+              )}
+            </Box>
+          </Collapse>
+        </TableCell>
+      </TableRow>
+    </>
+  );
+};
+
 const ListadoFacturas = () => {
   const dispatch = useDispatch();
-  const navigate = useNavigate();
   const facturas = useSelector((state) => state.facturas.items);
+  const next = useSelector((state) => state.facturas.next);
   const status = useSelector((state) => state.facturas.status);
   const error = useSelector((state) => state.facturas.error);
-  
+
+  // El backend pagina por cursor: se guarda el cursor de cada página visitada
   const [page, setPage] = useState(0);
   const [rowsPerPage, setRowsPerPage] = useState(10);
+  const [cursores, setCursores] = useState([null]);
 
   useEffect(() => {
-    if (status === 'idle') {
-      dispatch(fetchFacturas());
-    }
-  }, [status, dispatch]);
+    dispatch(fetchFacturas({ cursor: cursores[page], pageSize: rowsPerPage }));
+  }, [dispatch, cursores, page, rowsPerPage]);
 
   const handleChangePage = (event, newPage) => {
+    if (newPage > page) {
+      const nuevos = cursores.slice(0, newPage);
+      nuevos[newPage] = next;
+      setCursores(nuevos);
+    }
     setPage(newPage);
   };
 
   const handleChangeRowsPerPage = (event) => {
     setRowsPerPage(parseInt(event.target.value, 10));
+    setCursores([null]);
     setPage(0);
   };
 
-  const viewFacturaDetail = (facturaId) => {
-    navigate(`/facturas/${facturaId}`);
-  };
-
-  const getEstadoChip = (estado) => {
-    let color = 'default';
-    switch (estado) {
-      case 'pendiente':
-        color = 'warning';
-        break;
-      case 'pagada':
-        color = 'success';
-        break;
-      case 'anulada':
-        color = 'error';
-        break;
-      default:
-        color = 'default';
-    }
-    return <Chip label={estado.toUpperCase()} color={color} size="small" />;
-  };
-
-  if (status === 'loading') {
-    return (
-      <Container maxWidth="lg" sx={{ mt: 4 }}>
-        <Box display="flex" justifyContent="center" alignItems="center" minHeight="300px">
-          <CircularProgress />
-        </Box>
-      </Container>
-    );
-  }
-
   if (status === 'failed') {
     return (
       <Container maxWidth="lg" sx={{ mt: 4 }}>
@@ -96,67 +155,55 @@ const ListadoFacturas = () => {
       <Typography variant="h4" gutterBottom>
         Listado de Facturas
       </Typography>
-      
+
       <Paper elevation={3} sx={{ p: 2, mb: 4 }}>
-        <TableContainer>
-          <Table aria-label="tabla de facturas">
-            <TableHead>
-              <TableRow>
-                <TableCell><strong>Número</strong></TableCell>
-                <TableCell><strong>Fecha</strong></TableCell>
-                <TableCell><strong>Cliente</strong></TableCell>
-                <TableCell><strong>Total</strong></TableCell>
-                <TableCell><strong>Estado</strong></TableCell>
-                <TableCell><strong>Acciones</strong></TableCell>
-              </TableRow>
-            </TableHead>
-            <TableBody>
-              {(rowsPerPage > 0
-                ? facturas.slice(page * rowsPerPage, page * rowsPerPage + rowsPerPage)
-                : facturas
-              ).map((factura) => (
-                <TableRow key={factura.id} hover>
-                  <TableCell>{factura.numero_factura || 'N/A'}</TableCell>
-                  <TableCell>{moment(factura.fecha_emision).format('DD/MM/YYYY HH:mm')}</TableCell>
-                  <TableCell>{factura.cliente?.nombre || 'Cliente no registrado'}</TableCell>
-                  <TableCell>${factura.total.toFixed(2)}</TableCell>
-                  <TableCell>{getEstadoChip(factura.estado)}</TableCell>
-                  <TableCell>
-                    <Button
-                      variant="outlined"
-                      size="small"
-                      startIcon={<DescriptionIcon />}
-                      onClick={() => viewFacturaDetail(factura.id)}
-                    >
-                      Ver Detalle
-                    </Button>
-                  </TableCell>
-                </TableRow>
-              ))}
-              {facturas.length === 0 && (
+        {status === 'loading' ? (
+          <Box display="flex" justifyContent="center" alignItems="center" minHeight="300px">
+            <CircularProgress />
+          </Box>
+        ) : (
+          <TableContainer>
+            <Table aria-label="tabla de facturas">
+              <TableHead>
                 <TableRow>
-                  <TableCell colSpan={6} align="center">
-                    No hay facturas disponibles
-                  </TableCell>
+                  <TableCell />
+                  <TableCell><strong>Número</strong></TableCell>
+                  <TableCell><strong>Fecha</strong></TableCell>
+                  <TableCell><strong>Moneda</strong></TableCell>
+                  <TableCell><strong>Líneas</strong></TableCell>
+                  <TableCell><strong>Total</strong></TableCell>
+                  <TableCell><strong>Estado</strong></TableCell>
                 </TableRow>
-              )}
-            </TableBody>
-          </Table>
-        </TableContainer>
+              </TableHead>
+              <TableBody>
+                {facturas.map((factura) => (
+                  <FilaFactura key={factura.id} factura={factura} />
+                ))}
+                {facturas.length === 0 && (
+                  <TableRow>
+                    <TableCell colSpan={7} align="center">
+                      No hay facturas disponibles
+                    </TableCell>
+                  </TableRow>
+                )}
+              </TableBody>
+            </Table>
+          </TableContainer>
+        )}
         <TablePagination
-          rowsPerPageOptions={[5, 10, 25, { label: 'Todas', value: -1 }]}
+          rowsPerPageOptions={[5, 10, 25, 50]}
           component="div"
-          count={facturas.length}
+          count={next ? -1 : page * rowsPerPage + facturas.length}
           rowsPerPage={rowsPerPage}
           page={page}
           onPageChange={handleChangePage}
           onRowsPerPageChange={handleChangeRowsPerPage}
           labelRowsPerPage="Filas por página:"
-          labelDisplayedRows={({ from, to, count }) => `${from}-${to} de ${count}`}
+          labelDisplayedRows={({ from, to, count }) => `${from}-${to} de ${count !== -1 ? count : `más de ${to}`}`}
         />
       </Paper>
     </Container>
   );
 };
 
-export default ListadoFacturas; 
\ No newline at end of file
+export default ListadoFacturas;
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import { useDispatch, useSelector } from 'react-redux';
 import {
   Box,
@@ -44,21 +44,24 @@ import LoyaltyIcon from '@mui/icons-material/Loyalty';
 import ReceiptIcon from '@mui/icons-material/Receipt';
 import CalculateIcon from '@mui/icons-material/Calculate';
 import SyncIcon from '@mui/icons-material/Sync';
-import { fetchProductos, syncFromLoyverse } from '../store/productosSlice';
+import { fetchPaginaProductos, syncFromLoyverse } from '../store/productosSlice';
 import { fetchTasasCambio, fetchLatestTasa, createTasaCambio } from '../store/tasasCambioSlice';
 
 const ListadoProductos = () => {
   const dispatch = useDispatch();
-  const { items: productos, status } = useSelector((state) => state.productos);
+  const { pagina } = useSelector((state) => state.productos);
+  const productos = pagina.items;
   const { items: tasasCambio } = useSelector((state) => state.tasasCambio);
   
-  // Estados para paginación
+  // Estados para paginación: el backend pagina por cursor, así que se guarda
+  // el cursor de cada página visitada para poder volver atrás
   const [page, setPage] = useState(0);
   const [rowsPerPage, setRowsPerPage] = useState(10);
+  const [cursores, setCursores] = useState([null]);
   
-  // Estado para búsqueda
+  // Estado para búsqueda; la búsqueda en el servidor espera a que se deje de escribir
   const [searchTerm, setSearchTerm] = useState('');
-  const [productosFiltrados, setProductosFiltrados] = useState([]);
+  const [busqueda, setBusqueda] = useState('');
   
   // Estado para tasas de cambio
   const [tasaBCV, setTasaBCV] = useState(null);
@@ -79,11 +82,21 @@ const ListadoProductos = () => {
     severity: 'info'
   });
   
-  // Cargar productos y tasas al montar el componente
+  // Cargar la página actual de productos
+  const cargarPagina = useCallback(() => {
+    dispatch(fetchPaginaProductos({
+      cursor: cursores[page],
+      pageSize: rowsPerPage,
+      nombre: busqueda.trim()
+    }));
+  }, [dispatch, cursores, page, rowsPerPage, busqueda]);
+  
+  useEffect(() => {
+    cargarPagina();
+  }, [cargarPagina]);
+  
+  // Cargar tasas al montar el componente
   useEffect(() => {
-    if (status !== 'succeeded') {
-      dispatch(fetchProductos());
-    }
     dispatch(fetchTasasCambio());
     dispatch(fetchLatestTasa('BCV')).then(action => {
       if (action.payload) {
@@ -95,7 +108,7 @@ const ListadoProductos = () => {
         setTasaParalelo(action.payload);
       }
     });
-  }, [dispatch, status]);
+  }, [dispatch]);
   
   // Inicializar tasas seleccionadas para cada producto
   useEffect(() => {
@@ -108,28 +121,30 @@ const ListadoProductos = () => {
     }
   }, [productos, tasaParalelo]);
   
-  // Filtrar productos cuando cambia el término de búsqueda o la lista de productos
+  // Buscar en el servidor cuando se deja de escribir; la búsqueda vuelve a la primera página
   useEffect(() => {
-    if (productos.length > 0) {
-      if (searchTerm.trim() === '') {
-        setProductosFiltrados(productos);
-      } else {
-        const filtered = productos.filter(producto => 
-          producto.nombre.toLowerCase().includes(searchTerm.toLowerCase())
-        );
-        setProductosFiltrados(filtered);
-      }
-      setPage(0); // Resetear a la primera página cuando cambia el filtro
-    }
-  }, [searchTerm, productos]);
+    const temporizador = setTimeout(() => {
+      setBusqueda(searchTerm);
+      setCursores([null]);
+      setPage(0);
+    }, 300);
+    return () => clearTimeout(temporizador);
+  }, [searchTerm]);
   
   // Manejadores para la paginación
   const handleChangePage = (event, newPage) => {
+    if (newPage > page) {
+      // Avanzar: el cursor de la página siguiente viene en la respuesta actual
+      const nuevos = cursores.slice(0, newPage);
+      nuevos[newPage] = pagina.next;
+      setCursores(nuevos);
+    }
     setPage(newPage);
   };
   
   const handleChangeRowsPerPage = (event) => {
     setRowsPerPage(parseInt(event.target.value, 10));
+    setCursores([null]);
     setPage(0);
   };
   
@@ -227,7 +242,7 @@ const ListadoProductos = () => {
             severity: 'success'
           });
           
-          dispatch(fetchProductos()); // Refrescar la lista de productos
+          cargarPagina(); // Refrescar la página de productos
         }
       })
       .finally(() => {
@@ -281,10 +296,9 @@ const ListadoProductos = () => {
   };
   
   // Productos para la página actual
-  const productosEnPagina = productosFiltrados.slice(
-    page * rowsPerPage,
-    page * rowsPerPage + rowsPerPage
-  );
+  const productosEnPagina = productos;
+  // Sin total en el backend: el conteo solo se conoce al llegar a la última página
+  const productosHastaPagina = page * rowsPerPage + productos.length;
   
   // Cerrar snackbar
   const handleCloseSnackbar = () => {
@@ -406,7 +420,7 @@ const ListadoProductos = () => {
                 Resultados búsqueda
               </Typography>
               <Typography variant="h3" component="div" color={searchTerm ? 'secondary' : 'primary'}>
-                {productosFiltrados.length}
+                {productosHastaPagina}{pagina.next ? '+' : ''}
               </Typography>
             </CardContent>
           </Card>
@@ -461,7 +475,7 @@ const ListadoProductos = () => {
           overflow: 'hidden'
         }}
       >
-        {status === 'loading' || sincronizando ? (
+        {pagina.status === 'loading' || sincronizando ? (
           <Box sx={{ display: 'flex', justifyContent: 'center', alignItems: 'center', height: 400 }}>
             <CircularProgress />
             {sincronizando && (
@@ -627,13 +641,13 @@ const ListadoProductos = () => {
             <TablePagination
               rowsPerPageOptions={[5, 10, 25, 50, 100]}
               component="div"
-              count={productosFiltrados.length}
+              count={pagina.next ? -1 : productosHastaPagina}
               rowsPerPage={rowsPerPage}
               page={page}
               onPageChange={handleChangePage}
               onRowsPerPageChange={handleChangeRowsPerPage}
               labelRowsPerPage="Filas por página:"
-              labelDisplayedRows={({ from, to, count }) => `${from}-${to} de ${count}`}
+              labelDisplayedRows={({ from, to, count }) => `${from}-${to} de ${count !== -1 ? count : `más de ${to}`}`}
               sx={{
                 backgroundColor: '#f8fafc',
                 borderTop: '1px solid #e2e8f0',
@@ -35,16 +35,15 @@ import {
 import DeleteIcon from '@mui/icons-material/Delete';
 import EditIcon from '@mui/icons-material/Edit';
 import EditAttributesIcon from '@mui/icons-material/EditAttributes';
-import { fetchProductos } from '../store/productosSlice';
 import { fetchLatestTasa, createTasaCambio } from '../store/tasasCambioSlice';
 import { createFactura } from '../store/facturasSlice';
+import { esperarTarea } from '../services/tareas';
 
 // Usar la misma URL base que en el resto de la aplicación
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
 
 const NuevaFactura = () => {
   const dispatch = useDispatch();
-  const productos = useSelector((state) => state.productos.items);
   const tasaCambio = useSelector((state) => state.tasasCambio.latestTasa);
   
   const [moneda, setMoneda] = useState('');
@@ -75,34 +74,43 @@ const NuevaFactura = () => {
   const [tasaDialogOpen, setTasaDialogOpen] = useState(false);
   const [nuevaTasaValor, setNuevaTasaValor] = useState('');
 
-  useEffect(() => {
-    console.log('Iniciando carga de productos...');
-    dispatch(fetchProductos());
-  }, [dispatch]);
-
   useEffect(() => {
     if (tipoTasa) {
       dispatch(fetchLatestTasa(tipoTasa));
     }
   }, [dispatch, tipoTasa]);
 
-  // Filtrar productos basado en la búsqueda
+  // Buscar productos en el servidor mientras se escribe (desde 3 caracteres)
   useEffect(() => {
-    if (productoSearch.length > 0) {
-      const searchTerm = productoSearch.toLowerCase();
-      console.log('Término de búsqueda:', searchTerm);
-      console.log('Productos disponibles:', productos);
-      const filtrados = productos.filter(p =>
-        p.nombre.toLowerCase().includes(searchTerm)
-      ).slice(0, 10);
-      console.log('Productos filtrados:', filtrados);
-      setProductosFiltrados(filtrados);
-      setShowResults(true);
-    } else {
+    if (productoSearch.trim().length < 3) {
       setProductosFiltrados([]);
       setShowResults(false);
+      return undefined;
     }
-  }, [productoSearch, productos]);
+    let cancelada = false;
+    const temporizador = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API_URL}/productos/buscar/`, {
+          params: {
+            q: productoSearch,
+            limite: 10,
+            // Solo los campos que usa el buscador y las líneas de la factura
+            fields: 'id,nombre,precio_base,precio_compra_usd,unidades_paquete'
+          }
+        });
+        if (!cancelada) {
+          setProductosFiltrados(response.data);
+          setShowResults(true);
+        }
+      } catch (error) {
+        console.error('Error al buscar productos:', error);
+      }
+    }, 250);
+    return () => {
+      cancelada = true;
+      clearTimeout(temporizador);
+    };
+  }, [productoSearch]);
 
   const handleMonedaChange = (event) => {
     setMoneda(event.target.value);
@@ -425,9 +433,11 @@ const NuevaFactura = () => {
         // Si está habilitada la opción de actualizar precios, procesamos la factura
         if (actualizarPrecios && response.payload && response.payload.id) {
           // Realizar la llamada al endpoint para procesar la factura usando axios
+          // El procesamiento se encola en el backend; se espera a que la tarea termine
           axios.post(`${API_URL}/facturas/${response.payload.id}/procesar_factura/`)
-            .then(res => {
-              console.log('Precios actualizados:', res.data);
+            .then(res => esperarTarea(res.data.tarea_id))
+            .then(resultado => {
+              console.log('Precios actualizados:', resultado);
               // Mostrar mensaje de éxito
               setSnackbarMessage('Precios actualizados en Loyverse correctamente');
               setSnackbarSeverity('success');
@@ -0,0 +1,24 @@
+import axios from 'axios';
+
+const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
+
+const esperar = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Consulta una tarea en segundo plano hasta que termina y devuelve su resultado.
+// onProgreso recibe el avance reportado por el worker (páginas, items, fallos...).
+export const esperarTarea = async (tareaId, { intervalo = 2000, onProgreso } = {}) => {
+  while (true) {
+    const response = await axios.get(`${API_URL}/tareas/${tareaId}/`);
+    const tarea = response.data;
+
+    if (onProgreso) onProgreso(tarea.progreso, tarea);
+
+    if (tarea.estado === 'COMPLETADA') {
+      return tarea.resultado;
+    }
+    if (tarea.estado === 'FALLIDA') {
+      throw new Error(tarea.error || 'La tarea falló');
+    }
+    await esperar(intervalo);
+  }
+};
@@ -3,11 +3,25 @@ import axios from 'axios';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
 
+// Una página de cabeceras de factura (sin líneas): { results, next }.
+// `cursor` es el valor del parámetro cursor de la página (null para la primera)
 export const fetchFacturas = createAsyncThunk(
   'facturas/fetchFacturas',
-  async () => {
-    const response = await axios.get(`${API_URL}/facturas/`);
-    return response.data;
+  async ({ cursor = null, pageSize = 25 } = {}) => {
+    const response = await axios.get(`${API_URL}/facturas/`, {
+      params: { resumen: 1, page_size: pageSize, ...(cursor ? { cursor } : {}) }
+    });
+    const next = response.data.next ? new URL(response.data.next).searchParams.get('cursor') : null;
+    return { results: response.data.results, next };
+  }
+);
+
+// Líneas de una factura, cargadas bajo demanda desde el listado
+export const fetchLineasFactura = createAsyncThunk(
+  'facturas/fetchLineasFactura',
+  async (id) => {
+    const response = await axios.get(`${API_URL}/facturas/${id}/`);
+    return { id, detalles: response.data.detalles };
   }
 );
 
@@ -31,6 +45,9 @@ const facturasSlice = createSlice({
   name: 'facturas',
   initialState: {
     items: [],
+    next: null,
+    // Líneas ya cargadas de cada factura del listado: { [id]: [...] }
+    lineasPorFactura: {},
     currentFactura: null,
     status: 'idle',
     detailStatus: 'idle',
@@ -51,16 +68,22 @@ const facturasSlice = createSlice({
       })
       .addCase(fetchFacturas.fulfilled, (state, action) => {
         state.status = 'succeeded';
-        state.items = action.payload;
+        state.items = action.payload.results;
+        state.next = action.payload.next;
       })
       .addCase(fetchFacturas.rejected, (state, action) => {
         state.status = 'failed';
         state.error = action.error.message;
       })
       .addCase(createFactura.fulfilled, (state, action) => {
-        state.items.unshift(action.payload);
+        const { detalles, ...cabecera } = action.payload;
+        state.items.unshift({ ...cabecera, num_lineas: detalles.length });
+        state.lineasPorFactura[action.payload.id] = detalles;
         state.currentFactura = null;
       })
+      .addCase(fetchLineasFactura.fulfilled, (state, action) => {
+        state.lineasPorFactura[action.payload.id] = action.payload.detalles;
+      })
       .addCase(fetchFacturaById.pending, (state) => {
         state.detailStatus = 'loading';
       })
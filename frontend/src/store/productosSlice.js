@@ -1,13 +1,24 @@
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import axios from 'axios';
+import { esperarTarea } from '../services/tareas';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
 
-export const fetchProductos = createAsyncThunk(
-  'productos/fetchProductos',
-  async () => {
-    const response = await axios.get(`${API_URL}/productos/`);
-    return response.data;
+// Una página del listado: { results, next }. `cursor` es el valor del parámetro
+// cursor de la página (null para la primera)
+export const fetchPaginaProductos = createAsyncThunk(
+  'productos/fetchPaginaProductos',
+  async ({ cursor = null, pageSize = 10, nombre = '', ordering = 'nombre' } = {}) => {
+    const response = await axios.get(`${API_URL}/productos/`, {
+      params: {
+        page_size: pageSize,
+        ordering,
+        ...(cursor ? { cursor } : {}),
+        ...(nombre ? { nombre } : {})
+      }
+    });
+    const next = response.data.next ? new URL(response.data.next).searchParams.get('cursor') : null;
+    return { results: response.data.results, next };
   }
 );
 
@@ -19,8 +30,13 @@ export const syncFromLoyverse = createAsyncThunk(
       const response = await axios.post(`${API_URL}/productos/sync_from_loyverse/`, {
         actualizar_precios: actualizarPrecios
       });
-      console.log('Respuesta de sincronización:', response.data);
-      return response.data;
+      // El backend encola la sincronización y responde 202 con el id de la tarea
+      console.log('Sincronización encolada:', response.data);
+      const resultado = await esperarTarea(response.data.tarea_id, {
+        onProgreso: (progreso) => console.log('Progreso de sincronización:', progreso)
+      });
+      console.log('Respuesta de sincronización:', resultado);
+      return resultado;
     } catch (error) {
       console.error('Error en sincronización:', error.response?.data || error.message);
       throw error;
@@ -31,22 +47,28 @@ export const syncFromLoyverse = createAsyncThunk(
 const productosSlice = createSlice({
   name: 'productos',
   initialState: {
-    items: [],
     status: 'idle',
     error: null,
+    // Página mostrada en el listado de productos
+    pagina: {
+      items: [],
+      next: null,
+      status: 'idle',
+    },
   },
   reducers: {},
   extraReducers: (builder) => {
     builder
-      .addCase(fetchProductos.pending, (state) => {
-        state.status = 'loading';
+      .addCase(fetchPaginaProductos.pending, (state) => {
+        state.pagina.status = 'loading';
       })
-      .addCase(fetchProductos.fulfilled, (state, action) => {
-        state.status = 'succeeded';
-        state.items = action.payload;
+      .addCase(fetchPaginaProductos.fulfilled, (state, action) => {
+        state.pagina.status = 'succeeded';
+        state.pagina.items = action.payload.results;
+        state.pagina.next = action.payload.next;
       })
-      .addCase(fetchProductos.rejected, (state, action) => {
-        state.status = 'failed';
+      .addCase(fetchPaginaProductos.rejected, (state, action) => {
+        state.pagina.status = 'failed';
         state.error = action.error.message;
       })
       .addCase(syncFromLoyverse.pending, (state) => {